@@ -1,11 +1,18 @@
 import tkinter as tk
 from dataclasses import dataclass
+from typing import Any, Callable
 import os
+import sys
+import queue
+import threading
 
 import ttkbootstrap as tb
 from ..service.iaa_service import IaaService
 from tkinter import messagebox
 
+CLOSE_POLL_MS = 100
+"""关闭窗口时等待任务停止的检查间隔（毫秒）"""
+
 @dataclass
 class Store:
     var_start_game: tk.BooleanVar | None = None
@@ -21,6 +28,10 @@ class DesktopApp:
         self.root.title("一歌小助手")
         self.root.geometry("900x520")
         self.store = Store()
+        self.__calls: queue.SimpleQueue[Callable[[], Any]] = queue.SimpleQueue()
+        self.__pump_lock = threading.Lock()
+        self.__pump_pending = False
+        self.__closing = False
 
         # 服务聚合
         self.service = IaaService()
@@ -41,11 +52,7 @@ class DesktopApp:
         
         # 绑定错误回调：在 UI 线程弹出提示
         def _on_scheduler_error(e: Exception) -> None:
-            try:
-                # 使用 after 确保在主线程执行 UI 操作
-                self.root.after(0, lambda: messagebox.showerror("运行错误", str(e), parent=self.root))
-            except Exception:
-                pass
+            self.call_soon(lambda: messagebox.showerror("运行错误", str(e), parent=self.root))
         self.service.scheduler.on_error = _on_scheduler_error
 
         # 绑定窗口关闭事件
@@ -74,6 +81,42 @@ class DesktopApp:
         build_settings_tab(self, self.tab_settings)
         build_about_tab(self, self.tab_about)
 
+    # -------------------- 跨线程调用 --------------------
+    def call_soon(self, func: Callable[[], Any]) -> None:
+        """
+        在 UI 线程中调用 `func`。可以在任意线程中调用。
+
+        函数先放入队列，再用 `after_idle` 安排一次 `_pump` 取出执行；
+        已经安排过且尚未执行时不再重复安排，因此一批调用只唤醒 UI 线程一次，空闲时不会定时唤醒。
+
+        在工作线程中调用 Tk 时，Tcl 会把调用转交 UI 线程并等待其完成。
+        因此 UI 线程不能阻塞等待工作线程（如 `stop(block=True)`），否则两者会互相等待，见 `_on_close`。
+        """
+        self.__calls.put(func)
+        with self.__pump_lock:
+            if self.__pump_pending:
+                return
+            self.__pump_pending = True
+        try:
+            self.root.after_idle(self._pump)
+        except (tk.TclError, RuntimeError):
+            # 窗口已销毁
+            pass
+
+    def _pump(self) -> None:
+        # 先清除标记：执行期间放入的函数会再安排一次
+        with self.__pump_lock:
+            self.__pump_pending = False
+        while True:
+            try:
+                func = self.__calls.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                func()
+            except Exception:
+                self.root.report_callback_exception(*sys.exc_info())
+
     # -------------------- 事件处理 --------------------
     def on_start(self) -> None:
         self.service.scheduler.start_regular(run_in_thread=True)
@@ -94,6 +137,8 @@ class DesktopApp:
         return tasks
 
     def _on_close(self) -> None:
+        if self.__closing:
+            return
         sch = self.service.scheduler
         if sch.running:
             confirm = messagebox.askyesno(
@@ -104,9 +149,22 @@ class DesktopApp:
             if not confirm:
                 return
             try:
-                sch.stop(block=True)
+                sch.stop(block=False)
             except Exception:
                 pass
+        self.__closing = True
+        self._close_when_stopped()
+
+    def _close_when_stopped(self) -> None:
+        # 不阻塞等待工作线程，见 `call_soon`
+        if self.service.scheduler.running:
+            self.root.after(CLOSE_POLL_MS, self._close_when_stopped)
+            return
+        # 写入尚在等待合并的配置修改
+        try:
+            self.service.config.flush()
+        except Exception:
+            pass
         try:
             self.root.destroy()
         except Exception:
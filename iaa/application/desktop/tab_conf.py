@@ -4,7 +4,7 @@ import ttkbootstrap as tb
 
 from .index import DesktopApp
 from typing import cast, Literal, Optional
-from iaa.config.schemas import LinkAccountOptions, EmulatorOptions, GameCharacter, ChallengeLiveAward, CustomEmulatorData
+from iaa.config.schemas import LinkAccountOptions, EmulatorOptions, ControlImplOptions, GameCharacter, ChallengeLiveAward, CustomEmulatorData
 from .toast import show_toast
 from .advance_select import AdvanceSelect
 from iaa.config.base import IaaConfig
@@ -27,12 +27,13 @@ LINK_DISPLAY_MAP: dict[LinkAccountOptions, str] = {
 }
 LINK_VALUE_MAP: dict[str, LinkAccountOptions] = {v: k for k, v in LINK_DISPLAY_MAP.items()}
 
-CONTROL_IMPL_DISPLAY_MAP: dict[Literal['nemu_ipc', 'adb', 'uiautomator'], str] = {
+CONTROL_IMPL_DISPLAY_MAP: dict[ControlImplOptions, str] = {
   'nemu_ipc': 'Nemu IPC',
   'adb': 'ADB',
   'uiautomator': 'UIAutomator2',
+  'auto': '自动选择',
 }
-CONTROL_IMPL_VALUE_MAP: dict[str, Literal['nemu_ipc', 'adb', 'uiautomator']] = {v: k for k, v in CONTROL_IMPL_DISPLAY_MAP.items()}
+CONTROL_IMPL_VALUE_MAP: dict[str, ControlImplOptions] = {v: k for k, v in CONTROL_IMPL_DISPLAY_MAP.items()}
 
 
 class ConfStore:
@@ -321,9 +322,15 @@ def build_settings_tab(app: DesktopApp, parent: tk.Misc) -> None:  # noqa: ARG00
       award_display = store.challenge_award_var.get()
       conf.challenge_live.award = store.challenge_award_display_to_value.get(award_display, ChallengeLiveAward.Crystal)
 
-      app.service.config.save()
-      show_toast(app.root, "保存成功", kind="success")
+      # 写入在后台进行，写入结束后再在 UI 线程提示结果
+      app.service.config.save(lambda error: app.call_soon(lambda: _on_saved(error)))
     except Exception as e:
       show_toast(app.root, f"保存失败：{e}", kind="danger")
 
+  def _on_saved(error: Exception | None) -> None:
+    if error is None:
+      show_toast(app.root, "保存成功", kind="success")
+    else:
+      show_toast(app.root, f"保存失败：{error}", kind="danger")
+
   tb.Button(actions, text="保存", command=on_save).pack(anchor=tk.W)
\ No newline at end of file
@@ -1,9 +1,11 @@
+import threading
 import tkinter as tk
 
 import ttkbootstrap as tb
 from tkinter import messagebox
 
 from .index import DesktopApp
+from .toast import show_toast
 
 
 def build_control_tab(app: DesktopApp, parent: tk.Misc) -> None:
@@ -36,11 +38,14 @@ def build_control_tab(app: DesktopApp, parent: tk.Misc) -> None:
       btn_toggle.configure(text="停止", bootstyle="danger")  # type: ignore[call-arg]
     else:
       btn_toggle.configure(text="启动", bootstyle="success")  # type: ignore[call-arg]
-    # 刷新当前任务
-    lbl_current.configure(text=f"正在执行：{sch.current_task_name or '-'}")
-    # 刷新单任务运行按钮状态
+    # 刷新当前任务与排队数
+    text = f"正在执行：{sch.current_task_name or '-'}"
+    if sch.queue_depth:
+      text += f"（排队 {sch.queue_depth} 个）"
+    lbl_current.configure(text=text)
+    # 刷新单任务运行按钮状态。运行中点击会加入队列
     try:
-      is_run_disabled = is_transition or sch.running
+      is_run_disabled = is_transition
       for b in (btn_run_start_game, btn_run_single_live, btn_run_challenge_live, btn_run_activity_story, btn_run_cm):
         if b is not None:
           b.configure(state=(tk.DISABLED if is_run_disabled else tk.NORMAL))
@@ -55,24 +60,38 @@ def build_control_tab(app: DesktopApp, parent: tk.Misc) -> None:
       app.on_stop()
     else:
       app.on_start()
-    # 触发一次 UI 刷新，随后用 after 循环持续刷新几次以反映状态变化
+    # 立即刷新一次，之后的状态变化由调度器事件驱动
     _refresh_power_button()
 
   btn_toggle.configure(command=_on_toggle)
   btn_toggle.pack(side=tk.LEFT, padx=(12, 8), pady=10)
   lbl_current.pack(side=tk.LEFT, padx=(8, 12))
 
-  def _schedule_refresh_loop() -> None:
+  # 调度器事件来自工作线程。订阅者只记下有新事件，刷新交给 UI 线程执行，
+  # 见 `DesktopApp.call_soon`。一批事件只刷新一次。
+  refresh_pending = threading.Event()
+
+  def _refresh_from_events() -> None:
+    refresh_pending.clear()
     try:
       _refresh_power_button()
-      # 周期性刷新按钮状态（窗口仍存在时才继续）
-      if parent.winfo_exists():
-        parent.after(300, _schedule_refresh_loop)
     except tk.TclError:
       # 窗口销毁后可能触发异常，安全忽略
       pass
 
-  _schedule_refresh_loop()
+  def _on_scheduler_event(event) -> None:
+    if not refresh_pending.is_set():
+      refresh_pending.set()
+      app.call_soon(_refresh_from_events)
+
+  unsubscribe = app.service.scheduler.events.subscribe(_on_scheduler_event)
+
+  def _on_destroy(event: tk.Event) -> None:
+    if event.widget is parent:
+      unsubscribe()
+
+  parent.bind("<Destroy>", _on_destroy, add="+")
+  _refresh_power_button()
 
   # 任务区域
   lf_tasks = tb.Labelframe(parent, text="任务")
@@ -97,12 +116,18 @@ def build_control_tab(app: DesktopApp, parent: tk.Misc) -> None:
     conf.scheduler.challenge_live_enabled = bool(var_challenge_live.get())
     conf.scheduler.activity_story_enabled = bool(var_activity_story.get())
     conf.scheduler.cm_enabled = bool(var_auto_cm.get())
-    app.service.config.save()
+    app.service.config.save(_on_saved)
+
+  def _on_saved(error: Exception | None) -> None:
+    # 勾选后自动保存，成功时不打扰；失败时在 UI 线程提示
+    if error is not None:
+      app.call_soon(lambda: show_toast(app.root, f"保存失败：{error}", kind="danger"))
 
   def _on_run(task_id: str) -> None:
     sch = app.service.scheduler
-    if sch.is_starting or sch.is_stopping or sch.running:
+    if sch.is_starting or sch.is_stopping:
       return
+    # 正在运行时排在当前运行之后
     sch.run_single(task_id, run_in_thread=True)
     _refresh_power_button()
 
@@ -144,7 +169,17 @@ def build_control_tab(app: DesktopApp, parent: tk.Misc) -> None:
     )
     if not confirm:
       return
-    sch.run_single("ten_songs", run_in_thread=True)
+    preempt = False
+    if sch.running:
+      answer = messagebox.askyesnocancel(
+        "加入队列",
+        "当前正在运行其他任务。\n是：当前任务结束后立即执行（插队）\n否：本次运行的任务全部结束后执行",
+        parent=app.root,
+      )
+      if answer is None:
+        return
+      preempt = answer
+    sch.run_single("ten_songs", run_in_thread=True, preempt=preempt)
 
   btn_ten_songs = tb.Button(lf_tasks, text="刷完成歌曲首数", command=_on_ten_songs)
   btn_ten_songs.grid(row=1, column=0, sticky=tk.W, padx=20, pady=(8, 16))
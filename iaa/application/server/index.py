@@ -0,0 +1,408 @@
+import re
+import json
+import asyncio
+import logging
+import threading
+import dataclasses
+from http import HTTPStatus
+from typing import TYPE_CHECKING, Any, Callable
+
+from iaa.tasks.registry import MANUAL_TASKS, REGULAR_TASKS, name_from_id
+from ..service.events import SchedulerEvent
+from ..service.scheduler import SchedulerService
+from .websocket import (
+    OP_CLOSE, OP_PING, OP_PONG, OP_TEXT, WebSocketClosed, accept_key, encode_frame, read_frame,
+)
+
+if TYPE_CHECKING:
+    from ..service.iaa_service import IaaService
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEVICE = 'default'
+"""未绑定实例的设备 ID，对应配置中的设备"""
+CLIENT_QUEUE_SIZE = 1000
+"""每个 WebSocket 客户端最多积压的消息数。超过时断开该客户端，而不是等待它。"""
+MAX_BODY = 64 * 1024
+"""请求体的最大长度"""
+HEADER_TIMEOUT = 10
+"""读取请求头的超时时间（秒）"""
+SHUTDOWN_TIMEOUT = 2
+"""停止服务时等待连接发送完毕的时间（秒）。超时后直接断开。"""
+
+
+class HttpError(Exception):
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+@dataclasses.dataclass
+class Device:
+    """API 管理的一台设备。"""
+    id: str
+    """设备 ID。MuMu 实例 ID 或 `DEFAULT_DEVICE`"""
+    scheduler: SchedulerService
+    """该设备独占的调度器"""
+
+    def status(self) -> dict[str, Any]:
+        sch = self.scheduler
+        return {
+            'id': self.id,
+            'state': sch.state,
+            'current_task_id': sch.current_task_id,
+            'current_task_name': sch.current_task_name,
+            'next_run_at': sch.next_run_at,
+            'queue': [dataclasses.asdict(r) for r in sch.queue.snapshot()],
+            'queue_depth': sch.queue_depth,
+            'queue_wait': sch.queue_wait,
+        }
+
+
+def _event_type(event: SchedulerEvent) -> str:
+    return re.sub(r'(?<!^)(?=[A-Z])', '_', type(event).__name__).lower()
+
+
+class _BroadcastLogHandler(logging.Handler):
+    """把日志转发给所有 WebSocket 客户端。`emit` 只投递到事件循环，不会阻塞调用线程。"""
+    def __init__(self, post: Callable[[dict[str, Any]], None], level: int):
+        super().__init__(level)
+        self.post = post
+        self.setFormatter(logging.Formatter('%(message)s'))
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.post({
+                'type': 'log',
+                'time': record.created,
+                'level': record.levelname,
+                'logger': record.name,
+                'thread': record.threadName,
+                'message': self.format(record),
+            })
+        except Exception:  # noqa: BLE001
+            self.handleError(record)
+
+
+def discover_devices(iaa: 'IaaService', instance_ids: list[str] | None = None) -> list[str]:
+    """
+    返回要管理的设备 ID。
+
+    :param instance_ids: 指定的 MuMu 实例 ID。为 None 时，MuMu 模拟器使用所有正在运行的实例，
+        其他模拟器只管理配置中的设备。
+    """
+    if instance_ids:
+        return instance_ids
+    if iaa.config.conf.game.emulator == 'mumu':
+        from iaa.device.factory import list_instances
+        ids = list_instances()
+        if ids:
+            return ids
+    return [DEFAULT_DEVICE]
+
+
+class ApiServer:
+    """
+    无界面运行时的本地 HTTP/WebSocket 控制接口。
+
+    每台设备各有一个 `SchedulerService`，可以分别启动、停止与排队任务。
+    所有连接都在一个 asyncio 事件循环中处理；调度器事件与日志由工作线程通过
+    `call_soon_threadsafe` 投递到事件循环，因此客户端再多、再慢也不会阻塞任务执行。
+
+    HTTP 接口（请求与响应均为 JSON）：
+
+    * `GET /api/tasks`：可用的任务
+    * `GET /api/devices`、`GET /api/devices/<id>`：设备状态
+    * `POST /api/devices/<id>/start`：启动常规任务，`{"mode": "daemon"}` 时以守护模式启动
+    * `POST /api/devices/<id>/stop`：停止
+    * `POST /api/devices/<id>/queue`：`{"task_id": ..., "priority": 0, "preempt": false}`，
+      排队一个任务，见 `SchedulerService.enqueue`
+    * `DELETE /api/devices/<id>/queue`：清空队列
+
+    WebSocket `/api/events`：连接后先收到 `snapshot`，之后持续收到调度器事件与 `log`。
+    """
+    def __init__(
+        self,
+        iaa: 'IaaService',
+        devices: list[str] | None = None,
+        *,
+        host: str = '127.0.0.1',
+        port: int = 8765,
+        log_level: int = logging.INFO,
+    ):
+        """
+        :param devices: 设备 ID，见 `discover_devices`。为 None 时只管理配置中的设备。
+        :param host: 监听地址。默认只接受本机连接。
+        :param port: 监听端口。为 0 时由系统分配，实际端口见 `port`。
+        :param log_level: 推送给客户端的最低日志级别。
+        """
+        self.iaa = iaa
+        self.host = host
+        self.port = port
+        self.log_level = log_level
+        self.devices: dict[str, Device] = {}
+        for device_id in devices or [DEFAULT_DEVICE]:
+            if device_id == DEFAULT_DEVICE:
+                scheduler = iaa.scheduler
+            else:
+                scheduler = SchedulerService(iaa, instance_id=device_id)
+            self.devices[device_id] = Device(device_id, scheduler)
+        self.__loop: asyncio.AbstractEventLoop | None = None
+        self.__shutdown: asyncio.Event | None = None
+        self.__clients: set[asyncio.Queue] = set()
+        self.__connections: dict[asyncio.Task, asyncio.StreamWriter] = {}
+        self.__ready = threading.Event()
+        self.__thread: threading.Thread | None = None
+
+    # -------------------- Lifecycle --------------------
+    def run(self) -> None:
+        """在当前线程运行，直至调用 `shutdown()`。退出前停止所有设备。"""
+        try:
+            asyncio.run(self.__serve())
+        finally:
+            self.__ready.set()
+            for device in self.devices.values():
+                if device.scheduler.running:
+                    device.scheduler.stop(block=True)
+
+    def start(self) -> None:
+        """在后台线程中运行，监听开始后返回。"""
+        self.__thread = threading.Thread(target=self.run, name='IAA-Api', daemon=True)
+        self.__thread.start()
+        self.__ready.wait()
+
+    def shutdown(self) -> None:
+        """请求停止服务。可以在任意线程中调用。"""
+        loop, event = self.__loop, self.__shutdown
+        if loop is not None and event is not None:
+            loop.call_soon_threadsafe(event.set)
+        if self.__thread is not None and self.__thread is not threading.current_thread():
+            self.__thread.join()
+
+    async def __serve(self) -> None:
+        self.__loop = asyncio.get_running_loop()
+        self.__shutdown = asyncio.Event()
+        unsubscribes = [
+            device.scheduler.events.subscribe(self.__event_forwarder(device))
+            for device in self.devices.values()
+        ]
+        log_handler = _BroadcastLogHandler(self.__post, self.log_level)
+        logging.getLogger().addHandler(log_handler)
+        server = await asyncio.start_server(self.__handle, self.host, self.port)
+        try:
+            self.port = server.sockets[0].getsockname()[1]
+            logger.info(f"API server listening on http://{self.host}:{self.port}")
+            self.__ready.set()
+            await self.__shutdown.wait()
+        finally:
+            logging.getLogger().removeHandler(log_handler)
+            for unsubscribe in unsubscribes:
+                unsubscribe()
+            for client in list(self.__clients):
+                self.__disconnect(client)
+            server.close()
+            await self.__close_connections()
+            await server.wait_closed()
+            self.__loop = None
+            logger.info("API server stopped.")
+
+    async def __close_connections(self) -> None:
+        """等待连接处理结束，超时的连接直接断开，避免事件循环关闭时取消它们。"""
+        if self.__connections:
+            await asyncio.wait(list(self.__connections), timeout=SHUTDOWN_TIMEOUT)
+        for writer in list(self.__connections.values()):
+            writer.transport.abort()
+        if self.__connections:
+            await asyncio.wait(list(self.__connections))
+
+    # -------------------- Events --------------------
+    def __post(self, message: dict[str, Any]) -> None:
+        """从任意线程投递一条消息给所有客户端。"""
+        loop = self.__loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self.__broadcast, message)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
+
+    def __event_forwarder(self, device: Device) -> Callable[[SchedulerEvent], None]:
+        def _forward(event: SchedulerEvent) -> None:
+            message = dataclasses.asdict(event)
+            message.update(type=_event_type(event), device=device.id)
+            self.__post(message)
+        return _forward
+
+    def __broadcast(self, message: dict[str, Any]) -> None:
+        for client in list(self.__clients):
+            try:
+                client.put_nowait(message)
+            except asyncio.QueueFull:
+                # 客户端跟不上，断开它而不是积压
+                self.__disconnect(client)
+
+    def __disconnect(self, client: asyncio.Queue) -> None:
+        """让客户端的发送循环在发完已积压的消息前结束。"""
+        self.__clients.discard(client)
+        while not client.empty():
+            client.get_nowait()
+        client.put_nowait(None)
+
+    # -------------------- HTTP --------------------
+    def __device(self, device_id: str) -> Device:
+        device = self.devices.get(device_id)
+        if device is None:
+            raise HttpError(HTTPStatus.NOT_FOUND, f"Unknown device: {device_id}")
+        return device
+
+    def __route(self, method: str, path: str, body: dict[str, Any]) -> tuple[HTTPStatus, Any]:
+        parts = [p for p in path.split('/') if p]
+        if parts[:1] != ['api']:
+            raise HttpError(HTTPStatus.NOT_FOUND, f"Not found: {path}")
+        parts = parts[1:]
+        if parts == ['tasks'] and method == 'GET':
+            return HTTPStatus.OK, {
+                'regular': [{'id': t, 'name': name_from_id(t)} for t in REGULAR_TASKS],
+                'manual': [{'id': t, 'name': name_from_id(t)} for t in MANUAL_TASKS],
+            }
+        if parts == ['devices'] and method == 'GET':
+            return HTTPStatus.OK, [d.status() for d in self.devices.values()]
+        if len(parts) < 2 or parts[0] != 'devices':
+            raise HttpError(HTTPStatus.NOT_FOUND, f"Not found: {path}")
+        device = self.__device(parts[1])
+        action = parts[2:]
+        sch = device.scheduler
+        if action == [] and method == 'GET':
+            return HTTPStatus.OK, device.status()
+        if action == ['start'] and method == 'POST':
+            if sch.state != 'idle':
+                raise HttpError(HTTPStatus.CONFLICT, f"Device {device.id} is {sch.state}")
+            mode = body.get('mode', 'regular')
+            if mode == 'regular':
+                sch.start_regular()
+            elif mode == 'daemon':
+                sch.start_daemon()
+            else:
+                raise HttpError(HTTPStatus.BAD_REQUEST, f"Unknown mode: {mode}")
+            return HTTPStatus.ACCEPTED, device.status()
+        if action == ['stop'] and method == 'POST':
+            if not sch.running:
+                raise HttpError(HTTPStatus.CONFLICT, f"Device {device.id} is not running")
+            sch.stop()
+            return HTTPStatus.ACCEPTED, device.status()
+        if action == ['queue'] and method == 'POST':
+            task_id = body.get('task_id')
+            priority = body.get('priority', 0)
+            if task_id not in MANUAL_TASKS and task_id not in REGULAR_TASKS:
+                raise HttpError(HTTPStatus.BAD_REQUEST, f"Unknown task: {task_id}")
+            if not isinstance(priority, int):
+                raise HttpError(HTTPStatus.BAD_REQUEST, f"Invalid priority: {priority}")
+            sch.enqueue(task_id, priority=priority, preempt=bool(body.get('preempt', False)))
+            return HTTPStatus.ACCEPTED, device.status()
+        if action == ['queue'] and method == 'DELETE':
+            sch.clear_queue()
+            return HTTPStatus.OK, device.status()
+        raise HttpError(HTTPStatus.NOT_FOUND, f"Not found: {method} {path}")
+
+    async def __handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        assert task is not None
+        self.__connections[task] = writer
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), HEADER_TIMEOUT)
+            request_line, *header_lines = head.decode('latin-1').split('\r\n')
+            method, target, _ = request_line.split(' ', 2)
+            headers = {}
+            for line in header_lines:
+                name, sep, value = line.partition(':')
+                if sep:
+                    headers[name.strip().lower()] = value.strip()
+            path = target.split('?', 1)[0]
+            if headers.get('upgrade', '').lower() == 'websocket':
+                if path != '/api/events' or 'sec-websocket-key' not in headers:
+                    await self.__respond(writer, HTTPStatus.NOT_FOUND, {'error': f"Not found: {path}"})
+                    return
+                await self.__websocket(reader, writer, headers['sec-websocket-key'])
+                return
+            length = int(headers.get('content-length', 0))
+            if length > MAX_BODY:
+                raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, 'Request body too large')
+            raw = await reader.readexactly(length) if length else b''
+            try:
+                body = json.loads(raw) if raw else {}
+            except ValueError:
+                raise HttpError(HTTPStatus.BAD_REQUEST, 'Invalid JSON body')
+            if not isinstance(body, dict):
+                raise HttpError(HTTPStatus.BAD_REQUEST, 'JSON body must be an object')
+            status, data = self.__route(method.upper(), path, body)
+            await self.__respond(writer, status, data)
+        except HttpError as e:
+            await self.__respond(writer, e.status, {'error': e.message})
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        except ValueError:
+            await self.__respond(writer, HTTPStatus.BAD_REQUEST, {'error': 'Malformed request'})
+        except Exception as e:  # noqa: BLE001
+            logger.exception(f"API request failed: {e}")
+            await self.__respond(writer, HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)})
+        finally:
+            writer.close()
+            del self.__connections[task]
+
+    @staticmethod
+    async def __respond(writer: asyncio.StreamWriter, status: HTTPStatus, data: Any) -> None:
+        payload = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: close\r\n\r\n".encode('latin-1') + payload
+        )
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    # -------------------- WebSocket --------------------
+    async def __websocket(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, key: str) -> None:
+        writer.write(
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept_key(key)}\r\n\r\n".encode('latin-1')
+        )
+        client: asyncio.Queue = asyncio.Queue(CLIENT_QUEUE_SIZE)
+        client.put_nowait({'type': 'snapshot', 'devices': [d.status() for d in self.devices.values()]})
+        self.__clients.add(client)
+
+        async def _receive() -> None:
+            # 只处理控制帧；客户端关闭或发来不合法的帧时结束
+            while True:
+                opcode, payload = await read_frame(reader)
+                if opcode == OP_CLOSE:
+                    return
+                if opcode == OP_PING:
+                    writer.write(encode_frame(OP_PONG, payload))
+
+        receiver = asyncio.ensure_future(_receive())
+        try:
+            while True:
+                getter = asyncio.ensure_future(client.get())
+                done, _ = await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+                if getter not in done:
+                    getter.cancel()
+                    break
+                message = getter.result()
+                if message is None:
+                    break
+                writer.write(encode_frame(OP_TEXT, json.dumps(message, ensure_ascii=False).encode('utf-8')))
+                await writer.drain()
+            writer.write(encode_frame(OP_CLOSE))
+            await writer.drain()
+        except (ConnectionError, WebSocketClosed):
+            pass
+        finally:
+            self.__clients.discard(client)
+            receiver.cancel()
@@ -0,0 +1,61 @@
+import base64
+import struct
+import asyncio
+import hashlib
+
+_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+OP_TEXT = 0x1
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+MAX_CLIENT_FRAME = 64 * 1024
+"""客户端帧的最大长度。客户端只会发送控制帧与少量文本，超过时断开连接。"""
+
+
+class WebSocketClosed(Exception):
+    """对端关闭了连接。"""
+
+
+def accept_key(key: str) -> str:
+    """根据客户端的 `Sec-WebSocket-Key` 计算 `Sec-WebSocket-Accept`。"""
+    digest = hashlib.sha1((key + _GUID).encode('ascii')).digest()
+    return base64.b64encode(digest).decode('ascii')
+
+
+def encode_frame(opcode: int, payload: bytes = b'') -> bytes:
+    """编码一个服务端帧（不加掩码，不分片）。"""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+    return header + payload
+
+
+async def read_frame(reader: asyncio.StreamReader) -> tuple[int, bytes]:
+    """
+    读取一个客户端帧。
+
+    :return: `(opcode, payload)`。
+    :raises WebSocketClosed: 连接已关闭或帧不合法。
+    """
+    try:
+        b1, b2 = await reader.readexactly(2)
+        length = b2 & 0x7F
+        if length == 126:
+            (length,) = struct.unpack('!H', await reader.readexactly(2))
+        elif length == 127:
+            (length,) = struct.unpack('!Q', await reader.readexactly(8))
+        if length > MAX_CLIENT_FRAME:
+            raise WebSocketClosed(f'Frame too large: {length}')
+        mask = await reader.readexactly(4) if b2 & 0x80 else b''
+        payload = await reader.readexactly(length)
+    except (asyncio.IncompleteReadError, ConnectionError) as e:
+        raise WebSocketClosed(str(e)) from e
+    if mask:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return b1 & 0x0F, payload
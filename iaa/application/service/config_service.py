@@ -1,24 +1,190 @@
 import os
-from typing import TYPE_CHECKING
+import time
+import atexit
+import threading
+from typing import TYPE_CHECKING, Callable
 
 from kotonebot import logging
 from iaa.config import manager
+from iaa.config.base import IaaConfig
 if TYPE_CHECKING:
     from .iaa_service import IaaService
 
 logger = logging.getLogger(__name__)
 
 DEFAULT_CONFIG_NAME = 'default'
+SAVE_DELAY = 0.5
+"""`ConfigService.save` 合并写入的延迟（秒）"""
+
+WriteCallback = Callable[[Exception | None], None]
+"""写入结束后的回调。参数为写入失败时的异常，成功时为 None。"""
+
+
+class ConfigWriter:
+    """
+    在后台线程中延迟执行写入，合并短时间内的多次请求。
+
+    每次 `schedule` 都会把写入推迟到 `delay` 秒后，连续操作只写入一次。
+    """
+    def __init__(self, write: Callable[[], None], delay: float = SAVE_DELAY):
+        """
+        :param write: 执行写入的函数。在后台线程或调用 `flush` 的线程中调用。
+        :param delay: 延迟（秒）。
+        """
+        self.write = write
+        self.delay = delay
+        self.__cond = threading.Condition()
+        self.__due: float | None = None
+        self.__callbacks: list[WriteCallback] = []
+        self.__writing = False
+        self.__thread: threading.Thread | None = None
+
+    @property
+    def pending(self) -> bool:
+        """是否有尚未写入的请求"""
+        return self.__due is not None
+
+    def schedule(self, callback: WriteCallback | None = None) -> None:
+        """
+        请求写入。
+
+        :param callback: 包含本次请求的写入结束后调用，见 `WriteCallback`。
+            在执行写入的线程中调用。
+        """
+        with self.__cond:
+            self.__due = time.monotonic() + self.delay
+            if callback is not None:
+                self.__callbacks.append(callback)
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__run, name='IAA-ConfigWriter', daemon=True)
+                self.__thread.start()
+            self.__cond.notify_all()
+
+    def flush(self) -> None:
+        """立即执行尚未执行的写入，并等待正在进行的写入结束。"""
+        with self.__cond:
+            while self.__writing:
+                self.__cond.wait()
+            pending, self.__due = self.__due is not None, None
+            callbacks, self.__callbacks = self.__callbacks, []
+        if pending:
+            self.__notify(callbacks, self.__write())
+
+    def __run(self) -> None:
+        while True:
+            with self.__cond:
+                while self.__due is None:
+                    self.__cond.wait()
+                remaining = self.__due - time.monotonic()
+                if remaining > 0:
+                    self.__cond.wait(remaining)
+                    continue
+                self.__due = None
+                callbacks, self.__callbacks = self.__callbacks, []
+                self.__writing = True
+            try:
+                error = self.__write()
+            finally:
+                with self.__cond:
+                    self.__writing = False
+                    self.__cond.notify_all()
+            # 回调可能等待其他线程（如 UI 线程），不能让 `flush` 等待回调
+            self.__notify(callbacks, error)
+
+    def __write(self) -> Exception | None:
+        try:
+            self.write()
+        except Exception as e:
+            logger.exception("Failed to write config")
+            return e
+        return None
+
+    @staticmethod
+    def __notify(callbacks: list[WriteCallback], error: Exception | None) -> None:
+        for callback in callbacks:
+            try:
+                callback(error)
+            except Exception:
+                logger.exception("Config write callback raised an exception")
+
 
 class ConfigService:
     def __init__(self, iaa_service: 'IaaService'):
         self.iaa = iaa_service
         manager.config_path = os.path.join(self.iaa.root, 'conf')
-        self.conf = manager.read(DEFAULT_CONFIG_NAME, not_exist='create')
+        self.name = DEFAULT_CONFIG_NAME
+        """当前配置名称"""
+        self.conf = manager.read(self.name, not_exist='create')
+        """当前配置。外部修改配置文件并重新加载后，内容会原地更新，实例保持不变。"""
+        self.__watch_stop: threading.Event | None = None
+        self.__writer = ConfigWriter(self.__write)
+        atexit.register(self.flush)
 
     def list(self) -> list[str]:
         return manager.list()
 
-    def save(self) -> None:
-        logger.info(f"Save config: {DEFAULT_CONFIG_NAME}")
-        manager.write(DEFAULT_CONFIG_NAME, self.conf)
\ No newline at end of file
+    def save(self, callback: WriteCallback | None = None) -> None:
+        """
+        保存配置。
+
+        写入在后台线程中延迟执行，短时间内的多次保存只写入一次，不会阻塞调用线程（例如 UI 线程）。
+        因此本方法返回时配置尚未写入，写入结果（包括失败）通过 `callback` 告知。
+        退出前调用 `flush`；进程正常退出时也会自动调用。
+
+        :param callback: 写入结束后调用，参数为写入失败时的异常，成功时为 None。
+            在后台线程中调用，更新 UI 时需要转交 UI 线程。
+        """
+        self.__writer.schedule(callback)
+
+    def flush(self) -> None:
+        """立即写入尚未写入的修改。"""
+        self.__writer.flush()
+
+    def __write(self) -> None:
+        logger.info(f"Save config: {self.name}")
+        manager.write(self.name, self.conf)
+
+    def reload(self) -> IaaConfig:
+        """
+        文件有变化时重新加载配置，见 `manager.read`。没有变化时只检查文件的修改时间与大小。
+
+        :return: 当前配置，即 `conf`。
+        """
+        try:
+            manager.read(self.name)
+        except OSError as e:
+            logger.warning(f"Failed to reload config '{self.name}': {e}")
+        return self.conf
+
+    def subscribe(self, callback: Callable[[manager.ConfigChanges], None]) -> Callable[[], None]:
+        """
+        订阅当前配置的外部修改。参数为变化的字段，见 `manager.diff`。
+
+        :return: 取消订阅的函数。
+        """
+        def _filter(name: str, conf: IaaConfig, changes: manager.ConfigChanges) -> None:
+            if name == self.name:
+                callback(changes)
+        return manager.subscribe(_filter)
+
+    def watch(self, interval: float = 2) -> None:
+        """
+        在后台线程中定期调用 `reload`，使外部修改无需重启即可生效。
+
+        :param interval: 检查间隔（秒）。
+        """
+        if self.__watch_stop is not None:
+            return
+        stop = self.__watch_stop = threading.Event()
+
+        def _watch() -> None:
+            while not stop.wait(interval):
+                self.reload()
+
+        threading.Thread(target=_watch, name='IAA-ConfigWatch', daemon=True).start()
+
+    def unwatch(self) -> None:
+        """停止 `watch`。"""
+        if self.__watch_stop is not None:
+            self.__watch_stop.set()
+            self.__watch_stop = None
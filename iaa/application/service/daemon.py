@@ -0,0 +1,215 @@
+import time
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING
+
+from iaa.ledger import DAILY_RESET_HOUR, SERVER_TIMEZONES
+
+if TYPE_CHECKING:
+    from iaa.config.base import IaaConfig
+
+MAX_SLEEP_SEC = 3600
+"""单次等待的最长时间。系统休眠或调整时钟后最迟在此时间内重新计算触发时间。"""
+DEFAULT_DAILY_TIME = f'{DAILY_RESET_HOUR:02d}:10'
+"""`daemon_times` 中未列出的任务的默认触发时间：每日重置后不久"""
+
+
+class Clock:
+    """守护模式使用的时钟。测试时可替换为 `ManualClock`。"""
+    def time(self) -> float:
+        """返回当前 UNIX 时间戳。"""
+        return time.time()
+
+    def wait(self, event: threading.Event, timeout: float) -> bool:
+        """
+        等待 `event` 被设置，最多等待 `timeout` 秒。
+
+        :return: `event` 是否已被设置。
+        """
+        return event.wait(timeout)
+
+
+class ManualClock(Clock):
+    """手动推进的时钟。`wait` 不会真正等待，而是直接把时间推进 `timeout` 秒。"""
+    def __init__(self, now: float):
+        self.now = now
+        self.waits: list[float] = []
+        """每次 `wait` 的时长"""
+
+    def time(self) -> float:
+        return self.now
+
+    def wait(self, event: threading.Event, timeout: float) -> bool:
+        self.waits.append(timeout)
+        if event.is_set():
+            return True
+        self.now += timeout
+        return False
+
+
+class Trigger(ABC):
+    """任务触发条件。"""
+    @abstractmethod
+    def next_fire(self, after: float) -> float:
+        """返回 `after` 之后的下一次触发时间。"""
+
+    def on_run(self, finished_at: float) -> None:
+        """任务执行结束后调用。"""
+
+    def params(self) -> tuple:
+        """触发条件的参数。参数相同的同类触发条件视为相同，见 `DaemonSchedule.update`。"""
+        return ()
+
+
+class DailyTrigger(Trigger):
+    """每天在服务器时区的固定时间触发。"""
+    def __init__(self, server: str, times: list[str]):
+        """
+        :param server: 服务器，见 `GameConfig.server`。
+        :param times: 触发时间，格式为 `HH:MM`。
+        """
+        if not times:
+            raise ValueError('DailyTrigger requires at least one time.')
+        self.tz = SERVER_TIMEZONES[server]
+        self.times = sorted(self.parse(t) for t in times)
+
+    @staticmethod
+    def parse(text: str) -> tuple[int, int]:
+        hour, _, minute = text.partition(':')
+        h, m = int(hour), int(minute or 0)
+        if not (0 <= h < 24 and 0 <= m < 60):
+            raise ValueError(f'Invalid trigger time: {text!r}')
+        return h, m
+
+    def params(self) -> tuple:
+        return self.tz, tuple(self.times)
+
+    def next_fire(self, after: float) -> float:
+        local = datetime.fromtimestamp(after, self.tz)
+        for days in (0, 1):
+            day = local + timedelta(days=days)
+            for h, m in self.times:
+                at = day.replace(hour=h, minute=m, second=0, microsecond=0)
+                if at > local:
+                    return at.timestamp()
+        raise AssertionError('unreachable')
+
+
+class ApTrigger(Trigger):
+    """
+    在预测 AP 接近上限时触发。
+
+    假设每次执行结束时 AP 已经耗尽，此后按固定速度恢复。
+    首次（尚不知道 AP）时立即触发。
+    """
+    def __init__(self, cap: int, regen_sec: float, margin: int = 1):
+        """
+        :param cap: AP 上限。
+        :param regen_sec: 恢复 1 点 AP 所需的秒数。
+        :param margin: 距离上限还有多少点时触发。
+        """
+        self.cap = cap
+        self.regen_sec = regen_sec
+        self.margin = margin
+        self.depleted_at: float | None = None
+        """上一次耗尽 AP 的时间"""
+
+    def predict(self, now: float) -> float:
+        """预测 `now` 时的 AP。未知时返回上限。"""
+        if self.depleted_at is None:
+            return self.cap
+        return min(self.cap, (now - self.depleted_at) / self.regen_sec)
+
+    def next_fire(self, after: float) -> float:
+        if self.depleted_at is None:
+            return after
+        return max(after, self.depleted_at + max(self.cap - self.margin, 0) * self.regen_sec)
+
+    def on_run(self, finished_at: float) -> None:
+        self.depleted_at = finished_at
+
+    def params(self) -> tuple:
+        return self.cap, self.regen_sec, self.margin
+
+
+class DaemonSchedule:
+    """
+    守护模式的触发计划。
+
+    只负责计算何时执行哪些任务，不执行任务，也不等待。
+    启动时所有任务立即到期一次，之后按各自的触发条件到期。
+    """
+    def __init__(self, triggers: dict[str, Trigger], now: float):
+        """
+        :param triggers: 任务 ID 到触发条件的映射。
+        :param now: 当前时间。
+        """
+        self.triggers = triggers
+        self.next_at: dict[str, float] = {task_id: now for task_id in triggers}
+        """各任务的下一次触发时间"""
+
+    def due(self, now: float) -> list[str]:
+        """返回已经到期的任务 ID，顺序与 `triggers` 一致。"""
+        return [task_id for task_id, at in self.next_at.items() if at <= now]
+
+    def next_wakeup(self) -> float | None:
+        """返回最早的触发时间。没有任何任务时返回 None。"""
+        return min(self.next_at.values(), default=None)
+
+    def update(self, triggers: dict[str, Trigger], now: float) -> list[str]:
+        """
+        替换触发条件，例如配置被修改后。
+
+        条件没有变化的任务保持原来的触发时间；条件变化的任务按新条件重新计算，
+        AP 触发保留已知的耗尽时间；新增的任务立即到期，与启动时一致。
+
+        :return: 触发条件有变化的任务 ID。
+        """
+        changed = []
+        next_at: dict[str, float] = {}
+        for task_id, trigger in triggers.items():
+            old = self.triggers.get(task_id)
+            if old is not None and type(old) is type(trigger) and old.params() == trigger.params():
+                triggers[task_id] = old
+                next_at[task_id] = self.next_at[task_id]
+                continue
+            changed.append(task_id)
+            if old is None:
+                next_at[task_id] = now
+                continue
+            if isinstance(old, ApTrigger) and isinstance(trigger, ApTrigger):
+                trigger.depleted_at = old.depleted_at
+            next_at[task_id] = trigger.next_fire(now)
+        changed.extend(task_id for task_id in self.triggers if task_id not in triggers)
+        self.triggers = triggers
+        self.next_at = next_at
+        return changed
+
+    def on_run(self, task_id: str, finished_at: float) -> None:
+        """任务执行结束后调用，计算其下一次触发时间。"""
+        trigger = self.triggers[task_id]
+        trigger.on_run(finished_at)
+        self.next_at[task_id] = trigger.next_fire(finished_at)
+
+
+def build_triggers(conf: 'IaaConfig', task_ids: list[str]) -> dict[str, Trigger]:
+    """
+    按配置为任务创建触发条件，见 `SchedulerConfig.daemon_times`。
+
+    未列出的任务（`solo_live` 除外）每天在 `DEFAULT_DAILY_TIME` 触发。
+
+    :param conf: 使用的配置。
+    :param task_ids: 启用的任务 ID。
+    """
+    sched = conf.scheduler
+    triggers: dict[str, Trigger] = {}
+    for task_id in task_ids:
+        times = sched.daemon_times.get(task_id)
+        if times:
+            triggers[task_id] = DailyTrigger(conf.game.server, times)
+        elif task_id == 'solo_live':
+            triggers[task_id] = ApTrigger(sched.ap_cap, sched.ap_regen_minutes * 60, sched.ap_trigger_margin)
+        else:
+            triggers[task_id] = DailyTrigger(conf.game.server, [DEFAULT_DAILY_TIME])
+    return triggers
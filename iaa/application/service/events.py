@@ -0,0 +1,111 @@
+import time
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Literal
+
+logger = logging.getLogger(__name__)
+
+SchedulerState = Literal['idle', 'starting', 'running', 'stopping']
+
+
+@dataclass(frozen=True)
+class SchedulerEvent:
+    """调度器事件的基类。"""
+    time: float = field(default_factory=time.time, kw_only=True)
+    """事件发生的时间戳"""
+
+
+@dataclass(frozen=True)
+class StateChanged(SchedulerEvent):
+    """调度器状态变化。"""
+    state: SchedulerState
+    previous: SchedulerState
+
+
+@dataclass(frozen=True)
+class TaskStarted(SchedulerEvent):
+    """任务开始。"""
+    task_id: str
+    task_name: str
+    instance_id: str | None = None
+    """多设备运行时的 MuMu 实例 ID。单设备运行时为 None。"""
+
+
+@dataclass(frozen=True)
+class TaskFinished(SchedulerEvent):
+    """任务成功结束（包括因今天已完成而跳过）。"""
+    task_id: str
+    task_name: str
+    instance_id: str | None = None
+
+
+@dataclass(frozen=True)
+class TaskFailed(SchedulerEvent):
+    """任务失败。"""
+    task_id: str
+    task_name: str
+    error: str
+    instance_id: str | None = None
+
+
+@dataclass(frozen=True)
+class ProgressUpdated(SchedulerEvent):
+    """多设备运行的进度变化。"""
+    done: int
+    total: int
+    failed: int
+    summary: str
+    """见 `SchedulerService.progress_summary()`"""
+
+
+@dataclass(frozen=True)
+class QueueChanged(SchedulerEvent):
+    """任务队列变化，见 `SchedulerService.enqueue`。"""
+    depth: int
+    """队列中的请求数"""
+    wait: float
+    """等待最久的请求已经等待的秒数"""
+    task_ids: tuple[str, ...]
+    """按执行顺序排列的任务 ID"""
+
+
+Subscriber = Callable[[SchedulerEvent], None]
+
+
+class EventBus:
+    """
+    线程安全的事件总线。
+
+    `publish` 可以在任意线程中调用，订阅者在发布者的线程中被同步调用，
+    因此订阅者应尽快返回。需要在特定线程（如 Tk 主线程）中处理事件时，
+    应由订阅者把处理转交该线程（如 `DesktopApp.call_soon`）。
+    """
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__subscribers: list[Subscriber] = []
+
+    def subscribe(self, callback: Subscriber) -> Callable[[], None]:
+        """
+        订阅所有事件。
+
+        :return: 取消订阅的函数。
+        """
+        with self.__lock:
+            self.__subscribers.append(callback)
+
+        def unsubscribe() -> None:
+            with self.__lock:
+                if callback in self.__subscribers:
+                    self.__subscribers.remove(callback)
+        return unsubscribe
+
+    def publish(self, event: SchedulerEvent) -> None:
+        """发布事件。订阅者抛出的异常会被记录并忽略。"""
+        with self.__lock:
+            subscribers = list(self.__subscribers)
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception:
+                logger.exception("Event subscriber raised an exception")
@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import logging
+import threading
+from dataclasses import asdict, dataclass
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RunRequest:
+    """一次排队的任务请求。"""
+    id: int
+    """请求 ID，按入队顺序递增"""
+    task_id: str
+    """任务 ID"""
+    priority: int = 0
+    """优先级。数值大的先执行，相同时先入队的先执行。"""
+    preempt: bool = False
+    """
+    是否抢占正在进行的运行。
+
+    为 True 时在当前任务结束后立即执行，剩余的任务推后；
+    否则等当前运行的所有任务结束后再执行。
+    """
+    enqueued_at: float = 0
+    """入队时间戳"""
+
+
+class RunQueue:
+    """
+    持久化的任务优先级队列。
+
+    每次变化都写入文件，软件重启后未执行的请求仍然保留。
+    线程安全。
+    """
+    def __init__(self, path: str | None = None, *, clock: Callable[[], float] = time.time):
+        """
+        :param path: 持久化文件路径。为 None 时不持久化。
+        :param clock: 返回当前 UNIX 时间戳的函数。
+        """
+        self.path = path
+        self.clock = clock
+        self.__lock = threading.Lock()
+        self.__requests: list[RunRequest] = self.__load()
+        self.__next_id = max((r.id for r in self.__requests), default=0) + 1
+
+    def __load(self) -> list[RunRequest]:
+        if self.path is None or not os.path.exists(self.path):
+            return []
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                requests = [RunRequest(**item) for item in json.load(f)]
+        except (OSError, ValueError, TypeError):
+            logger.warning(f'Ignoring broken run queue: {self.path}')
+            return []
+        return sorted(requests, key=self.__key)
+
+    def __save(self) -> None:
+        if self.path is None:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump([asdict(r) for r in self.__requests], f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+    @staticmethod
+    def __key(request: RunRequest) -> tuple[int, int]:
+        return -request.priority, request.id
+
+    def __len__(self) -> int:
+        return len(self.__requests)
+
+    def push(self, task_id: str, *, priority: int = 0, preempt: bool = False) -> RunRequest:
+        """
+        加入队列。
+
+        :param task_id: 任务 ID。
+        :param priority: 优先级，见 `RunRequest.priority`。
+        :param preempt: 是否抢占，见 `RunRequest.preempt`。
+        :return: 新的请求。
+        """
+        with self.__lock:
+            request = RunRequest(self.__next_id, task_id, priority, preempt, self.clock())
+            self.__next_id += 1
+            self.__requests.append(request)
+            self.__requests.sort(key=self.__key)
+            self.__save()
+        return request
+
+    def pop(self, *, preempt_only: bool = False) -> RunRequest | None:
+        """
+        取出优先级最高的请求。
+
+        :param preempt_only: 是否只取出需要抢占的请求。
+        :return: 请求。没有符合条件的请求时返回 None。
+        """
+        with self.__lock:
+            for i, request in enumerate(self.__requests):
+                if request.preempt or not preempt_only:
+                    del self.__requests[i]
+                    self.__save()
+                    return request
+        return None
+
+    def remove(self, request_id: int) -> bool:
+        """删除请求。返回是否找到。"""
+        with self.__lock:
+            for i, request in enumerate(self.__requests):
+                if request.id == request_id:
+                    del self.__requests[i]
+                    self.__save()
+                    return True
+        return False
+
+    def clear(self) -> None:
+        """删除所有请求。"""
+        with self.__lock:
+            self.__requests.clear()
+            self.__save()
+
+    def snapshot(self) -> list[RunRequest]:
+        """按执行顺序返回所有请求。"""
+        with self.__lock:
+            return list(self.__requests)
+
+    def oldest_wait(self) -> float:
+        """队列中等待最久的请求已经等待的秒数。队列为空时为 0。"""
+        with self.__lock:
+            if not self.__requests:
+                return 0
+            return max(self.clock() - min(r.enqueued_at for r in self.__requests), 0)
@@ -1,29 +1,261 @@
 ﻿import time
+import queue
 import logging
 import threading
 import os
-from typing import TYPE_CHECKING, Callable
+from collections import deque
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator
 
 if TYPE_CHECKING:
     from .iaa_service import IaaService
+    from .daemon import Clock, DaemonSchedule
+    from .worker_process import WorkerMessage
+    from iaa.config.base import IaaConfig
+    from iaa.ledger import Ledger
 
 from iaa.tasks.registry import REGULAR_TASKS, name_from_id
 from iaa.tasks.registry import MANUAL_TASKS
 from iaa.context import init as init_config_context
+from .events import (
+    EventBus, ProgressUpdated, QueueChanged, SchedulerState, StateChanged, TaskFailed, TaskFinished, TaskStarted,
+)
+from .run_queue import RunQueue, RunRequest
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class WorkerProgress:
+    """单台设备的任务进度。"""
+    instance_id: str
+    """MuMu 实例 ID"""
+    total: int = 0
+    """任务总数"""
+    done: int = 0
+    """已完成的任务数（包括失败的任务）"""
+    failed: int = 0
+    """失败的任务数"""
+    current_task_id: str | None = None
+    """当前正在执行的任务 ID"""
+    finished: bool = False
+    """是否已结束"""
+
+
+class DeviceSession:
+    """一次运行中与设备绑定的资源。由 `prepare_session` 创建。"""
+    def __init__(self, flow: Any, ledger: 'Ledger | None' = None):
+        self.flow = flow
+        """该设备上下文的流程控制器，用于请求停止"""
+        self.ledger = ledger
+        """该账号的每日完成记录，见 `iaa.ledger.Ledger`"""
+        self.capture = None
+        """后台截图线程，见 `iaa.device.capture.CaptureProducer`"""
+        self.frame_buffer = None
+        """nemu_ipc 截图缓冲区，见 `iaa.device.nemu.NemuFrameBuffer`"""
+        self.adb_stream = None
+        """adb 常驻截图连接，见 `iaa.device.adb_stream.AdbStreamCapture`"""
+
+    def log_stats(self, before: dict[str, int]) -> None:
+        """
+        输出调试用的统计信息。
+
+        :param before: 任务开始前的帧缓存统计，用于计算本任务的增量。
+        """
+        from iaa.vision import gate
+        after = gate.current().stats()
+        logger.debug(
+            "Frame cache: %d frames, %d changes, %d hits, %d misses",
+            after['frames'] - before['frames'],
+            after['changes'] - before['changes'],
+            after['hits'] - before['hits'],
+            after['misses'] - before['misses'],
+        )
+        if self.frame_buffer is not None:
+            logger.debug("Frame buffers: %(frames)d frames, %(allocations)d allocations", self.frame_buffer.stats())
+        if self.adb_stream is not None:
+            logger.debug("ADB stream: %(frames)d frames, %(reconnects)d reconnects", self.adb_stream.stats())
+
+    def close(self) -> None:
+        if self.capture is not None:
+            self.capture.stop()
+            self.capture = None
+        if self.frame_buffer is not None:
+            self.frame_buffer.uninstall()
+            self.frame_buffer = None
+        if self.adb_stream is not None:
+            self.adb_stream.uninstall()
+            self.adb_stream = None
+        self.flow.clear_interrupt()
+
+
+def prepare_session(conf: 'IaaConfig', root: str, *, bind_thread: bool = False) -> DeviceSession:
+    """
+    初始化配置上下文与设备上下文。
+
+    .. NOTE::
+        需要和任务执行在同一个线程中调用。
+
+    :param conf: 使用的配置。
+    :param root: 软件根目录。
+    :param bind_thread: 是否为当前线程创建独立的设备上下文（多设备运行时使用）。
+        为 False 时使用全局上下文。
+    """
+    # 因为导入 kotonebot 开销较大，这里延迟导入
+    from kotonebot.backend.context.context import init_context, vars
+    from iaa.device import context as device_context
+    from iaa.device.factory import create_device
+    from iaa.ledger import Ledger, account_key
+    game = conf.game
+    impl = game.control_impl
+    if impl == 'auto':
+        from iaa.device.bench import select_impl
+        impl = select_impl(game, os.path.join(root, 'cache', 'control_impl.json'))
+
+    device = create_device(game, impl)
+    if bind_thread:
+        device_context.bind(device)
+    else:
+        # 重复运行（例如守护模式）时每次都会创建新设备，需要替换掉上一次的上下文
+        init_context(target_device=device, force=True)
+    ledger = Ledger.for_account(root, account_key(conf.name, game.instance_id), game.server)
+    session = DeviceSession(vars.flow, ledger)
+    from iaa.vision.image import install as install_vision
+    install_vision()
+    if impl == 'nemu_ipc' and game.reuse_frame_buffers:
+        from iaa.device.nemu import install as install_frame_buffer
+        session.frame_buffer = install_frame_buffer(device)
+    if impl == 'adb' and game.adb_stream_capture:
+        from iaa.device.adb_stream import install as install_adb_stream
+        session.adb_stream = install_adb_stream(device)
+    if game.background_capture:
+        from iaa.device.capture import CaptureProducer
+        session.capture = CaptureProducer(device)
+        session.capture.start()
+
+    init_config_context(conf, ledger)
+    return session
+
+
+class QueuedTask:
+    """从 `SchedulerService.enqueue` 队列中取出的任务。总是执行，不会因为今天已完成而跳过。"""
+    def __init__(self, request: RunRequest, func: Callable[[], None]):
+        self.request = request
+        self.func = func
+
+    def __call__(self) -> None:
+        self.func()
+
+
+def _run_guarded(task_id: str, func: Callable[[], None], budget: float, prefix: str) -> None:
+    """
+    执行任务，并用卡死检测监视。
+
+    卡住时逐级处理：先点击左上角关闭可能的弹窗并重试任务，
+    再次卡住则重启游戏并重试，之后仍然卡住则任务失败。
+    """
+    from kotonebot import device
+    from iaa.tasks.start_game import restart_game
+    from iaa.vision import watchdog
+    from iaa.vision.watchdog import TaskStuckError
+    dog = watchdog.current()
+    level = 0
+    while True:
+        dog.arm(budget)
+        try:
+            func()
+            return
+        except TaskStuckError as e:
+            level += 1
+            if level > 2:
+                raise
+            dog.disarm()
+            if level == 1:
+                logger.warning(f"{prefix}Task '{task_id}' is stuck: {e} Dismissing popups and retrying.")
+                device.click(1, 1)
+            else:
+                logger.warning(f"{prefix}Task '{task_id}' is stuck: {e} Restarting game and retrying.")
+                restart_game()
+        finally:
+            dog.disarm()
+
+
+def run_tasks(
+    tasks: Iterable[tuple[str, Callable[[], None]]],
+    session: DeviceSession,
+    *,
+    prefix: str = "",
+    on_start: Callable[[str], None] | None = None,
+    on_end: Callable[[str, Exception | None], None] | None = None,
+    skip_done: bool = False,
+) -> None:
+    """
+    依次执行任务。任务抛出异常时记录并继续执行下一个任务，收到中断时停止。
+    任务执行期间启用卡死检测，见 `iaa.vision.watchdog` 与 `SchedulerConfig.watchdog_budget_sec`。
+
+    :param prefix: 日志前缀。
+    :param tasks: 任务。可以是生成器，每个任务开始前才取出下一个。
+    :param skip_done: 是否跳过 `session.ledger` 中记录为今天已完成的任务。
+        跳过的任务同样会调用 `on_start` 与 `on_end`。`QueuedTask` 不会被跳过。
+    :param on_start: 任务开始时调用，参数为任务 ID。
+    :param on_end: 任务结束（包括失败与中断）时调用，参数为任务 ID 与异常。
+    """
+    from iaa.vision import gate
+    from iaa.context import conf
+    budget = conf().scheduler.watchdog_budget_sec
+    for task_id, func in tasks:
+        task_name = name_from_id(task_id)
+        error: Exception | None = None
+        if on_start:
+            on_start(task_id)
+        try:
+            skip = skip_done and session.ledger and not isinstance(func, QueuedTask)
+            entry = session.ledger.entry(task_id) if skip else None
+            if entry is not None:
+                logger.info(f"{prefix}Skipping task: {task_id} ({task_name}), already done today: {entry['outcome']}")
+                continue
+            logger.info(f"{prefix}Running task: {task_id} ({task_name})")
+            before = gate.current().stats()
+            _run_guarded(task_id, func, budget, prefix)
+            logger.info(f"{prefix}Task finished: {task_id} ({task_name})")
+            session.log_stats(before)
+        except KeyboardInterrupt:
+            logger.info(f"{prefix}KeyboardInterrupt received. Stopping scheduler.")
+            break
+        except Exception as e:  # noqa: BLE001
+            logger.exception(f"{prefix}Task '{task_id}' raised an exception: {e}")
+            error = e
+        finally:
+            if on_end:
+                on_end(task_id, error)
+
+
 class SchedulerService:
-    def __init__(self, iaa_service: 'IaaService'):
+    def __init__(self, iaa_service: 'IaaService', instance_id: str | None = None):
+        """
+        :param instance_id: 绑定的 MuMu 实例 ID。为 None 时使用配置中的设备与全局设备上下文；
+            否则在该实例上运行，并为运行线程创建独立的设备上下文，
+            因此可以为每台设备各创建一个调度器并同时运行。
+        """
         self.iaa = iaa_service
+        self.instance_id = instance_id
+        """绑定的 MuMu 实例 ID"""
         self._thread: threading.Thread | None = None
         self.__running: bool = False
         self.__stop_requested: bool = False
-        self.is_starting: bool = False
-        """是否正在启动"""
-        self.is_stopping: bool = False
-        """是否正在停止"""
+        self.__is_starting: bool = False
+        self.__is_stopping: bool = False
+        self.__state: SchedulerState = 'idle'
+        self.__state_lock = threading.Lock()
+        self.__state_events: deque[StateChanged] = deque()
+        """已计算、尚未发布的状态变化，见 `__publish_states`"""
+        self.__publishing_states = False
+        self.events = EventBus()
+        """
+        调度器事件，见 `iaa.application.service.events`。
+
+        状态、任务开始与结束、多设备进度的每次变化都会发布事件，前端订阅即可，无需轮询属性。
+        """
         self.on_error: Callable[[Exception], None] | None = None
         """
         任务发生错误时执行的回调函数。注意，调用可能来自其他线程。
@@ -34,92 +266,532 @@ class SchedulerService:
         """当前正在执行的任务 ID"""
         self.current_task_name: str | None = None
         """当前正在执行的任务名称"""
+        self.progress: dict[str, WorkerProgress] = {}
+        """多设备运行时各设备的进度，键为 MuMu 实例 ID。单设备运行时为空。"""
+        self.__sessions: list[DeviceSession] = []
+        self.__sessions_lock = threading.Lock()
+        self.__stop_events: list[Any] = []
+        """多进程运行时各工作进程的停止事件"""
+        self.__wake_event = threading.Event()
+        """守护模式等待下一次触发时，用于提前唤醒"""
+        self.next_run_at: float | None = None
+        """守护模式下一次执行任务的时间戳。不在等待时为 None。"""
+        self.__active = False
+        """是否有运行线程，包括启动与停止阶段"""
+        self.__runner_lock = threading.RLock()
+        self.__schedule_stale = False
+        """守护模式的触发条件是否需要按新配置重新计算"""
+        self.iaa.config.subscribe(self.__on_config_changed)
+        queue_name = 'run_queue.json' if instance_id is None else f'run_queue@{instance_id}.json'
+        self.queue = RunQueue(os.path.join(self.iaa.root, 'cache', queue_name))
+        """等待执行的任务，见 `enqueue`"""
 
     @property
     def running(self) -> bool:
         """调度器是否正在运行。"""
         return self.__running
 
+    @property
+    def is_starting(self) -> bool:
+        """是否正在启动"""
+        return self.__is_starting
+
+    @property
+    def is_stopping(self) -> bool:
+        """是否正在停止"""
+        return self.__is_stopping
+
+    @property
+    def queue_depth(self) -> int:
+        """队列中等待执行的请求数"""
+        return len(self.queue)
+
+    @property
+    def queue_wait(self) -> float:
+        """队列中等待最久的请求已经等待的秒数。队列为空时为 0。"""
+        return self.queue.oldest_wait()
+
+    @property
+    def state(self) -> SchedulerState:
+        """调度器状态。变化时发布 `StateChanged`。"""
+        return self.__state
+
+    def __on_config_changed(self, changes: dict[str, tuple[Any, Any]]) -> None:
+        """配置文件被外部修改并重新加载后调用，见 `ConfigService.subscribe`。"""
+        # 其他配置在每次运行准备设备时读取，自然生效；守护模式需要重新计算触发条件
+        if any(key.startswith('scheduler.') for key in changes):
+            self.__schedule_stale = True
+            self.__wake_event.set()
+
+    def __set_state(
+        self,
+        *,
+        running: bool | None = None,
+        starting: bool | None = None,
+        stopping: bool | None = None,
+        publish: bool = True,
+    ) -> None:
+        """
+        更新状态。
+
+        :param publish: 是否立即发布状态变化。持有 `__runner_lock` 时必须为 False，
+            释放锁之后再调用 `__publish_states`。
+        """
+        # 状态可能同时被工作线程与 UI 线程（stop）修改，加锁保证状态一致；
+        # 事件在锁内按顺序排队，释放锁之后才发布
+        with self.__state_lock:
+            if running is not None:
+                self.__running = running
+            if starting is not None:
+                self.__is_starting = starting
+            if stopping is not None:
+                self.__is_stopping = stopping
+            if self.__is_stopping:
+                state: SchedulerState = 'stopping'
+            elif self.__is_starting:
+                state = 'starting'
+            elif self.__running:
+                state = 'running'
+            else:
+                state = 'idle'
+            previous, self.__state = self.__state, state
+            if state != previous:
+                self.__state_events.append(StateChanged(state, previous))
+        if publish:
+            self.__publish_states()
+
+    def __publish_states(self) -> None:
+        """
+        按发生顺序发布排队的 `StateChanged`。不能在持有任何锁时调用。
+
+        订阅者在不持有锁的情况下被调用，因此可以调用调度器的方法，或等待其他线程，
+        而不会与等待锁的线程（如在 UI 线程中调用 `stop`）互相等待。
+        同一时间只有一个线程在发布，其他线程排队的事件由它依次发布。
+        """
+        while True:
+            with self.__state_lock:
+                if self.__publishing_states or not self.__state_events:
+                    return
+                self.__publishing_states = True
+                event = self.__state_events.popleft()
+            try:
+                self.events.publish(event)
+            finally:
+                with self.__state_lock:
+                    self.__publishing_states = False
+
+    def __publish_task_end(self, task_id: str, error: Exception | str | None, instance_id: str | None) -> None:
+        if error is None:
+            self.events.publish(TaskFinished(task_id, name_from_id(task_id), instance_id))
+        else:
+            self.events.publish(TaskFailed(task_id, name_from_id(task_id), str(error), instance_id))
+
+    def __publish_progress(self) -> None:
+        summary = self.progress_summary()
+        logger.info(f"Progress: {summary}")
+        self.events.publish(ProgressUpdated(
+            done=sum(p.done for p in self.progress.values()),
+            total=sum(p.total for p in self.progress.values()),
+            failed=sum(p.failed for p in self.progress.values()),
+            summary=summary,
+        ))
+
     # -------------------- Shared runner --------------------
+    def __report_error(self, e: Exception) -> None:
+        if self.on_error:
+            try:
+                self.on_error(e)
+            except Exception:
+                logger.exception("Error handler raised an exception")
+
+    def __run_tasks(
+        self,
+        tasks: list[tuple[str, Callable[[], None]]],
+        session: DeviceSession,
+        progress: WorkerProgress | None = None,
+        *,
+        skip_done: bool = False,
+        on_end: Callable[[str, Exception | None], None] | None = None,
+    ) -> None:
+        """
+        依次执行任务，见 `run_tasks`。
+
+        :param progress: 多设备运行时该设备的进度。为 None 时更新 `current_task_id` 等属性。
+        :param skip_done: 是否跳过今天已完成的任务。
+        :param on_end: 额外的任务结束回调。
+        """
+        instance_id = progress.instance_id if progress is not None else None
+
+        def on_start(task_id: str) -> None:
+            if progress is None:
+                self.current_task_id = task_id
+                self.current_task_name = name_from_id(task_id)
+            else:
+                progress.current_task_id = task_id
+            self.events.publish(TaskStarted(task_id, name_from_id(task_id), instance_id))
+
+        extra_on_end = on_end
+
+        def _on_end(task_id: str, error: Exception | None) -> None:
+            if extra_on_end:
+                extra_on_end(task_id, error)
+            if progress is None:
+                self.current_task_id = None
+                self.current_task_name = None
+            else:
+                progress.current_task_id = None
+                progress.done += 1
+                if error is not None:
+                    progress.failed += 1
+            self.__publish_task_end(task_id, error, instance_id)
+            if error is not None:
+                self.__report_error(error)
+            if progress is not None:
+                self.__publish_progress()
+
+        prefix = f"[{progress.instance_id}] " if progress is not None else ""
+        # 多设备运行时队列不属于任何一台设备，等运行结束后再执行
+        planned = tasks if progress is not None else self.__with_queue(tasks)
+        run_tasks(planned, session, prefix=prefix, on_start=on_start, on_end=_on_end, skip_done=skip_done)
+
+    def __with_queue(self, tasks: list[tuple[str, Callable[[], None]]]) -> Iterator[tuple[str, Callable[[], None]]]:
+        """
+        在任务之间插入队列中的请求。
+
+        每个任务开始前是安全的检查点：需要抢占的请求在这里插队执行，
+        其余请求在所有任务结束后、释放设备前执行，设备不会在两次运行之间空闲。
+        收到停止请求后不再取出新的任务，未执行的请求留在队列中。
+        """
+        for task in tasks:
+            yield from self.__take_queued(preempt_only=True)
+            if self.__stop_requested:
+                return
+            yield task
+        yield from self.__take_queued(preempt_only=False)
+
+    def __take_queued(self, *, preempt_only: bool) -> Iterator[tuple[str, Callable[[], None]]]:
+        while not self.__stop_requested:
+            request = self.queue.pop(preempt_only=preempt_only)
+            if request is None:
+                return
+            self.__publish_queue()
+            func = self.__task_func(request.task_id)
+            if func is None:
+                logger.warning(f"Dropping queued request for unknown task: {request.task_id}")
+                continue
+            waited = time.time() - request.enqueued_at
+            logger.info(f"Running queued task: {request.task_id} (waited {waited:.1f}s)")
+            yield request.task_id, QueuedTask(request, func)
+
+    @staticmethod
+    def __task_func(task_id: str) -> Callable[[], None] | None:
+        return MANUAL_TASKS.get(task_id) or REGULAR_TASKS.get(task_id)
+
+    def __publish_queue(self) -> None:
+        requests = self.queue.snapshot()
+        self.events.publish(QueueChanged(
+            depth=len(requests),
+            wait=self.queue.oldest_wait(),
+            task_ids=tuple(r.task_id for r in requests),
+        ))
+
+    def enqueue(self, task_id: str, *, priority: int = 0, preempt: bool = False) -> RunRequest:
+        """
+        把任务加入队列。队列持久化保存，见 `queue`。
+
+        调度器空闲时立即开始执行队列；正在运行时，请求在当前运行的任务全部结束后、
+        或者（`preempt` 为 True 时）在当前任务结束后执行，不会被丢弃。
+        守护模式等待下一次触发期间会被立即唤醒。
+
+        :param task_id: 任务 ID，见 `iaa.tasks.registry`。
+        :param priority: 优先级，数值大的先执行。
+        :param preempt: 是否抢占正在进行的运行。
+        :raises ValueError: 任务不存在。
+        """
+        if self.__task_func(task_id) is None:
+            raise ValueError(f"Unknown task: {task_id}")
+        with self.__runner_lock:
+            request = self.queue.push(task_id, priority=priority, preempt=preempt)
+            active = self.__active
+        logger.info(
+            f"Queued task: {task_id} (priority {priority}{', preempt' if preempt else ''}), "
+            f"queue depth {self.queue_depth}"
+        )
+        self.__publish_queue()
+        if active:
+            self.__wake_event.set()
+        else:
+            self.__start_runner(self.__run_queue, thread_name="IAA-Scheduler-Queue", run_in_thread=True)
+        return request
+
+    def clear_queue(self) -> None:
+        """删除队列中所有尚未开始的请求。"""
+        self.queue.clear()
+        self.__publish_queue()
+
+    def __run_queue(self) -> None:
+        """只执行队列中的请求。"""
+        self.progress = {}
+        logger.info("Preparing context...")
+        session = self.__prepare_context(self.__device_conf())
+        try:
+            self.__set_state(running=True, starting=False)
+            self.__run_tasks([], session)
+        finally:
+            self.__close_session(session)
+
+    def __start_runner(self, runner: Callable[[], None], *, thread_name: str, run_in_thread: bool) -> bool:
+        with self.__runner_lock:
+            # 已在运行则忽略
+            if self.__active:
+                logger.warning("Scheduler already running, skip start.")
+                return False
+            self.__active = True
+            self.__set_state(starting=True, publish=False)
+        self.__publish_states()
+
+        def _runner() -> None:
+            current = runner
+            try:
+                # 使外部对配置文件的修改在本次运行中生效
+                self.iaa.config.reload()
+                while True:
+                    try:
+                        current()
+                    except Exception as e:  # noqa: BLE001
+                        logger.exception("Scheduler runner crashed: %s", e)
+                        self.__report_error(e)
+                    # 运行期间入队、但没能在本次运行中执行的请求（例如多设备运行时）接着执行。
+                    # 判断与退出在同一把锁内完成，`enqueue` 不会错过正在退出的线程。
+                    with self.__runner_lock:
+                        finished = self.__stop_requested or not self.queue_depth
+                        if finished:
+                            self.__finish_runner()
+                    if finished:
+                        self.__publish_states()
+                        return
+                    current = self.__run_queue
+            except BaseException:
+                with self.__runner_lock:
+                    self.__finish_runner()
+                self.__publish_states()
+                raise
+
+        if self.instance_id is not None:
+            thread_name = f"{thread_name}-{self.instance_id}"
+        if run_in_thread:
+            self._thread = threading.Thread(target=_runner, name=thread_name, daemon=True)
+            self._thread.start()
+        else:
+            _runner()
+        return True
+
+    def __finish_runner(self) -> None:
+        """复位运行状态。需要持有 `__runner_lock`，释放后调用 `__publish_states`。"""
+        if not self.__active:
+            return
+        # 停止阶段结束；若在准备阶段失败，也需要复位启动标记
+        self.__stop_requested = False
+        self.__set_state(running=False, starting=False, stopping=False, publish=False)
+        self.__active = False
+        logger.info("Scheduler stopped.")
+
     def __start_tasks(
         self,
         get_tasks: Callable[[], list[tuple[str, Callable[[], None]]]],
         *,
         thread_name: str,
         run_in_thread: bool = True,
-    ) -> None:
-        """执行指定任务"""
-        # 已在运行则忽略
-        if self._thread and self._thread.is_alive():
-            logger.warning("Scheduler already running, skip start.")
-            return
-
-        self.is_starting = True
+        skip_done: bool = False,
+    ) -> bool:
+        """
+        执行指定任务
 
-        def _runner() -> None:
+        :param skip_done: 是否跳过今天已完成的任务。
+        :return: 是否已启动。已在运行时返回 False。
+        """
+        def _run() -> None:
+            self.progress = {}
+            logger.info("Preparing context...")
+            session = self.__prepare_context(self.__device_conf())
             try:
-                logger.info("Preparing context...")
-                self.__prepare_context()
                 logger.info("Scheduler started.")
                 tasks = get_tasks()
                 if not tasks:
                     logger.info("No tasks to run. Exiting...")
                     return
-                self.__running = True
                 # 启动阶段结束
-                self.is_starting = False
-                for task_id, func in tasks:
-                    self.current_task_id = task_id
-                    self.current_task_name = name_from_id(task_id)
-                    try:
-                        logger.info(f"Running task: {task_id} ({self.current_task_name})")
-                        func()
-                        logger.info(f"Task finished: {task_id} ({self.current_task_name})")
-                    except KeyboardInterrupt:
-                        logger.info("KeyboardInterrupt received. Stopping scheduler.")
-                        break
-                    except Exception as e:  # noqa: BLE001
-                        logger.exception(f"Task '{task_id}' raised an exception: {e}")
-                        if self.on_error:
-                            try:
-                                self.on_error(e)
-                            except Exception:
-                                logger.exception("Error handler raised an exception")
-                    finally:
-                        self.current_task_id = None
-                        self.current_task_name = None
-            except Exception as e:  # noqa: BLE001
-                logger.exception("Scheduler runner crashed: %s", e)
-                if self.on_error:
-                    try:
-                        self.on_error(e)
-                    except Exception:
-                        logger.exception("Error handler raised an exception")
+                self.__set_state(running=True, starting=False)
+                self.__run_tasks(tasks, session, skip_done=skip_done)
             finally:
-                self.__running = False
-                # 停止阶段结束
-                if self.__stop_requested:
-                    self.is_stopping = False
-                    self.__stop_requested = False
-                from kotonebot.backend.context import vars
-                vars.flow.clear_interrupt()
-                # 若在准备阶段失败，也需要复位启动标记
-                self.is_starting = False
-                logger.info("Scheduler stopped.")
+                self.__close_session(session)
 
-        if run_in_thread:
-            self._thread = threading.Thread(target=_runner, name=thread_name, daemon=True)
-            self._thread.start()
-        else:
-            _runner()
+        return self.__start_runner(_run, thread_name=thread_name, run_in_thread=run_in_thread)
 
     def start_regular(self, run_in_thread: bool = True) -> None:
         """
-        启动常规任务调度。
+        启动常规任务调度。今天已经完成的任务会被跳过，见 `iaa.ledger`。
         """
         def _get() -> list[tuple[str, Callable[[], None]]]:
             return self._get_enabled_tasks()
-        self.__start_tasks(_get, thread_name="IAA-Scheduler", run_in_thread=run_in_thread)
+        self.__start_tasks(_get, thread_name="IAA-Scheduler", run_in_thread=run_in_thread, skip_done=True)
+
+    def start_multi(
+        self,
+        instance_ids: list[str] | None = None,
+        run_in_thread: bool = True,
+        *,
+        processes: bool = False,
+    ) -> None:
+        """
+        同时在多个 MuMu 实例上执行常规任务。
+
+        每个实例各有一个工作线程、独立的设备上下文与配置副本（`game.instance_id` 指向该实例），
+        所有实例的总耗时约等于最慢的一个。进度见 `progress` 与 `progress_summary()`。
+
+        :param instance_ids: 要运行的实例 ID。为 None 时使用所有正在运行的实例。
+        :param processes: 是否让每个实例在独立的进程中运行。
+            线程模式下各设备的 Python 代码共用一个 GIL；进程模式下可以利用多个 CPU 核心，
+            日志、状态与错误经队列汇总到本进程。
+        """
+        if self.iaa.config.conf.game.emulator != 'mumu':
+            raise ValueError("Multi-device mode only supports MuMu emulators.")
+
+        def _run() -> None:
+            from iaa.device.factory import list_instances
+            ids = instance_ids if instance_ids is not None else list_instances()
+            tasks = self._get_enabled_tasks()
+            if not ids or not tasks:
+                logger.info("No instances or tasks to run. Exiting...")
+                return
+            self.progress = {i: WorkerProgress(i, total=len(tasks)) for i in ids}
+            self.__set_state(running=True, starting=False)
+            logger.info(f"Scheduler started on {len(ids)} instances: {', '.join(ids)}")
+            if processes:
+                self.__run_processes(ids, tasks)
+                logger.info(f"All instances finished: {self.progress_summary()}")
+                return
+            # 线程模式依赖按线程隔离的上下文，启动前确认 kotonebot 支持，不支持时直接报错
+            from iaa.device import context as device_context
+            device_context.verify()
+            workers = [
+                threading.Thread(target=self.__worker, args=(i, tasks), name=f"IAA-Worker-{i}", daemon=True)
+                for i in ids
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            logger.info(f"All instances finished: {self.progress_summary()}")
+
+        self.__start_runner(_run, thread_name="IAA-Scheduler-Multi", run_in_thread=run_in_thread)
+
+    def __worker(self, instance_id: str, tasks: list[tuple[str, Callable[[], None]]]) -> None:
+        from iaa.device import context as device_context
+        progress = self.progress[instance_id]
+        session: DeviceSession | None = None
+        try:
+            conf = self.iaa.config.conf.model_copy(deep=True)
+            conf.game.instance_id = instance_id
+            logger.info(f"[{instance_id}] Preparing context...")
+            session = self.__prepare_context(conf, bind_thread=True)
+            self.__run_tasks(tasks, session, progress, skip_done=True)
+        except Exception as e:  # noqa: BLE001
+            logger.exception(f"[{instance_id}] Worker crashed: {e}")
+            self.__report_error(e)
+        finally:
+            progress.current_task_id = None
+            progress.finished = True
+            if session is not None:
+                self.__close_session(session)
+            device_context.unbind()
+
+    def __run_processes(self, ids: list[str], tasks: list[tuple[str, Callable[[], None]]]) -> None:
+        """为每个实例启动一个工作进程，并在本线程中汇总状态直至全部结束。"""
+        import multiprocessing
+        from logging.handlers import QueueListener
+        from .worker_process import WorkerMessage, WorkerProcessError, run_worker
+        # 与 Windows 的行为保持一致，子进程总是全新启动
+        mp = multiprocessing.get_context('spawn')
+        status_queue = mp.Queue()
+        log_queue = mp.Queue()
+        listener = QueueListener(log_queue, *logging.getLogger().handlers, respect_handler_level=True)
+        listener.start()
+        task_ids = [task_id for task_id, _ in tasks]
+        workers: dict[str, Any] = {}
+        try:
+            for instance_id in ids:
+                conf = self.iaa.config.conf.model_copy(deep=True)
+                conf.game.instance_id = instance_id
+                stop_event = mp.Event()
+                workers[instance_id] = mp.Process(
+                    target=run_worker,
+                    args=(self.iaa.root, conf.model_dump_json(), instance_id, task_ids, status_queue, log_queue, stop_event),
+                    name=f"IAA-Worker-{instance_id}",
+                    daemon=True,
+                )
+                self.__stop_events.append(stop_event)
+                # 启动前已请求停止时，子进程启动后会立即中断
+                if self.__stop_requested:
+                    stop_event.set()
+            for process in workers.values():
+                process.start()
+
+            while not all(p.finished for p in self.progress.values()):
+                try:
+                    message: WorkerMessage = status_queue.get(timeout=1)
+                except queue.Empty:
+                    # 正常退出的进程一定已经发出了 exited 消息，只需处理异常退出的进程
+                    for instance_id, process in workers.items():
+                        progress = self.progress[instance_id]
+                        if not progress.finished and not process.is_alive() and process.exitcode != 0:
+                            progress.finished = True
+                            progress.current_task_id = None
+                            self.__report_error(WorkerProcessError(
+                                f"[{instance_id}] Worker process exited with code {process.exitcode}."
+                            ))
+                    continue
+                self.__on_worker_message(message)
+            for process in workers.values():
+                process.join()
+        finally:
+            self.__stop_events.clear()
+            listener.stop()
+
+    def __on_worker_message(self, message: 'WorkerMessage') -> None:
+        from .worker_process import WorkerProcessError
+        progress = self.progress[message.instance_id]
+        if message.kind == 'task_started':
+            progress.current_task_id = message.task_id
+            if message.task_id is not None:
+                self.events.publish(TaskStarted(message.task_id, name_from_id(message.task_id), message.instance_id))
+        elif message.kind == 'task_finished':
+            progress.current_task_id = None
+            progress.done += 1
+            if message.task_id is not None:
+                self.__publish_task_end(message.task_id, message.error, message.instance_id)
+            if message.error is not None:
+                progress.failed += 1
+                self.__report_error(WorkerProcessError(
+                    f"[{message.instance_id}] Task '{message.task_id}' failed: {message.error}"
+                ))
+            self.__publish_progress()
+        elif message.kind == 'crashed':
+            self.__report_error(WorkerProcessError(f"[{message.instance_id}] Worker crashed: {message.error}"))
+        elif message.kind == 'exited':
+            progress.current_task_id = None
+            progress.finished = True
+
+    def progress_summary(self) -> str:
+        """多设备运行的进度摘要。"""
+        parts = []
+        for p in self.progress.values():
+            state = 'finished' if p.finished else (p.current_task_id or 'idle')
+            parts.append(f"{p.instance_id}: {p.done}/{p.total} ({state})")
+        done = sum(p.done for p in self.progress.values())
+        total = sum(p.total for p in self.progress.values())
+        failed = sum(p.failed for p in self.progress.values())
+        return f"{done}/{total} tasks, {failed} failed; " + ", ".join(parts)
     
     def stop(self, block: bool = False) -> None:
         """
@@ -130,91 +802,166 @@ class SchedulerService:
         if not self.__running or self._thread is None:
             logger.warning("Scheduler not running, skip stop.")
             return
-        from kotonebot.backend.context import vars
         self.__stop_requested = True
-        self.is_stopping = True
-        vars.flow.request_interrupt()
+        self.__set_state(stopping=True)
+        with self.__sessions_lock:
+            for session in self.__sessions:
+                session.flow.request_interrupt()
+        for stop_event in list(self.__stop_events):
+            stop_event.set()
+        self.__wake_event.set()
         if block:
             self._thread.join()
         self._thread = None
 
-    def run_single(self, task_id: str, run_in_thread: bool = True) -> None:
-        """运行单个任务。"""
-        tasks = MANUAL_TASKS.copy()
-        tasks.update(REGULAR_TASKS)
-        if task_id not in tasks:
+    def start_daemon(self, run_in_thread: bool = True, *, clock: 'Clock | None' = None) -> None:
+        """
+        以守护模式运行常规任务，直至调用 `stop()`。
+
+        启动时执行一次所有启用的任务，之后各任务按 `SchedulerConfig.daemon_times`
+        在服务器时区的固定时间触发（未列出的任务默认在每日重置后不久），
+        `solo_live` 也可以在预测 AP 接近上限时触发。
+        两次执行之间不占用设备，只阻塞等待到下一次触发或停止请求。
+        每次执行都会重新准备设备上下文，并在 `start_game` 启用时先执行它。
+
+        :param clock: 时钟。为 None 时使用系统时间，测试时可传入 `ManualClock`。
+        """
+        from .daemon import MAX_SLEEP_SEC, Clock, DaemonSchedule, build_triggers
+        clock = clock or Clock()
+
+        def _run() -> None:
+            self.progress = {}
+            self.__wake_event.clear()
+            self.__schedule_stale = False
+            enabled = self._get_enabled_tasks()
+            funcs = dict(enabled)
+            startup = [(task_id, func) for task_id, func in enabled if task_id == 'start_game']
+            schedule = DaemonSchedule(
+                build_triggers(self.iaa.config.conf, [task_id for task_id in funcs if task_id != 'start_game']),
+                clock.time(),
+            )
+            self.__set_state(running=True, starting=False)
+            logger.info("Scheduler daemon started.")
+            while not self.__stop_requested:
+                # 没有启用 `ConfigService.watch` 时，在每次唤醒时检查配置文件
+                self.iaa.config.reload()
+                if self.__schedule_stale:
+                    self.__schedule_stale = False
+                    enabled = self._get_enabled_tasks()
+                    funcs = dict(enabled)
+                    startup = [(task_id, func) for task_id, func in enabled if task_id == 'start_game']
+                    changed = schedule.update(
+                        build_triggers(self.iaa.config.conf, [task_id for task_id in funcs if task_id != 'start_game']),
+                        clock.time(),
+                    )
+                    if changed:
+                        logger.info(f"Daemon triggers updated from config: {', '.join(changed)}")
+                due = schedule.due(clock.time())
+                if due or self.queue_depth:
+                    self.next_run_at = None
+                    logger.info(f"Daemon triggered: {', '.join(due) or 'queued tasks'}")
+                    self.__run_batch(startup + [(task_id, funcs[task_id]) for task_id in due], schedule, clock)
+                    continue
+                wakeup = schedule.next_wakeup()
+                if wakeup is None or wakeup == float('inf'):
+                    logger.info("No more triggers. Exiting daemon...")
+                    break
+                if wakeup != self.next_run_at:
+                    self.next_run_at = wakeup
+                    logger.info(f"Next daemon run at {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(wakeup))}")
+                # 停止请求与 `enqueue` 都会提前唤醒
+                if clock.wait(self.__wake_event, min(max(wakeup - clock.time(), 0), MAX_SLEEP_SEC)):
+                    self.__wake_event.clear()
+
+        def _daemon() -> None:
+            try:
+                _run()
+            finally:
+                self.next_run_at = None
+
+        self.__start_runner(_daemon, thread_name="IAA-Scheduler-Daemon", run_in_thread=run_in_thread)
+
+    def __run_batch(
+        self,
+        tasks: list[tuple[str, Callable[[], None]]],
+        schedule: 'DaemonSchedule',
+        clock: 'Clock',
+    ) -> None:
+        """守护模式下执行一批到期的任务，并更新它们的下一次触发时间。"""
+        def on_end(task_id: str, error: Exception | None) -> None:
+            if task_id in schedule.triggers:
+                schedule.on_run(task_id, clock.time())
+
+        try:
+            session = self.__prepare_context(self.__device_conf())
+        except Exception as e:  # noqa: BLE001
+            # 模拟器未启动等情况下不退出守护模式，等到下一次触发再试
+            logger.exception(f"Failed to prepare context: {e}")
+            self.__report_error(e)
+        else:
+            try:
+                self.__run_tasks(tasks, session, skip_done=True, on_end=on_end)
+            finally:
+                self.__close_session(session)
+        # 被中断或未能执行的任务也视为已执行，避免立即再次触发
+        for task_id, _ in tasks:
+            if task_id in schedule.triggers and schedule.next_at[task_id] <= clock.time():
+                schedule.on_run(task_id, clock.time())
+
+    def run_single(self, task_id: str, run_in_thread: bool = True, *, preempt: bool = False) -> None:
+        """
+        运行单个任务。正在运行时加入队列，见 `enqueue`。
+
+        :param preempt: 正在运行时，是否在当前任务结束后立即执行。
+        """
+        func = self.__task_func(task_id)
+        if func is None:
             raise ValueError(f"Unknown manual task: {task_id}")
         def _get() -> list[tuple[str, Callable[[], None]]]:
-            return [(task_id, tasks[task_id])]
-        self.__start_tasks(_get, thread_name="IAA-Scheduler-Manual", run_in_thread=run_in_thread)
+            return [(task_id, func)]
+        with self.__runner_lock:
+            busy = self.__active
+        # 启动失败说明其他线程刚好抢先启动，同样加入队列
+        if busy or not self.__start_tasks(_get, thread_name="IAA-Scheduler-Manual", run_in_thread=run_in_thread):
+            self.enqueue(task_id, preempt=preempt)
+
+    def __device_conf(self) -> 'IaaConfig':
+        """返回本调度器使用的配置。绑定了实例时为指向该实例的副本。"""
+        conf = self.iaa.config.conf
+        if self.instance_id is None:
+            return conf
+        conf = conf.model_copy(deep=True)
+        conf.game.instance_id = self.instance_id
+        return conf
 
-    def __prepare_context(self) -> None:
+    def __prepare_context(self, conf: 'IaaConfig', *, bind_thread: bool = False) -> DeviceSession:
         """
-        初始化配置上下文与设备上下文。
+        初始化配置上下文与设备上下文，见 `prepare_session`。
+        绑定了实例时总是为当前线程创建独立的设备上下文。
 
         .. NOTE::
             需要和任务执行在同一个线程中调用。
         """
-        # 因为导入 kotonebot 开销较大，这里延迟导入
-        from kotonebot.backend.context.context import init_context
-        from kotonebot.client.host import Mumu12Host
-        impl = self.iaa.config.conf.game.control_impl
-        emulator = self.iaa.config.conf.game.emulator
-
-        if emulator == 'mumu':
-            hosts = Mumu12Host.list()
-            if not hosts:
-                raise RuntimeError("No MuMu host found.")
-            host = hosts[0]
-            if impl == 'nemu_ipc':
-                from kotonebot.client.host.mumu12_host import MuMu12HostConfig
-                device = host.create_device('nemu_ipc', MuMu12HostConfig())
-            elif impl == 'adb':
-                from kotonebot.client.host import AdbHostConfig
-                device = host.create_device('adb', AdbHostConfig())
-            elif impl == 'uiautomator':
-                from kotonebot.client.host import AdbHostConfig
-                device = host.create_device('uiautomator2', AdbHostConfig())
-            else:
-                raise ValueError(f"Unknown control implementation: {impl}")
-        elif emulator == 'custom':
-            from kotonebot.client.host import create_custom
-            from kotonebot.client.host import AdbHostConfig
-            data = self.iaa.config.conf.game.emulator_data
-            if data is None:
-                adb_ip = '127.0.0.1'
-                adb_port = 5555
-            else:
-                adb_ip = data.adb_ip or '127.0.0.1'
-                adb_port = data.adb_port or 5555
-            instance = create_custom(
-                adb_ip=adb_ip,
-                adb_port=adb_port,
-                adb_name="",
-                exe_path="",
-                emulator_args="",
-            )
-            if impl == 'adb':
-                device = instance.create_device('adb', AdbHostConfig())
-            elif impl == 'uiautomator':
-                device = instance.create_device('uiautomator2', AdbHostConfig())
-            elif impl == 'nemu_ipc':
-                raise ValueError("'nemu_ipc' 实现仅支持 MuMu12，不支持 custom 模拟器。")
-            else:
-                raise ValueError(f"Unknown control implementation: {impl}")
-        else:
-            raise ValueError(f"Unknown emulator: {emulator}")
-        device.target_resolution = (1280, 720)
-        device.orientation = 'landscape'
-        init_context(target_device=device)
+        session = prepare_session(conf, self.iaa.root, bind_thread=bind_thread or self.instance_id is not None)
+        with self.__sessions_lock:
+            self.__sessions.append(session)
+        return session
 
-        init_config_context(self.iaa.config.conf)
+    def __close_session(self, session: DeviceSession) -> None:
+        with self.__sessions_lock:
+            if session in self.__sessions:
+                self.__sessions.remove(session)
+        session.close()
+        if self.instance_id is not None:
+            from iaa.device import context as device_context
+            device_context.unbind()
 
     def _get_enabled_tasks(self) -> list[tuple[str, Callable[[], None]]]:
-        """根据配置返回启用的任务列表，顺序与 REGULAR_TASKS 保持一致。"""
+        """根据配置返回启用的任务列表，并按场景排列顺序以减少导航，见 `iaa.tasks.planner`。"""
+        from iaa.tasks.planner import plan
         conf = self.iaa.config.conf
         tasks: list[tuple[str, Callable[[], None]]] = []
         for name, func in REGULAR_TASKS.items():
             if conf.scheduler.is_enabled(name):
                 tasks.append((name, func))
-        return tasks
+        return plan(tasks)
@@ -0,0 +1,95 @@
+import logging
+import threading
+from dataclasses import dataclass
+from logging.handlers import QueueHandler
+from typing import Any, Literal
+
+from iaa.errors import IaaError
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerProcessError(IaaError):
+    """工作进程中的任务失败或进程崩溃"""
+
+
+@dataclass
+class WorkerMessage:
+    """工作进程发往调度器的状态消息。"""
+    instance_id: str
+    kind: Literal['task_started', 'task_finished', 'crashed', 'exited']
+    task_id: str | None = None
+    error: str | None = None
+    """失败时的错误信息。`task_finished` 时为 None 表示成功。"""
+
+
+def _configure_logging(log_queue: Any) -> None:
+    # 子进程不直接写日志文件，所有记录经队列交给主进程的处理器
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(QueueHandler(log_queue))
+    root_logger.setLevel(logging.INFO)
+    logging.getLogger("kotonebot").setLevel(logging.DEBUG)
+    logging.getLogger("iaa").setLevel(logging.DEBUG)
+
+
+def _watch_stop(stop_event: Any, flow: Any) -> None:
+    stop_event.wait()
+    logger.info("Stop requested by scheduler.")
+    flow.request_interrupt()
+
+
+def run_worker(
+    root: str,
+    conf_json: str,
+    instance_id: str,
+    task_ids: list[str],
+    status_queue: Any,
+    log_queue: Any,
+    stop_event: Any,
+) -> None:
+    """
+    工作进程入口。在独立进程中为一台设备执行任务。
+
+    进程内只有一台设备，因此直接使用 kotonebot 的全局上下文。
+    状态经 `status_queue` 以 `WorkerMessage` 发回，日志经 `log_queue` 发回，
+    `stop_event` 被设置时通过 `vars.flow.request_interrupt()` 中断任务。
+
+    :param root: 软件根目录。
+    :param conf_json: 序列化后的 `IaaConfig`。
+    :param instance_id: MuMu 实例 ID。
+    :param task_ids: 要执行的任务 ID，见 `iaa.tasks.registry`。
+    """
+    _configure_logging(log_queue)
+
+    def send(kind: Any, task_id: str | None = None, error: str | None = None) -> None:
+        status_queue.put(WorkerMessage(instance_id, kind, task_id, error))
+
+    try:
+        from iaa.config.base import IaaConfig
+        from iaa.tasks.registry import MANUAL_TASKS, REGULAR_TASKS
+        from .scheduler import prepare_session, run_tasks
+        conf = IaaConfig.model_validate_json(conf_json)
+        registry = {**MANUAL_TASKS, **REGULAR_TASKS}
+        tasks = [(task_id, registry[task_id]) for task_id in task_ids]
+
+        session = prepare_session(conf, root)
+        threading.Thread(target=_watch_stop, args=(stop_event, session.flow), daemon=True).start()
+        try:
+            run_tasks(
+                tasks,
+                session,
+                on_start=lambda task_id: send('task_started', task_id),
+                on_end=lambda task_id, e: send(
+                    'task_finished', task_id, None if e is None else f'{type(e).__name__}: {e}'
+                ),
+                skip_done=True,
+            )
+        finally:
+            session.close()
+    except Exception as e:  # noqa: BLE001
+        logger.exception(f"Worker process crashed: {e}")
+        send('crashed', error=f'{type(e).__name__}: {e}')
+    finally:
+        send('exited')
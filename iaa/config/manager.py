@@ -1,12 +1,37 @@
 import os
 import json
-from typing import Literal, overload, Union
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Literal, overload, Union
 from pathlib import Path
 
+from kotonebot import logging
+
 from .base import IaaConfig
 
+logger = logging.getLogger(__name__)
+
 config_path: str = './conf'
 
+ConfigChanges = dict[str, tuple[Any, Any]]
+"""配置变化，键为以 `.` 分隔的字段路径，值为 `(旧值, 新值)`"""
+ConfigSubscriber = Callable[[str, IaaConfig, ConfigChanges], None]
+
+
+@dataclass
+class _CacheEntry:
+    stamp: tuple[int, int]
+    """文件的 `(mtime_ns, size)`"""
+    config: IaaConfig
+    """该名称共享的配置实例"""
+    data: dict[str, Any]
+    """`config` 上一次与文件同步时的内容，用于计算变化"""
+
+
+_cache: dict[str, _CacheEntry] = {}
+_cache_lock = threading.RLock()
+_subscribers: list[ConfigSubscriber] = []
+
 
 def list() -> list[str]:
     """列出所有配置文件。"""
@@ -46,8 +71,7 @@ def create(name: str, *, exist: Literal['raise', 'ok'] = 'raise') -> None:
         scheduler=SchedulerConfig(),
     )
     
-    with open(config_file, 'w', encoding='utf-8') as f:
-        json.dump(default_config.model_dump(), f, indent=2, ensure_ascii=False)
+    _dump(config_file, default_config.model_dump())
 
 
 def remove(name: str, *, not_exist: Literal['raise', 'ok'] = 'raise') -> None:
@@ -60,6 +84,8 @@ def remove(name: str, *, not_exist: Literal['raise', 'ok'] = 'raise') -> None:
         return
     
     config_file.unlink()
+    with _cache_lock:
+        _cache.pop(name, None)
 
 
 @overload
@@ -70,6 +96,10 @@ def read(name: str, *, not_exist: None = None) -> IaaConfig | None: ...
 
 def read(name: str, *, not_exist: Literal['raise', 'create'] | IaaConfig | None = 'raise') -> IaaConfig | None:
     """读取一个配置文件。
+
+    同一名称总是返回同一个实例。文件的修改时间与大小没有变化时直接返回缓存，
+    否则重新解析，把新内容更新到该实例上，并通知 `subscribe` 的订阅者。
+    重新加载时文件内容无效则保留原有内容。
     
     :param name: 配置文件名称
     :param not_exist: 当配置不存在时的处理方式，'raise' 抛出异常，'create' 创建默认配置，None 返回 None，或直接提供默认值。
@@ -90,18 +120,117 @@ def read(name: str, *, not_exist: Literal['raise', 'create'] | IaaConfig | None
         else:
             raise ValueError(f"Invalid non_exist value: {not_exist}")
     
-    with open(config_file, 'r', encoding='utf-8') as f:
-        config_data = json.load(f)
-    
-    return IaaConfig.model_validate(config_data)
+    return _load(name, config_file)
 
 
 def write(name: str, config: IaaConfig) -> None:
-    """写入一个配置文件。"""
+    """
+    写入一个配置文件。写入的内容同时成为缓存，不会被当作外部修改重新加载。
+
+    先写入临时文件再替换，写入中途崩溃也不会留下损坏的配置文件。
+    """
     conf_dir = Path(config_path)
     conf_dir.mkdir(parents=True, exist_ok=True)
     
     config_file = conf_dir / f"{name}.json"
     
-    with open(config_file, 'w', encoding='utf-8') as f:
-        json.dump(config.model_dump(), f, indent=2, ensure_ascii=False)
\ No newline at end of file
+    with _cache_lock:
+        data = config.model_dump()
+        _dump(config_file, data)
+        entry = _cache.get(name)
+        shared = entry.config if entry is not None else config
+        if shared is not config:
+            _assign(shared, config)
+        _cache[name] = _CacheEntry(_stamp(config_file), shared, data)
+
+
+def subscribe(callback: ConfigSubscriber) -> Callable[[], None]:
+    """
+    订阅配置文件的外部修改。
+
+    `read` 发现文件变化并重新加载后调用 `callback(名称, 配置, 变化)`，
+    调用发生在执行 `read` 的线程中。
+
+    :return: 取消订阅的函数。
+    """
+    with _cache_lock:
+        _subscribers.append(callback)
+
+    def unsubscribe() -> None:
+        with _cache_lock:
+            if callback in _subscribers:
+                _subscribers.remove(callback)
+    return unsubscribe
+
+
+def diff(old: dict[str, Any], new: dict[str, Any], prefix: str = '') -> ConfigChanges:
+    """
+    比较两份 `model_dump()` 的结果。
+
+    :return: 变化的字段，见 `ConfigChanges`。嵌套的字典逐层展开，列表整体比较。
+    """
+    changes: ConfigChanges = {}
+    for key in old.keys() | new.keys():
+        path = f'{prefix}{key}'
+        a, b = old.get(key), new.get(key)
+        if isinstance(a, dict) and isinstance(b, dict):
+            changes.update(diff(a, b, f'{path}.'))
+        elif a != b:
+            changes[path] = (a, b)
+    return changes
+
+
+def _dump(config_file: Path, data: dict[str, Any]) -> None:
+    tmp = config_file.with_name(config_file.name + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, config_file)
+
+
+def _stamp(config_file: Path) -> tuple[int, int]:
+    st = config_file.stat()
+    return st.st_mtime_ns, st.st_size
+
+
+def _assign(target: IaaConfig, source: IaaConfig) -> None:
+    """把 `source` 的字段赋值到 `target`，使持有 `target` 的地方看到新内容。"""
+    for field in IaaConfig.model_fields:
+        setattr(target, field, getattr(source, field))
+
+
+def _load(name: str, config_file: Path) -> IaaConfig:
+    with _cache_lock:
+        stamp = _stamp(config_file)
+        entry = _cache.get(name)
+        if entry is not None and entry.stamp == stamp:
+            return entry.config
+        try:
+            with open(config_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            loaded = IaaConfig.model_validate(data)
+        except ValueError as e:
+            if entry is None:
+                raise
+            # 外部编辑到一半或写错时保留原有配置；记录时间戳，避免每次读取都重复警告
+            logger.warning(f"Ignoring invalid config '{name}': {e}")
+            entry.stamp = stamp
+            return entry.config
+        data = loaded.model_dump()
+        if entry is None:
+            _cache[name] = _CacheEntry(stamp, loaded, data)
+            return loaded
+        changes = diff(entry.data, data)
+        entry.stamp, entry.data = stamp, data
+        if not changes:
+            return entry.config
+        _assign(entry.config, loaded)
+        subscribers = _subscribers.copy()
+    logger.info(f"Config '{name}' reloaded: {', '.join(sorted(changes))}")
+    for callback in subscribers:
+        try:
+            callback(name, entry.config, changes)
+        except Exception:
+            logger.exception("Config subscriber raised an exception")
+    return entry.config
\ No newline at end of file
@@ -5,6 +5,7 @@ from typing_extensions import assert_never
 
 LinkAccountOptions = Literal['no', 'google_play']
 EmulatorOptions = Literal['mumu', 'custom']
+ControlImplOptions = Literal['nemu_ipc', 'adb', 'uiautomator', 'auto']
 
 
 class GameCharacter(str, Enum):
@@ -280,7 +281,15 @@ class GameConfig(BaseModel):
     server: Literal['jp'] = 'jp'
     link_account: LinkAccountOptions = 'no'
     emulator: EmulatorOptions = 'mumu'
-    control_impl: Literal['nemu_ipc', 'adb', 'uiautomator'] = 'nemu_ipc'
+    instance_id: str | None = None
+    """MuMu 模拟器实例 ID。为 None 时使用第一个实例。"""
+    control_impl: ControlImplOptions = 'nemu_ipc'
+    """
+    控制实现。
+
+    为 `"auto"` 时，首次连接某个模拟器实例时测试所有可用的实现并选择截图最快的一个，
+    结果按实例缓存。
+    """
     emulator_data: CustomEmulatorData | None = None
     """
     是否引继账号。
@@ -288,6 +297,24 @@ class GameConfig(BaseModel):
     * `"no"`： 不引继账号
     * `"google_play"`： 引继 Google Play 账号
     """
+    background_capture: bool = False
+    """
+    是否在后台线程中持续截图。
+
+    开启后截图与图像识别并行进行，每次截图直接取用最新的一帧。
+    """
+    reuse_frame_buffers: bool = False
+    """
+    是否复用截图缓冲区。仅对 nemu_ipc 有效。
+
+    开启后截图不再每帧分配新内存，而是轮换使用预先分配的缓冲区。
+    """
+    adb_stream_capture: bool = False
+    """
+    是否使用常驻连接截图。仅对 adb 有效。
+
+    开启后保持一个到设备的连接，直接传输原始画面，不再每次截图都重新连接并经过 PNG 编解码。
+    """
 
 
 class LiveConfig(BaseModel):
@@ -320,6 +347,30 @@ class SchedulerConfig(BaseModel):
     challenge_live_enabled: bool = True
     activity_story_enabled: bool = True
     cm_enabled: bool = True
+    daemon_times: dict[str, list[str]] = {
+        'cm': ['04:10'],
+        'challenge_live': ['04:10'],
+        'activity_story': ['04:10', '15:10'],
+    }
+    """
+    守护模式下各任务的触发时间（服务器时区，格式为 `HH:MM`）。
+
+    默认在每日重置（日服 04:00）与活动开始（15:00）后不久触发。
+    `solo_live` 未列出时按预测 AP 触发；其他未列出的任务每天在重置后不久（04:10）触发。
+    """
+    ap_cap: int = 10
+    """AP 上限"""
+    ap_regen_minutes: float = 30
+    """恢复 1 点 AP 所需的分钟数"""
+    ap_trigger_margin: int = 1
+    """守护模式下预测 AP 距离上限还有多少点时触发 `solo_live`"""
+    watchdog_budget_sec: float = 180
+    """
+    卡死检测的时限（秒）。为 0 时不检测。
+
+    任务超过该时间画面没有新变化、也没有新的识别结果时，先关闭可能的弹窗并重试任务，
+    再次超时则重启游戏并重试任务，之后仍然卡住则任务失败。
+    """
 
     def is_enabled(self, task_id: str) -> bool:
         """根据任务标识判断是否启用。
@@ -1,15 +1,20 @@
 import contextvars
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
 from .config.base import IaaConfig
 from .errors import ContextNotInitializedError
 
+if TYPE_CHECKING:
+    from .ledger import Ledger
+
 g_conf: contextvars.ContextVar[Optional[IaaConfig]] = contextvars.ContextVar('g_conf', default=None)
+g_ledger: contextvars.ContextVar[Optional['Ledger']] = contextvars.ContextVar('g_ledger', default=None)
 
 
-def init(config: IaaConfig) -> None:
-    """初始化全局配置。"""
+def init(config: IaaConfig, ledger: Optional['Ledger'] = None) -> None:
+    """初始化全局配置与每日完成记录。"""
     g_conf.set(config)
+    g_ledger.set(ledger)
 
 
 def conf() -> IaaConfig:
@@ -17,4 +22,9 @@ def conf() -> IaaConfig:
     config = g_conf.get()
     if config is None:
         raise ContextNotInitializedError()
-    return config
\ No newline at end of file
+    return config
+
+
+def ledger() -> Optional['Ledger']:
+    """获取当前上下文中的每日完成记录。未设置时返回 None。"""
+    return g_ledger.get()
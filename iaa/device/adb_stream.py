@@ -0,0 +1,188 @@
+import time
+import struct
+import threading
+from typing import Any
+
+import cv2
+import numpy as np
+from cv2.typing import MatLike
+from adbutils import AdbError
+from adbutils._adb import AdbConnection
+
+from kotonebot import logging
+from iaa.errors import IaaError
+
+logger = logging.getLogger(__name__)
+
+SCRIPT = 'while read -r _; do screencap; done'
+"""
+设备端脚本。每读到一行就输出一帧原始截图。
+
+按请求截图而不是持续推送，保证拿到的总是请求之后截取的画面，
+也不会因为读取跟不上而在连接中积压旧帧。
+"""
+PIXEL_FORMAT_RGBA_8888 = 1
+MAX_FRAME_SIZE = 3000 * 3000 * 4
+
+
+class AdbStreamError(IaaError):
+    """持续截图连接多次重连后仍然失败"""
+
+
+class AdbStreamCapture:
+    """
+    基于常驻 adb 连接的原始帧截图。
+
+    通过 `exec:` 服务在设备上常驻一个截图循环，每帧只需发送一个换行、
+    读取 `screencap` 输出的原始 RGBA 数据，不再为每帧建立连接，也不再经过 PNG 编解码。
+    连接断开、超时或数据异常时自动重连。
+
+    只依赖 adb server 协议，因此可以指向任意兼容的 adb server，
+    例如 `tools/fake_adb_server.py` 提供的本地替身。
+    """
+    def __init__(self, adb: Any, *, timeout: float = 5, retries: int = 3):
+        """
+        :param adb: adbutils 的 `AdbDevice`。
+        :param timeout: 单次读写的超时时间（秒）。
+        :param retries: 单次截图失败后的最大重连次数。
+        """
+        self.adb = adb
+        self.timeout = timeout
+        self.retries = retries
+        self.__conn: AdbConnection | None = None
+        self.__header_size: int | None = None
+        self.__header = bytearray(16)
+        self.__data = bytearray()
+        self.__impl: Any = None
+        self.__lock = threading.Lock()
+        self.frames: int = 0
+        """已截取的帧数"""
+        self.reconnects: int = 0
+        """重连次数"""
+
+    def __exec(self, command: str) -> AdbConnection:
+        conn = self.adb.open_transport(timeout=self.timeout)
+        conn.send_command(f'exec:{command}')
+        conn.check_okay()
+        return conn
+
+    def __detect_header_size(self) -> int:
+        # Android 8.0（API 26）起 screencap 的头部多了 4 字节的色彩空间
+        with self.__exec('getprop ro.build.version.sdk') as conn:
+            output = conn.read_until_close()
+        assert isinstance(output, str)
+        api_level = int(output.strip() or 0)
+        logger.debug(f'Device API level: {api_level}')
+        return 16 if api_level >= 26 else 12
+
+    def connect(self) -> None:
+        """建立连接并启动设备端截图循环。已连接时不做任何事。"""
+        if self.__conn is not None:
+            return
+        if self.__header_size is None:
+            self.__header_size = self.__detect_header_size()
+        self.__conn = self.__exec(SCRIPT)
+        logger.debug(f'ADB stream connected to {self.adb.serial}.')
+
+    def close(self) -> None:
+        """关闭连接。"""
+        if self.__conn is not None:
+            try:
+                self.__conn.close()
+            except OSError:
+                pass
+            self.__conn = None
+
+    def __recv_into(self, view: memoryview) -> None:
+        assert self.__conn is not None
+        sock = self.__conn.conn
+        while view:
+            n = sock.recv_into(view)
+            if n == 0:
+                raise EOFError('ADB stream closed by peer.')
+            view = view[n:]
+
+    def __read_frame(self) -> MatLike:
+        assert self.__conn is not None and self.__header_size is not None
+        self.__conn.conn.sendall(b'\n')
+        header = memoryview(self.__header)[:self.__header_size]
+        self.__recv_into(header)
+        width, height, pixel_format = struct.unpack_from('<III', header)
+        if pixel_format != PIXEL_FORMAT_RGBA_8888:
+            raise ValueError(f'Unsupported pixel format: {pixel_format}')
+        size = width * height * 4
+        if size <= 0 or size > MAX_FRAME_SIZE:
+            raise ValueError(f'Invalid frame size: {width}x{height}')
+        # 接收缓冲区只在分辨率变化时重新分配
+        if len(self.__data) != size:
+            self.__data = bytearray(size)
+        self.__recv_into(memoryview(self.__data))
+        rgba = np.frombuffer(self.__data, np.uint8).reshape((height, width, 4))
+        self.frames += 1
+        return cv2.cvtColor(rgba, cv2.COLOR_RGBA2BGR)
+
+    def screenshot(self) -> MatLike:
+        """
+        截图。
+
+        :raise AdbStreamError: 重连 `retries` 次后仍然失败。
+        """
+        # 后台截图线程与同步截图可能同时调用，连接上同一时间只能有一个请求
+        with self.__lock:
+            return self.__screenshot()
+
+    def __screenshot(self) -> MatLike:
+        last_error: Exception | None = None
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                # 第一次重连立即进行，之后逐渐延长间隔
+                self.reconnects += 1
+                time.sleep(min(0.5 * (attempt - 1), 2))
+            try:
+                self.connect()
+                return self.__read_frame()
+            except (OSError, EOFError, ValueError, AdbError) as e:
+                # 连接中可能残留半帧数据，只能丢弃整个连接
+                logger.warning(f'ADB stream capture failed ({attempt + 1}/{self.retries + 1}): {e}')
+                last_error = e
+                self.close()
+        raise AdbStreamError(f'ADB stream capture failed after {self.retries} reconnects.') from last_error
+
+    def install(self, impl: Any) -> None:
+        """接管 `impl.screenshot`。"""
+        impl.screenshot = self.screenshot
+        self.__impl = impl
+
+    def uninstall(self) -> None:
+        """恢复被接管的 `screenshot` 并关闭连接。"""
+        impl = self.__impl
+        if impl is not None and impl.__dict__.get('screenshot') == self.screenshot:
+            del impl.screenshot
+        self.__impl = None
+        self.close()
+
+    def stats(self) -> dict[str, int]:
+        """返回帧数与重连次数。"""
+        return {
+            'frames': self.frames,
+            'reconnects': self.reconnects,
+        }
+
+
+def install(device: Any, **kwargs: Any) -> AdbStreamCapture | None:
+    """
+    为使用 adb 截图的设备启用持续截图连接。
+
+    :param device: kotonebot 设备对象。
+    :param kwargs: 传给 `AdbStreamCapture` 的参数。
+    :return: 启用后的 `AdbStreamCapture`。设备不使用 adb 截图时返回 None。
+    """
+    from kotonebot.client.implements.adb import AdbImpl
+    impl = device._screenshot
+    if not isinstance(impl, AdbImpl):
+        logger.warning(f'ADB stream capture is enabled but not applied: screenshot impl is {type(impl).__name__}, not adb.')
+        return None
+    stream = AdbStreamCapture(impl.adb, **kwargs)
+    stream.install(impl)
+    logger.info('ADB stream capture enabled.')
+    return stream
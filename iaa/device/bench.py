@@ -0,0 +1,216 @@
+import os
+import json
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable
+
+import numpy as np
+
+from kotonebot import logging
+from .factory import ControlImpl, available_impls, create_device, host_key
+
+if TYPE_CHECKING:
+    from kotonebot.client.device import Device
+    from iaa.config.schemas import GameConfig
+
+logger = logging.getLogger(__name__)
+
+HISTOGRAM_BINS = 8
+HISTOGRAM_WIDTH = 30
+
+
+@dataclass
+class Samples:
+    """一组耗时样本（秒）。"""
+    name: str
+    values: list[float] = field(default_factory=list)
+
+    def percentile(self, p: float) -> float:
+        return float(np.percentile(self.values, p))
+
+    def measure(self, func: Callable[[], Any]) -> None:
+        """执行 `func` 并记录耗时。"""
+        start = time.perf_counter()
+        func()
+        self.values.append(time.perf_counter() - start)
+
+    def summary(self) -> str:
+        if not self.values:
+            return f'{self.name}: (skipped)'
+        ms = [self.percentile(p) * 1000 for p in (50, 90, 99)]
+        return (
+            f'{self.name}: n={len(self.values)} '
+            f'p50={ms[0]:.1f}ms p90={ms[1]:.1f}ms p99={ms[2]:.1f}ms '
+            f'max={max(self.values) * 1000:.1f}ms'
+        )
+
+    def histogram(self) -> list[str]:
+        """按对数分桶的文本直方图。"""
+        if not self.values:
+            return []
+        ms = np.array(self.values) * 1000
+        lo, hi = max(float(ms.min()), 0.01), max(float(ms.max()), 0.02)
+        if hi <= lo:
+            hi = lo * 1.01
+        edges = np.geomspace(lo, hi, HISTOGRAM_BINS + 1)
+        counts, _ = np.histogram(ms, bins=edges)
+        peak = max(int(counts.max()), 1)
+        lines = []
+        for i, count in enumerate(counts):
+            bar = '#' * round(count / peak * HISTOGRAM_WIDTH)
+            lines.append(f'  {edges[i]:8.1f} - {edges[i + 1]:8.1f} ms | {bar} {count}')
+        return lines
+
+
+@dataclass
+class BenchResult:
+    """单个控制实现的测试结果。"""
+    impl: ControlImpl
+    screenshot: Samples = field(default_factory=lambda: Samples('screenshot'))
+    """单次截图耗时"""
+    click: Samples = field(default_factory=lambda: Samples('click'))
+    """单次点击从发出到返回的耗时"""
+    fps: float = 0
+    """连续截图的吞吐量（帧/秒）"""
+    error: str | None = None
+    """测试失败时的错误信息"""
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and bool(self.screenshot.values)
+
+    def format(self) -> str:
+        if self.error is not None:
+            return f'[{self.impl}] FAILED: {self.error}'
+        lines = [f'[{self.impl}] throughput: {self.fps:.1f} fps']
+        for samples in (self.screenshot, self.click):
+            lines.append('  ' + samples.summary())
+            lines.extend('  ' + line for line in samples.histogram())
+        return '\n'.join(lines)
+
+
+def bench_device(
+    device: 'Device',
+    impl: ControlImpl,
+    *,
+    screenshots: int = 30,
+    clicks: int = 10,
+    duration: float = 3,
+    click_at: tuple[int, int] = (1, 1),
+) -> BenchResult:
+    """
+    测试设备的截图与点击性能。
+
+    直接调用底层实现，不经过 kotonebot 的缩放与钩子，只测量设备 I/O 本身。
+
+    :param device: 设备。
+    :param impl: 设备使用的控制实现，仅用于标记结果。
+    :param screenshots: 截图延迟的样本数。
+    :param clicks: 点击延迟的样本数。为 0 时不测试点击。
+    :param duration: 吞吐量测试的时长（秒）。为 0 时不测试吞吐量。
+    :param click_at: 点击的位置（设备坐标）。应选择点击后不会有任何反应的位置。
+    """
+    result = BenchResult(impl)
+    shot = device._screenshot.screenshot
+    # 预热：首次截图通常包含建立连接等一次性开销
+    shot()
+    for _ in range(screenshots):
+        result.screenshot.measure(shot)
+    for _ in range(clicks):
+        result.click.measure(lambda: device._touch.click(*click_at))
+    if duration > 0:
+        frames = 0
+        start = time.perf_counter()
+        while (elapsed := time.perf_counter() - start) < duration:
+            shot()
+            frames += 1
+        result.fps = frames / elapsed
+    return result
+
+
+def _close(device: 'Device') -> None:
+    # kotonebot 的设备没有统一的关闭接口，尽量断开已知的连接
+    for impl in {id(device._screenshot): device._screenshot, id(device._touch): device._touch}.values():
+        disconnect = getattr(impl, 'disconnect', None)
+        if callable(disconnect):
+            try:
+                disconnect()
+            except Exception:
+                logger.debug('Failed to disconnect %r.', impl, exc_info=True)
+
+
+def bench_all(game: 'GameConfig', **kwargs: Any) -> list[BenchResult]:
+    """
+    依次测试当前模拟器支持的所有控制实现。
+
+    :param game: 游戏配置。
+    :param kwargs: 传给 `bench_device` 的参数。
+    :return: 测试结果。无法使用的实现也会包含在内，并带有错误信息。
+    """
+    results = []
+    for impl in available_impls(game):
+        logger.info(f'Benchmarking {impl}...')
+        try:
+            device = create_device(game, impl)
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f'Failed to create {impl} device: {e}')
+            results.append(BenchResult(impl, error=f'{type(e).__name__}: {e}'))
+            continue
+        try:
+            results.append(bench_device(device, impl, **kwargs))
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f'Benchmark of {impl} failed: {e}')
+            results.append(BenchResult(impl, error=f'{type(e).__name__}: {e}'))
+        finally:
+            _close(device)
+    return results
+
+
+def fastest(results: list[BenchResult]) -> BenchResult | None:
+    """返回截图延迟中位数最低的可用实现。"""
+    ok = [r for r in results if r.ok]
+    if not ok:
+        return None
+    return min(ok, key=lambda r: r.screenshot.percentile(50))
+
+
+def select_impl(game: 'GameConfig', cache_path: str) -> ControlImpl:
+    """
+    为 `control_impl='auto'` 选择控制实现。
+
+    结果按模拟器实例缓存在 `cache_path` 中，只在首次遇到某个实例时测试。
+    测试不会点击，只比较截图延迟。
+
+    :param game: 游戏配置。
+    :param cache_path: 缓存文件路径。
+    :raise RuntimeError: 没有任何可用的实现。
+    """
+    key = host_key(game)
+    cache: dict[str, Any] = {}
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            logger.warning(f'Ignoring broken control impl cache: {cache_path}')
+    cached = cache.get(key)
+    if cached and cached.get('impl') in available_impls(game):
+        logger.info(f'Using cached control impl for {key}: {cached["impl"]}')
+        return cached['impl']
+
+    results = bench_all(game, screenshots=10, clicks=0, duration=0)
+    best = fastest(results)
+    if best is None:
+        raise RuntimeError(f'No working control implementation for {key}: ' + '; '.join(
+            f'{r.impl}: {r.error}' for r in results
+        ))
+    logger.info(f'Selected control impl for {key}: {best.impl}')
+    cache[key] = {
+        'impl': best.impl,
+        'screenshot_p50_ms': {r.impl: round(r.screenshot.percentile(50) * 1000, 1) for r in results if r.ok},
+        'time': time.time(),
+    }
+    os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+    with open(cache_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+    return best.impl
@@ -0,0 +1,201 @@
+import time
+import threading
+from typing import Any, Callable
+
+import cv2
+import numpy as np
+from cv2.typing import MatLike
+
+from kotonebot import logging
+from iaa.errors import IaaError
+
+logger = logging.getLogger(__name__)
+
+
+CAPTURE_TIMEOUT = 10
+"""等待后台截图的最长时间（秒）"""
+
+
+class CaptureTimeoutError(IaaError):
+    """后台截图长时间没有产出符合条件的帧"""
+    def __init__(self, timeout: float):
+        super().__init__(f'No new frame from background capture in {timeout:g}s.')
+
+
+class FrameRing:
+    """
+    预分配的截图环形缓冲区。
+
+    写入方每次写入一个不是最新帧的槽位，读取方复制出最新的一帧。
+    返回给调用方的总是独立的副本，之后的写入不会改变已经取走的截图。
+    因此只需要两个槽位：最新帧与正在写入的帧。
+    """
+    def __init__(self, slots: int = 2):
+        if slots < 2:
+            raise ValueError('FrameRing needs at least 2 slots.')
+        self.__slots: list[np.ndarray] = []
+        self.__count = slots
+        self.__stamps: list[float] = [0.0] * slots
+        self.__latest: int = -1
+        self.__cond = threading.Condition()
+        self.seq: int = 0
+        """已写入的帧数"""
+
+    def __ensure(self, shape: tuple[int, ...]) -> None:
+        # 首帧或分辨率变化时重新分配，之后一直复用
+        if not self.__slots or self.__slots[0].shape != shape:
+            self.__slots = [np.empty(shape, dtype=np.uint8) for _ in range(self.__count)]
+            self.__latest = -1
+            logger.debug(f'Allocated {self.__count} frame slots of {shape}.')
+
+    def slot_for_write(self, shape: tuple[int, ...]) -> tuple[int, np.ndarray]:
+        """返回一个可写入的空闲槽位 (索引, 数组)。"""
+        with self.__cond:
+            self.__ensure(shape)
+            for i in range(self.__count):
+                if i != self.__latest:
+                    return i, self.__slots[i]
+        raise RuntimeError('No free frame slot.')  # 不会发生
+
+    def commit(self, index: int, stamp: float) -> None:
+        """
+        标记槽位写入完成。
+
+        :param index: 槽位索引。
+        :param stamp: 该帧开始截图的时间。
+        """
+        with self.__cond:
+            self.__stamps[index] = stamp
+            self.__latest = index
+            self.seq += 1
+            self.__cond.notify_all()
+
+    def take(self, newer_than: float = 0, timeout: float = CAPTURE_TIMEOUT) -> MatLike:
+        """
+        取出最新一帧的副本。
+
+        :param newer_than: 只接受在此时间之后开始截图的帧。
+        :param timeout: 等待符合条件的帧的最长时间（秒）。
+        :return: 最新帧的副本。
+        :raises CaptureTimeoutError: 超时仍没有符合条件的帧。
+        """
+        deadline = time.time() + timeout
+        with self.__cond:
+            while self.__latest < 0 or self.__stamps[self.__latest] <= newer_than:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise CaptureTimeoutError(timeout)
+                self.__cond.wait(remaining)
+            # 写入方不会写入最新帧所在的槽位，持有锁期间最新帧也不会变化，因此可以安全复制
+            return self.__slots[self.__latest].copy()
+
+
+class _TouchHook:
+    """触控实现的代理，在每次点击、滑动结束后调用回调。"""
+    def __init__(self, impl: Any, callback: Callable[[], None]):
+        self._impl = impl
+        self._callback = callback
+
+    def click(self, *args, **kwargs) -> Any:
+        try:
+            return self._impl.click(*args, **kwargs)
+        finally:
+            self._callback()
+
+    def swipe(self, *args, **kwargs) -> Any:
+        try:
+            return self._impl.swipe(*args, **kwargs)
+        finally:
+            self._callback()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._impl, name)
+
+
+class CaptureProducer:
+    """
+    后台截图线程。
+
+    在独立线程中持续截图并写入 `FrameRing`，通过 `screenshot_hook_before`
+    接管设备的截图：`device.screenshot()` 直接取走最新的一帧，不再同步等待截图。
+    点击与滑动后会等待一帧在操作之后才开始截取的画面，避免拿到操作前的旧画面。
+    后台截图期间设备的截图只由后台线程调用，
+    等不到新帧时抛出 `CaptureTimeoutError`，而不是退回同步截图。
+    """
+    def __init__(self, device: Any, *, slots: int = 2, interval: float = 0):
+        """
+        :param device: kotonebot 设备对象。
+        :param slots: 环形缓冲区槽位数。
+        :param interval: 两次截图之间的最小间隔（秒）。0 表示不限制。
+        """
+        self.device = device
+        self.ring = FrameRing(slots)
+        self.interval = interval
+        self.__thread: threading.Thread | None = None
+        self.__stop = threading.Event()
+        self.__last_action: float = 0
+        self.__old_hook: Any = None
+
+    def __target_size(self, raw: MatLike) -> tuple[int, int]:
+        h, w = raw.shape[:2]
+        target = self.device.target_resolution
+        if target is None:
+            return w, h
+        tw, th = target
+        # 与 kotonebot 一致，自动匹配横竖屏
+        if (w > h) != (tw > th):
+            tw, th = th, tw
+        return tw, th
+
+    def __run(self) -> None:
+        impl = self.device._screenshot
+        while not self.__stop.is_set():
+            start = time.time()
+            try:
+                raw = impl.screenshot()
+                size = self.__target_size(raw)
+                index, slot = self.ring.slot_for_write((size[1], size[0], raw.shape[2]))
+                if size == (raw.shape[1], raw.shape[0]):
+                    np.copyto(slot, raw)
+                else:
+                    cv2.resize(raw, size, dst=slot)
+                self.ring.commit(index, start)
+            except Exception:
+                logger.exception('Background capture failed.')
+                self.__stop.wait(1)
+                continue
+            if self.interval > 0:
+                self.__stop.wait(max(self.interval - (time.time() - start), 0))
+
+    def __on_action(self) -> None:
+        # 记录操作结束（而非开始）的时间，滑动过程中的画面也不会被取走
+        self.__last_action = time.time()
+
+    def __hook(self) -> MatLike:
+        # 不能返回 None：kotonebot 会退回同步截图，与后台线程同时调用截图实现
+        return self.ring.take(newer_than=self.__last_action)
+
+    def start(self) -> None:
+        """启动后台截图并接管设备截图。"""
+        if self.__thread is not None:
+            return
+        self.__stop.clear()
+        self.__thread = threading.Thread(target=self.__run, name='IAA-Capture', daemon=True)
+        self.__thread.start()
+        self.__old_hook = self.device.screenshot_hook_before
+        self.device.screenshot_hook_before = self.__hook
+        self.device._touch = _TouchHook(self.device._touch, self.__on_action)
+        logger.info('Background capture started.')
+
+    def stop(self) -> None:
+        """停止后台截图并恢复设备截图。"""
+        if self.__thread is None:
+            return
+        self.device.screenshot_hook_before = self.__old_hook
+        touch = self.device._touch
+        if isinstance(touch, _TouchHook) and touch._callback == self.__on_action:
+            self.device._touch = touch._impl
+        self.__stop.set()
+        self.__thread.join(timeout=5)
+        self.__thread = None
+        logger.info('Background capture stopped.')
@@ -0,0 +1,158 @@
+import threading
+import importlib
+from typing import TYPE_CHECKING, Any
+
+from kotonebot import logging
+from kotonebot.errors import ContextNotInitializedError
+from iaa.errors import UnsupportedKotonebotError
+
+if TYPE_CHECKING:
+    from kotonebot.client.device import Device
+    from kotonebot.backend.context.context import Context
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+_lock = threading.Lock()
+_stack_patched = False
+_FORWARDED = ('device', 'ocr', 'image', 'color', 'vars', 'debug', 'config')
+
+
+class _LocalStack:
+    """按线程隔离的列表，用于替换 `ContextStackVars.stack`。"""
+    def __items(self) -> list:
+        items = getattr(_local, 'stack', None)
+        if items is None:
+            items = _local.stack = []
+        return items
+
+    def append(self, item: Any) -> None:
+        self.__items().append(item)
+
+    def pop(self) -> Any:
+        return self.__items().pop()
+
+    def __len__(self) -> int:
+        return len(self.__items())
+
+    def __getitem__(self, index: int) -> Any:
+        return self.__items()[index]
+
+
+def _kb_context():
+    # `kotonebot.backend.context` 包导出了同名函数 `context`，无法通过属性访问子模块
+    return importlib.import_module('kotonebot.backend.context.context')
+
+
+def _forward(name: str):
+    return lambda: getattr(current(), name)
+
+
+def verify() -> None:
+    """
+    检查 kotonebot 的内部结构是否与 `enable` 的替换方式一致。
+
+    `enable` 替换的是 kotonebot 的私有属性（`ContextStackVars.stack` 与各转发对象的 `_FORWARD_getter`）。
+    kotonebot 的实现变化后，替换可能不报错却不再生效，各线程会共用同一个上下文。
+    因此在替换前检查这些属性存在且行为符合预期。
+
+    :raises UnsupportedKotonebotError: kotonebot 的内部结构与预期不符。
+    """
+    kb_context = _kb_context()
+    stack_vars = getattr(kb_context, 'ContextStackVars', None)
+    if stack_vars is None or not isinstance(vars(stack_vars).get('stack'), (list, _LocalStack)):
+        raise UnsupportedKotonebotError('ContextStackVars.stack is not a class-level list')
+    for method in ('push', 'pop', 'current', 'ensure_current'):
+        if not callable(getattr(stack_vars, method, None)):
+            raise UnsupportedKotonebotError(f'ContextStackVars.{method} is missing')
+    forwarded = getattr(kb_context, 'Forwarded', None)
+    if forwarded is None:
+        raise UnsupportedKotonebotError('Forwarded is missing')
+    for name in _FORWARDED:
+        obj = getattr(kb_context, name, None)
+        if not isinstance(obj, forwarded) or '_FORWARD_getter' not in vars(obj):
+            raise UnsupportedKotonebotError(f'{name} is not a Forwarded object with _FORWARD_getter')
+    # 用新的转发对象确认属性访问确实经过 `_FORWARD_getter`，不影响正在使用的全局对象
+    marker = object()
+    probe = forwarded(name='probe')
+    probe._FORWARD_getter = lambda: type('Probe', (), {'value': marker})
+    if getattr(probe, 'value', None) is not marker:
+        raise UnsupportedKotonebotError('Forwarded does not forward through _FORWARD_getter')
+
+
+def _verify_stack(stack_vars: Any) -> None:
+    """确认替换后的调用栈确实按线程隔离：在当前线程压栈后，应出现在本线程的列表中。"""
+    pushed = stack_vars.push()
+    try:
+        if not getattr(_local, 'stack', None) or _local.stack[-1] is not pushed:
+            raise UnsupportedKotonebotError('ContextStackVars.push does not use ContextStackVars.stack')
+    finally:
+        stack_vars.pop()
+
+
+def enable() -> None:
+    """
+    让 kotonebot 的上下文按线程隔离。
+
+    kotonebot 的上下文是进程全局的：`device`、`image` 等对象都转发到同一个 `Context`，
+    调用栈 `ContextStackVars.stack` 也只有一份。启用后，已通过 `bind` 绑定上下文的线程
+    会使用各自的 `Context` 与调用栈，未绑定的线程仍然使用 `init_context` 创建的全局上下文。
+
+    `init_context` 会重置转发目标，因此每次绑定时都会重新调用本函数。
+
+    :raises UnsupportedKotonebotError: kotonebot 的内部结构与预期不符，见 `verify`。
+    """
+    global _stack_patched
+    kb_context = _kb_context()
+    with _lock:
+        if not _stack_patched:
+            verify()
+            stack_vars = kb_context.ContextStackVars
+            original = stack_vars.stack
+            stack_vars.stack = _LocalStack()  # type: ignore
+            try:
+                _verify_stack(stack_vars)
+            except UnsupportedKotonebotError:
+                stack_vars.stack = original
+                raise
+            _stack_patched = True
+        for name in _FORWARDED:
+            getattr(kb_context, name)._FORWARD_getter = _forward(name)
+
+
+def current() -> 'Context':
+    """返回当前线程使用的 kotonebot 上下文。"""
+    ctx = getattr(_local, 'context', None)
+    if ctx is None:
+        ctx = _kb_context()._c
+        if ctx is None:
+            raise ContextNotInitializedError('Context not initialized')
+    return ctx
+
+
+def bind(device: 'Device') -> 'Context':
+    """
+    为当前线程创建并绑定独立的 kotonebot 上下文。
+
+    :param device: 当前线程驱动的设备。
+    :return: 新建的上下文。
+    """
+    from kotonebot.backend.context.context import Context
+    enable()
+    ctx = Context(config_path='config.json', config_type=dict[str, Any], device=device)
+    _local.context = ctx
+    return ctx
+
+
+def unbind() -> None:
+    """解除当前线程绑定的上下文。"""
+    _local.context = None
+
+
+def inject(**kwargs: Any) -> None:
+    """
+    替换当前线程上下文中的组件。参数同 `inject_context`。
+
+    与 `inject_context` 不同，线程绑定了独立上下文时只影响该线程。
+    """
+    current().inject(**kwargs)
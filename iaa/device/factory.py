@@ -0,0 +1,109 @@
+from typing import TYPE_CHECKING, Literal
+
+from kotonebot import logging
+
+if TYPE_CHECKING:
+    from kotonebot.client.device import Device
+    from iaa.config.schemas import GameConfig
+
+logger = logging.getLogger(__name__)
+
+ControlImpl = Literal['nemu_ipc', 'adb', 'uiautomator']
+"""具体的控制实现。`control_impl` 为 `auto` 时会被解析为其中之一。"""
+CONTROL_IMPLS: tuple[ControlImpl, ...] = ('nemu_ipc', 'adb', 'uiautomator')
+
+
+def available_impls(game: 'GameConfig') -> list[ControlImpl]:
+    """返回当前模拟器支持的控制实现。"""
+    if game.emulator == 'custom':
+        return ['adb', 'uiautomator']
+    return list(CONTROL_IMPLS)
+
+
+def _custom_address(game: 'GameConfig') -> tuple[str, int]:
+    data = game.emulator_data
+    if data is None:
+        return '127.0.0.1', 5555
+    return data.adb_ip or '127.0.0.1', data.adb_port or 5555
+
+
+def _mumu_instance(game: 'GameConfig'):
+    from kotonebot.client.host import Mumu12Host
+    hosts = Mumu12Host.list()
+    if not hosts:
+        raise RuntimeError("No MuMu host found.")
+    if game.instance_id is None:
+        return hosts[0]
+    for host in hosts:
+        if host.id == game.instance_id:
+            return host
+    raise RuntimeError(f"MuMu instance '{game.instance_id}' not found.")
+
+
+def list_instances() -> list[str]:
+    """返回所有正在运行的 MuMu 实例 ID。"""
+    from kotonebot.client.host import Mumu12Host
+    return [host.id for host in Mumu12Host.list() if host.running()]
+
+
+def host_key(game: 'GameConfig') -> str:
+    """
+    返回标识当前模拟器实例的键。
+
+    用于按实例缓存 `control_impl='auto'` 的选择结果。
+    """
+    if game.emulator == 'mumu':
+        return f'mumu:{_mumu_instance(game).id}'
+    elif game.emulator == 'custom':
+        ip, port = _custom_address(game)
+        return f'custom:{ip}:{port}'
+    else:
+        raise ValueError(f"Unknown emulator: {game.emulator}")
+
+
+def create_device(game: 'GameConfig', impl: ControlImpl) -> 'Device':
+    """
+    按配置创建设备。
+
+    :param game: 游戏配置。只使用其中的模拟器设置，`game.control_impl` 会被忽略。
+    :param impl: 控制实现。
+    """
+    emulator = game.emulator
+
+    if emulator == 'mumu':
+        host = _mumu_instance(game)
+        if impl == 'nemu_ipc':
+            from kotonebot.client.host.mumu12_host import MuMu12HostConfig
+            device = host.create_device('nemu_ipc', MuMu12HostConfig())
+        elif impl == 'adb':
+            from kotonebot.client.host import AdbHostConfig
+            device = host.create_device('adb', AdbHostConfig())
+        elif impl == 'uiautomator':
+            from kotonebot.client.host import AdbHostConfig
+            device = host.create_device('uiautomator2', AdbHostConfig())
+        else:
+            raise ValueError(f"Unknown control implementation: {impl}")
+    elif emulator == 'custom':
+        from kotonebot.client.host import create_custom
+        from kotonebot.client.host import AdbHostConfig
+        adb_ip, adb_port = _custom_address(game)
+        instance = create_custom(
+            adb_ip=adb_ip,
+            adb_port=adb_port,
+            adb_name="",
+            exe_path="",
+            emulator_args="",
+        )
+        if impl == 'adb':
+            device = instance.create_device('adb', AdbHostConfig())
+        elif impl == 'uiautomator':
+            device = instance.create_device('uiautomator2', AdbHostConfig())
+        elif impl == 'nemu_ipc':
+            raise ValueError("'nemu_ipc' 实现仅支持 MuMu12，不支持 custom 模拟器。")
+        else:
+            raise ValueError(f"Unknown control implementation: {impl}")
+    else:
+        raise ValueError(f"Unknown emulator: {emulator}")
+    device.target_resolution = (1280, 720)
+    device.orientation = 'landscape'
+    return device
@@ -0,0 +1,122 @@
+import ctypes
+from typing import Any
+
+import cv2
+import numpy as np
+from cv2.typing import MatLike
+
+from kotonebot import logging
+
+logger = logging.getLogger(__name__)
+
+
+class NemuFrameBuffer:
+    """
+    复用缓冲区的 nemu_ipc 截图。
+
+    kotonebot 的 `NemuIpcImpl.screenshot` 每次截图都会新建一块 RGBA 缓冲区与一张 BGR 图像，
+    1280x720 下每帧约 2.7 MB。本类只在分辨率变化时分配：
+    IPC 直接写入一块固定的 ctypes 缓冲区（NumPy 视图直接指向它，不经过复制），
+    颜色转换与翻转写入轮换使用的几张预分配 BGR 图像。
+
+    返回的图像在之后第 `buffers` 次截图时会被覆盖，
+    因此调用方不应长期持有截图；需要保留时请自行 `copy()`。
+    """
+    def __init__(self, impl: Any, *, buffers: int = 2):
+        """
+        :param impl: `NemuIpcImpl` 实例。
+        :param buffers: 轮换使用的输出图像数量。
+        """
+        if buffers < 1:
+            raise ValueError('NemuFrameBuffer needs at least 1 buffer.')
+        self.impl = impl
+        self.buffers = buffers
+        self.__size: tuple[int, int] = (0, 0)
+        self.__raw: ctypes.Array | None = None
+        self.__rgba: np.ndarray | None = None
+        self.__outputs: list[np.ndarray] = []
+        self.__next: int = 0
+        self.__w = ctypes.c_int(0)
+        self.__h = ctypes.c_int(0)
+        self.allocations: int = 0
+        """分配缓冲区的次数（每块缓冲区计一次）"""
+        self.frames: int = 0
+        """已截取的帧数"""
+
+    def __ensure(self, width: int, height: int) -> None:
+        if (width, height) == self.__size:
+            return
+        self.__raw = (ctypes.c_ubyte * (width * height * 4))()
+        self.__rgba = np.ctypeslib.as_array(self.__raw).reshape((height, width, 4))
+        self.__outputs = [np.empty((height, width, 3), dtype=np.uint8) for _ in range(self.buffers)]
+        self.__next = 0
+        self.__size = (width, height)
+        self.allocations += 1 + self.buffers
+        logger.debug(f'Allocated nemu_ipc frame buffers for {width}x{height}.')
+
+    def screenshot(self) -> MatLike:
+        """截图。与 `NemuIpcImpl.screenshot` 行为一致，但复用缓冲区。"""
+        impl = self.impl
+        impl._ensure_connected()
+        display_id = impl._get_display_id()
+        # 必须每次都查询分辨率，因为屏幕可能会旋转
+        width, height = impl.query_resolution(display_id)
+        self.__ensure(width, height)
+        assert self.__raw is not None and self.__rgba is not None
+
+        self.__w.value, self.__h.value = width, height
+        ret = impl._ipc.capture_display(
+            impl._connect_id,
+            display_id,
+            width * height * 4,
+            ctypes.cast(ctypes.pointer(self.__w), ctypes.c_void_p),
+            ctypes.cast(ctypes.pointer(self.__h), ctypes.c_void_p),
+            ctypes.cast(self.__raw, ctypes.c_void_p),
+        )
+        if ret != 0:
+            from kotonebot.client.implements.nemu_ipc.nemu_ipc import NemuIpcError
+            raise NemuIpcError(f"nemu_capture_display screenshot failed, error code={ret}")
+
+        out = self.__outputs[self.__next]
+        self.__next = (self.__next + 1) % self.buffers
+        # RGBA -> BGR，并上下翻转
+        cv2.cvtColor(self.__rgba, cv2.COLOR_RGBA2BGR, dst=out)
+        cv2.flip(out, 0, dst=out)
+        self.frames += 1
+        # 返回新的视图对象，使按对象身份判断「是否同一帧」的缓存不会混淆复用的缓冲区
+        return out.view()
+
+    def install(self) -> None:
+        """接管 `impl.screenshot`。"""
+        self.impl.screenshot = self.screenshot
+
+    def uninstall(self) -> None:
+        """恢复 `impl.screenshot`。"""
+        if self.impl.__dict__.get('screenshot') == self.screenshot:
+            del self.impl.screenshot
+
+    def stats(self) -> dict[str, int]:
+        """返回帧数与分配次数。"""
+        return {
+            'frames': self.frames,
+            'allocations': self.allocations,
+        }
+
+
+def install(device: Any, *, buffers: int = 2) -> NemuFrameBuffer | None:
+    """
+    为使用 nemu_ipc 截图的设备启用缓冲区复用。
+
+    :param device: kotonebot 设备对象。
+    :param buffers: 见 `NemuFrameBuffer`。
+    :return: 启用后的 `NemuFrameBuffer`。设备不使用 nemu_ipc 截图时返回 None。
+    """
+    from kotonebot.client.implements.nemu_ipc import NemuIpcImpl
+    impl = device._screenshot
+    if not isinstance(impl, NemuIpcImpl):
+        logger.warning(f'Frame buffer reuse is enabled but not applied: screenshot impl is {type(impl).__name__}, not nemu_ipc.')
+        return None
+    fb = NemuFrameBuffer(impl, buffers=buffers)
+    fb.install()
+    logger.info('nemu_ipc frame buffer reuse enabled.')
+    return fb
@@ -12,4 +12,11 @@ class SpecifiedSongLockedError(IaaFriendlyError):
 
 class ContextNotInitializedError(IaaError):
     def __init__(self) -> None:
-        super().__init__('Context not initialized. Call init() first.')
\ No newline at end of file
+        super().__init__('Context not initialized. Call init() first.')
+
+class UnsupportedKotonebotError(IaaError):
+    def __init__(self, detail: str) -> None:
+        super().__init__(
+            f'Installed kotonebot does not support per-thread contexts: {detail}. '
+            'Install the kotonebot version pinned in pyproject.toml.'
+        )
@@ -0,0 +1,165 @@
+import os
+import re
+import json
+import time
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable
+
+from kotonebot import logging
+
+logger = logging.getLogger(__name__)
+
+SERVER_TIMEZONES: dict[str, timezone] = {
+    'jp': timezone(timedelta(hours=9)),
+}
+"""各服务器使用的时区"""
+DAILY_RESET_HOUR = 4
+"""每日重置时间（服务器时区的小时）"""
+
+
+def game_day(server: str, now: float) -> str:
+    """
+    返回 `now` 所在的游戏日，格式为 `YYYY-MM-DD`。
+
+    游戏日从服务器时区的 `DAILY_RESET_HOUR` 点开始，例如日服 3 日 03:59 仍属于 2 日。
+
+    :param server: 服务器，见 `GameConfig.server`。
+    :param now: UNIX 时间戳。
+    """
+    local = datetime.fromtimestamp(now, SERVER_TIMEZONES[server])
+    return (local - timedelta(hours=DAILY_RESET_HOUR)).date().isoformat()
+
+
+def next_reset(server: str, now: float, hour: int = DAILY_RESET_HOUR) -> float:
+    """
+    返回 `now` 之后第一个服务器时区 `hour` 点的时间戳。
+
+    :param server: 服务器，见 `GameConfig.server`。
+    :param now: UNIX 时间戳。
+    :param hour: 服务器时区的小时。默认为每日重置时间。
+    """
+    local = datetime.fromtimestamp(now, SERVER_TIMEZONES[server])
+    at = local.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if at <= local:
+        at += timedelta(days=1)
+    return at.timestamp()
+
+
+class Ledger:
+    """
+    单个账号的每日完成记录。
+
+    任务确认当天已经没有可做的事时（例如广告已全部看完）调用 `mark`，
+    同一游戏日内的后续常规运行通过 `is_done` 直接跳过该任务，不再进入游戏确认。
+    记录在到期（默认为下一次每日重置）后自动失效。
+
+    每个账号一个 JSON 文件，多设备运行时各设备只写入自己的文件。
+    """
+    def __init__(self, path: str, server: str = 'jp', *, clock: Callable[[], float] = time.time):
+        """
+        :param path: 记录文件路径。
+        :param server: 服务器，用于计算重置时间。
+        :param clock: 返回当前 UNIX 时间戳的函数。
+        """
+        self.path = path
+        self.server = server
+        self.clock = clock
+        self.__lock = threading.Lock()
+        self.__entries: dict[str, dict[str, Any]] = self.__load()
+
+    @staticmethod
+    def for_account(root: str, account: str, server: str = 'jp', **kwargs: Any) -> 'Ledger':
+        """
+        返回账号对应的记录，文件位于 `<root>/cache/ledger/` 下。
+
+        :param root: 软件根目录。
+        :param account: 账号标识，见 `account_key`。
+        """
+        name = re.sub(r'[^\w.@-]', '_', account)
+        return Ledger(os.path.join(root, 'cache', 'ledger', f'{name}.json'), server, **kwargs)
+
+    def __load(self) -> dict[str, dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            logger.warning(f'Ignoring broken ledger: {self.path}')
+            return {}
+
+    def __save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.__entries, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+    def mark(self, task_id: str, outcome: str, *, expires: float | None = None) -> None:
+        """
+        记录任务今天已经完成。
+
+        :param task_id: 任务 ID，见 `iaa.tasks.registry`。
+        :param outcome: 完成情况，仅用于日志与排查。
+        :param expires: 记录失效的时间戳。为 None 时到下一次每日重置失效。
+        """
+        now = self.clock()
+        with self.__lock:
+            self.__entries[task_id] = {
+                'day': game_day(self.server, now),
+                'outcome': outcome,
+                'time': now,
+                'expires': next_reset(self.server, now) if expires is None else expires,
+            }
+            self.__save()
+        logger.info(f'Ledger: {task_id} -> {outcome}')
+
+    def entry(self, task_id: str) -> dict[str, Any] | None:
+        """返回任务仍然有效的记录。没有记录或已失效时返回 None。"""
+        with self.__lock:
+            entry = self.__entries.get(task_id)
+        if entry is None or self.clock() >= entry['expires']:
+            return None
+        return entry
+
+    def is_done(self, task_id: str) -> bool:
+        """任务在当前游戏日是否已经完成。"""
+        return self.entry(task_id) is not None
+
+    def clear(self, task_id: str | None = None) -> None:
+        """
+        删除记录。
+
+        :param task_id: 任务 ID。为 None 时删除所有记录。
+        """
+        with self.__lock:
+            if task_id is None:
+                self.__entries.clear()
+            else:
+                self.__entries.pop(task_id, None)
+            self.__save()
+
+
+def account_key(name: str, instance_id: str | None) -> str:
+    """
+    返回账号标识。
+
+    一份配置对应一个账号；多设备运行时同一配置在各实例上登录的是不同账号，因此加上实例 ID。
+
+    :param name: 配置名称。
+    :param instance_id: MuMu 实例 ID。
+    """
+    return name if instance_id is None else f'{name}@{instance_id}'
+
+
+def record(task_id: str, outcome: str, *, expires: float | None = None) -> None:
+    """
+    在当前上下文的记录中标记任务已完成。未设置记录（例如单独调试任务）时什么都不做。
+
+    参数同 `Ledger.mark`。
+    """
+    from iaa.context import ledger
+    current = ledger()
+    if current is not None:
+        current.mark(task_id, outcome, expires=expires)
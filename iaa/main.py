@@ -1,4 +1,5 @@
 import argparse
+import multiprocessing
 
 from kotonebot.backend import debug
 
@@ -12,6 +13,15 @@ def main():
     parser.add_argument('--task', '-t', type=str, help='Task name to run')
     parser.add_argument('--debug', '-d', action='store_true', help='Enable debug mode')
     parser.add_argument('--config', '-c', type=str, default='default', help='Configuration name to use')
+    parser.add_argument('--multi', action='store_true', help='Run regular tasks on every running MuMu instance in parallel')
+    parser.add_argument('--processes', action='store_true', help='With --multi, run each instance in its own worker process')
+    parser.add_argument('--instances', type=str, help='Comma-separated MuMu instance IDs for --multi or --serve (default: all running)')
+    parser.add_argument('--daemon', action='store_true', help='Keep running and trigger regular tasks on schedule (see scheduler.daemon_times)')
+    parser.add_argument('--serve', action='store_true', help='Run headless with a local HTTP/WebSocket control API (see iaa.application.server)')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Listen address for --serve')
+    parser.add_argument('--port', type=int, default=8765, help='Listen port for --serve')
+    parser.add_argument('--bench-device', action='store_true', help='Benchmark every available control implementation and exit')
+    parser.add_argument('--bench-samples', type=int, default=30, help='Latency samples per implementation for --bench-device')
     args = parser.parse_args()
 
     if args.debug:
@@ -24,17 +34,55 @@ def main():
     # 初始化核心服务（日志、配置、资源、调度器）
     iaa = IaaService()
 
-    if args.task:
+    if args.bench_device:
+        from iaa.device.bench import bench_all, fastest
+        # 点击样本数取截图样本数的三分之一，点击位置为屏幕左上角
+        results = bench_all(
+            iaa.config.conf.game,
+            screenshots=args.bench_samples,
+            clicks=max(args.bench_samples // 3, 1),
+        )
+        for result in results:
+            print(result.format())
+        best = fastest(results)
+        print(f"Fastest: {best.impl if best else 'none'}")
+    elif args.task:
         try:
             # 同步执行单个手动任务
             iaa.scheduler.run_single(args.task, run_in_thread=False)
         except ValueError:
             print(f"Available tasks: {list(MANUAL_TASKS.keys())}")
             print(f"Task '{args.task}' not found")
+    elif args.serve:
+        # 无界面服务模式，通过本地 API 控制各设备，Ctrl+C 退出
+        from iaa.application.server.index import ApiServer, discover_devices
+        # 配置文件可以在运行期间直接修改
+        iaa.config.watch()
+        instances = args.instances.split(',') if args.instances else None
+        server = ApiServer(iaa, discover_devices(iaa, instances), host=args.host, port=args.port)
+        try:
+            server.run()
+        except KeyboardInterrupt:
+            pass
+    elif args.daemon:
+        # 守护模式，按触发时间反复执行常规任务，Ctrl+C 退出
+        try:
+            iaa.config.watch()
+            iaa.scheduler.start_daemon(run_in_thread=True)
+            while iaa.scheduler._thread is not None and iaa.scheduler._thread.is_alive():
+                iaa.scheduler._thread.join(1)
+        except KeyboardInterrupt:
+            iaa.scheduler.stop(block=True)
+    elif args.multi:
+        # 同时在多个实例上同步执行常规任务
+        instances = args.instances.split(',') if args.instances else None
+        iaa.scheduler.start_multi(instances, run_in_thread=False, processes=args.processes)
     else:
         # 同步执行按配置启用的常规任务
         iaa.scheduler.start_regular(run_in_thread=False)
 
 
 if __name__ == "__main__":
+    # 打包后多进程模式需要
+    multiprocessing.freeze_support()
     main()
@@ -1,12 +1,52 @@
+from functools import cache
+
+import cv2
+import numpy as np
 from kotonebot import logging
 from kotonebot import device, image, task, Loop, action, sleep
+from kotonebot.backend.core import Image
+from kotonebot.primitives import Rect
 
 from . import R
-from .start_game import go_home
+from .common import wait_still, wait_until
+from .navigation import Scenes, at_scene, navigate_to
 from iaa.consts import PACKAGE_NAME_JP
+from iaa.ledger import record
+from iaa.vision.gate import similar
 
 logger = logging.getLogger(__name__)
 WATCH_AD_WAIT_SEC = 70
+"""观看广告的最长等待时间"""
+AD_MIN_WAIT_SEC = 15
+"""观看广告的最短等待时间。在此之前不检测广告是否结束。"""
+AD_EXPECTED_SEC = 30
+"""广告的预计时长。越接近此时间，检测关闭按钮越频繁。"""
+AD_CLOSE_RECT = Rect(0, 0, 1280, 140)
+"""广告关闭按钮的寻找范围（画面顶部）"""
+AD_CLOSE_THRESHOLD = 0.75
+"""广告关闭按钮的匹配阈值"""
+AD_STILL_SEC = 5
+"""等待关闭按钮超时后，画面静止多久视为广告已放完"""
+EMPTY_CONFIRM_COUNT = 5
+"""连续多少帧找不到任何广告按钮才视为广告已看完。单独一帧可能只是过渡画面或弹窗尚未载入。"""
+
+@cache
+def ad_close_templates() -> list[Image]:
+    """
+    广告关闭按钮（“×”）模板。
+
+    各家广告的关闭按钮样式不同，没有统一的素材，
+    因此按常见尺寸与笔画粗细绘制浅色与深色两种“×”。
+    """
+    templates = []
+    for size in (20, 28, 36):
+        for fg, bg in ((255, 0), (0, 255)):
+            for t in (max(size // 10, 2), size // 5):
+                img = np.full((size, size), bg, np.uint8)
+                cv2.line(img, (t, t), (size - 1 - t, size - 1 - t), fg, t, cv2.LINE_AA)
+                cv2.line(img, (t, size - 1 - t), (size - 1 - t, t), fg, t, cv2.LINE_AA)
+                templates.append(Image(data=cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)))
+    return templates
 
 @action('是否位于交叉路口')
 def is_at_intersection() -> bool:
@@ -18,45 +58,11 @@ def is_at_intersection() -> bool:
 @action('前往交叉路口', screenshot_mode='manual')
 def go_intersection():
     """
-    前置：位于首页\n
+    前置：-\n
     结束：位于交叉路口
     """
     logger.info('Going to intersection.')
-    device.screenshot()
-    if is_at_intersection():
-        logger.info('Now at intersection.')
-        return
-    # 打开地图
-    for _ in Loop(interval=0.6):
-        if image.find(R.Map.ButtonOpenMap):
-            device.click()
-            logger.debug('Clicked open map button.')
-            sleep(0.5)
-        elif image.find(R.Map.ButtonGoToReality):
-            logger.info('Now at Sekai map. Changing to real world.')
-            device.click()
-            sleep(0.5)
-        elif image.find(R.Map.ButtonGoToSekai):
-            logger.debug('Now at real world map.')
-            break
-    # 进入交叉路口
-    device.screenshot()
-    swipe_count = 0
-    MAX_SWIPE_COUNT = 5
-    for _ in Loop(interval=0.6):
-        if image.find(R.Map.Intersection):
-            device.click()
-            logger.debug('Clicked intersection on map.')
-        elif is_at_intersection():
-            logger.debug('Now at intersection.')
-            break
-        else:
-            # 重置视图到右下角
-            device.swipe_scaled(x1=0.7, x2=0.4, y1=0.5, y2=0.5)
-            swipe_count += 1
-            if swipe_count >= MAX_SWIPE_COUNT:
-                logger.debug('Reached max swipe count but still not found. Stop.')
-                return
+    navigate_to(Scenes.intersection)
 
 @action('打开 CM 界面', screenshot_mode='manual')
 def open_cm() -> bool:
@@ -64,7 +70,8 @@ def open_cm() -> bool:
     前置：位于交叉路口\n
     结束：位于 CM 弹窗
 
-    :returns: 是否成功打开 CM 界面。若为 False，原因是今天的广告都看完了。
+    :returns: 是否成功打开 CM 界面。
+        若为 False，说明滑动多次仍未找到 CM 图标。通常是今天的广告都看完了，但无法确认。
     """
     logger.info('Opening CM.')
     swipe_count = 0
@@ -93,14 +100,19 @@ def open_cm() -> bool:
     return False
 
 @action('看广告', screenshot_mode='manual')
-def clear_common_cm():
+def clear_common_cm() -> bool:
     """
     前置：已经在 CM 弹窗\n
-    结束：位于交叉路口
+    结束：位于 CM 弹窗或交叉路口
+
+    :returns: 是否确认广告已全部看完。
+        连续 `EMPTY_CONFIRM_COUNT` 帧都找不到任何广告按钮时才返回 True；
+        弹窗被关闭（回到了交叉路口）时无法确认，返回 False。
     """
     logger.info('Clearing CM.') 
     d = device.of_android()
     state: int = 1 # 1=开始看，2=载入，3=正在看，4=等结果
+    empty_count = 0
     for _ in Loop(interval=0.6):
         if state == 1:
             # 开始看
@@ -108,24 +120,57 @@ def clear_common_cm():
                 device.click()
                 logger.debug('Clicked 視聴開始 button.')
                 sleep(1)
+                empty_count = 0
                 state = 2
             elif image.find(R.Cm.ButtonPlayCm):
                 device.click()
                 logger.debug('Clicked CM start button.')
                 sleep(0.2)
-            # 没有剩余广告了
+                empty_count = 0
+            # 上一个广告的结果提示还没关闭
+            elif image.find_multi([
+                R.Cm.TextCmFailed,
+                R.Cm.TextAwardClaimed,
+                R.Cm.TextApRecovered
+            ]):
+                empty_count = 0
+                state = 4
+            elif at_scene(Scenes.intersection):
+                logger.info('CM popup closed. Cannot confirm all ads are cleared.')
+                return False
+            # 可能没有剩余广告了，连续多帧确认
             else:
-                logger.info('All ads cleared.')
-                break
+                empty_count += 1
+                logger.debug(f'No ad button found ({empty_count}/{EMPTY_CONFIRM_COUNT}).')
+                if empty_count >= EMPTY_CONFIRM_COUNT:
+                    logger.info('All ads cleared.')
+                    return True
         elif state == 2:
-            if image.find(R.Cm.ButtonPlayCm, threshold=0.7):
+            # 载入与等结果期间画面基本静止，相似画面沿用上一次的结果，见 `FrameGate.reuse_similar`
+            with similar():
+                loading = image.find(R.Cm.ButtonPlayCm, threshold=0.7)
+            if loading:
                 logger.debug('Loading ad...')
                 sleep(0.2)
             else:
-                logger.info(f'Ad loaded. Wait {WATCH_AD_WAIT_SEC} sec.')
+                logger.info(f'Ad loaded. Wait at most {WATCH_AD_WAIT_SEC} sec.')
                 state = 3
         elif state == 3:
-            sleep(WATCH_AD_WAIT_SEC)
+            # 广告放完后结束画面的顶部会出现关闭按钮。
+            # 超时仍未找到时，再等待画面静止作为兜底。
+            # 如果判断失误提前跳过，会在状态 4 中出现领取失败提示并重新观看。
+            if wait_until(
+                ad_close_templates(),
+                timeout=WATCH_AD_WAIT_SEC,
+                min_wait=AD_MIN_WAIT_SEC,
+                expected=AD_EXPECTED_SEC,
+                rect=AD_CLOSE_RECT,
+                threshold=AD_CLOSE_THRESHOLD,
+            ):
+                logger.debug('Ad close button found.')
+            else:
+                logger.debug('Ad close button not found. Waiting for still screen.')
+                wait_still(AD_STILL_SEC, timeout=AD_STILL_SEC * 2)
             logger.debug('Wait ad finished.')
             # 返回桌面再重新打开游戏就可以关闭广告
             d.commands.adb_shell('input keyevent KEYCODE_HOME')
@@ -135,32 +180,40 @@ def clear_common_cm():
             logger.debug('Ad skipped.')
             state = 4
         elif state == 4:
+            with similar():
+                failed = image.find(R.Cm.TextCmFailed)
+                claimed = not failed and image.find_multi([
+                    R.Cm.TextAwardClaimed,
+                    R.Cm.TextApRecovered
+                ])
             # 由于广告没放完就点了跳过导致领取奖励失败
-            if image.find(R.Cm.TextCmFailed):
+            if failed:
                 logger.info('Ad play failed due to early skip.')
                 device.click(1, 1) # 关闭弹窗
                 sleep(0.5)
                 state = 1
             # 看完了
-            elif image.find_multi([
-                R.Cm.TextAwardClaimed,
-                R.Cm.TextApRecovered
-            ]):
+            elif claimed:
                 logger.info('Ad award claimed.')
                 device.click_center() # 关闭奖励领取提示
                 state = 1
             # 还在加载
             else:
                 logger.debug('Waiting for result...')
+    return False
 
 @task('看广告', screenshot_mode='manual')
 def cm():
     """
     看广告并领取奖励。包括演出积分/心愿结晶、活动货币、两次 AP 恢复、两次礼物、水晶、音乐商店。
     """
-    go_home()
     go_intersection()
-    if open_cm():
-        clear_common_cm()
-    else:
-        logger.info('No ads available.')
+    if not open_cm():
+        # 找不到 CM 图标不能证明广告已看完（也可能是图标被遮挡），因此不记录完成，下次照常执行
+        logger.info('CM icon not found. Not marking CM as done.')
+        return
+    if not clear_common_cm():
+        logger.info('Could not confirm all ads are watched. Not marking CM as done.')
+        return
+    # 已在 CM 弹窗中连续多帧确认没有剩余广告
+    record('cm', 'all ads watched')
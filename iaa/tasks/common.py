@@ -1,12 +1,133 @@
-from kotonebot import device, image, task, Loop, action, sleep, color
+import time
+from contextlib import nullcontext
+from typing import Sequence
 
-from kotonebot.backend.core import HintBox
+from kotonebot import device, image, task, Loop, action, sleep, color
+from kotonebot import logging
+from kotonebot.backend.core import HintBox, Image
+from kotonebot.backend.image import TemplateMatchResult
+from kotonebot.backend.context.context import is_manual_screenshot_mode
+from kotonebot.primitives import Rect
 
 from . import R
+from iaa.vision import badge
+from iaa.vision.gate import FrameGate, similar
+
+logger = logging.getLogger(__name__)
 
 @action('是否位于首页')
 def at_home() -> bool:
     return image.find(R.Hud.IconCrystal) is not None
 
 def has_red_dot(box: HintBox) -> bool:
-    return color.find('#ff5589', rect=box) is not None
\ No newline at end of file
+    return badge.scan([box])[box]
+
+def has_red_dots(boxes: Sequence[HintBox]) -> dict[HintBox, bool]:
+    """
+    一次检测多个范围内是否有红点。
+
+    :param boxes: 红点范围。
+    :return: 范围 → 是否有红点。
+    """
+    return badge.scan(boxes)  # type: ignore
+
+def _next_interval(
+    elapsed: float,
+    expected: float,
+    min_interval: float,
+    max_interval: float,
+) -> float:
+    """
+    计算下一次轮询前的等待时间。
+
+    距离预计结束时间越远，轮询越稀疏；越接近，轮询越密集。超过预计结束时间后按最小间隔轮询。
+    """
+    remaining = expected - elapsed
+    return min(max(remaining / 2, min_interval), max_interval)
+
+def wait_until(
+    any_of: Sequence[Image],
+    *,
+    timeout: float | None = None,
+    min_wait: float = 0,
+    expected: float | None = None,
+    min_interval: float = 0.3,
+    max_interval: float = 5,
+    reuse_similar: bool = False,
+    rect: Rect | None = None,
+    threshold: float = 0.8,
+) -> TemplateMatchResult | None:
+    """
+    等待任意一个模板出现。
+
+    在 `min_wait` 秒内不进行任何检测；之后自适应轮询，
+    距离 `expected` 越远轮询越稀疏，越接近越密集。
+    任意模板出现时立即返回，同时会更新 `device.last_find`。
+
+    :param any_of: 结束条件模板。
+    :param timeout: 超时时间（秒），从调用时开始计算。为 None 时不超时。
+    :param min_wait: 最短等待时间（秒）。在此之前不可能结束。
+    :param expected: 预计结束时间（秒）。为 None 时视为等于 `min_wait`。
+    :param min_interval: 最小轮询间隔（秒）。
+    :param max_interval: 最大轮询间隔（秒）。
+    :param reuse_similar: 画面没有变化时是否沿用上一次的检测结果，见 `FrameGate.reuse_similar`。
+        只应在模板出现时画面会明显变化的等待中启用。
+    :param rect: 寻找范围。为 None 时在整张截图中寻找。
+    :param threshold: 匹配阈值。
+    :return: 找到的结果。超时返回 None。
+    """
+    start = time.time()
+    expected = min_wait if expected is None else expected
+    templates = list(any_of)
+    if min_wait > 0:
+        sleep(min_wait)
+    with similar() if reuse_similar else nullcontext():
+        while True:
+            if is_manual_screenshot_mode():
+                device.screenshot()
+            if ret := image.find_multi(templates, rect=rect, threshold=threshold):
+                logger.debug(f'wait_until finished after {time.time() - start:.1f}s.')
+                return ret
+            elapsed = time.time() - start
+            if timeout is not None and elapsed >= timeout:
+                logger.debug(f'wait_until timed out after {elapsed:.1f}s.')
+                return None
+            interval = _next_interval(elapsed, expected, min_interval, max_interval)
+            if timeout is not None:
+                interval = min(interval, timeout - elapsed)
+            sleep(interval)
+
+def wait_still(
+    still_for: float,
+    *,
+    timeout: float,
+    min_wait: float = 0,
+    interval: float = 1,
+) -> bool:
+    """
+    等待画面静止。
+
+    用于没有固定结束标志的画面（如广告）：画面连续 `still_for` 秒没有变化即视为结束。
+
+    :param still_for: 画面需要保持静止的时长（秒）。
+    :param timeout: 超时时间（秒），从调用时开始计算。
+    :param min_wait: 最短等待时间（秒）。在此之前不进行检测。
+    :param interval: 截图间隔（秒）。
+    :return: 画面是否已静止。超时返回 False。
+    """
+    start = time.time()
+    gate = FrameGate()
+    if min_wait > 0:
+        sleep(min_wait)
+    last_change = time.time()
+    while True:
+        now = time.time()
+        if gate.update(device.screenshot()):
+            last_change = now
+        elif now - last_change >= still_for:
+            logger.debug(f'Screen still after {now - start:.1f}s.')
+            return True
+        if now - start >= timeout:
+            logger.debug(f'wait_still timed out after {now - start:.1f}s.')
+            return False
+        sleep(min(interval, timeout - (now - start)))
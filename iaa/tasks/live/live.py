@@ -5,13 +5,18 @@ from kotonebot import logging
 from kotonebot import device, image, Loop, action, sleep, color
 
 from .. import R
-from ..common import at_home
+from ..common import at_home, has_red_dot, wait_until
+from ..navigation import Scenes, at_scene, navigate_to
+from ..planner import handoff
 from iaa.context import conf
+from iaa.ledger import record
 from ._select_song import next_song
 from ._scene import at_song_select
 from iaa.config.schemas import ChallengeLiveAward, GameCharacter
 
 logger = logging.getLogger(__name__)
+SHORTEST_SONG_SEC = 74.8
+"""最短歌曲（孑然妒火）的时长"""
 
 @action('演出', screenshot_mode='manual')
 def start_auto_live(
@@ -29,7 +34,7 @@ def start_auto_live(
         * `"once"`: 自动演出一次
         * `None`: 不自动演出
     :param back_to: 返回位置。\n
-        * `"home"`: 返回首页
+        * `"home"`: 返回首页。返回途中经过下一个任务的起始场景（见 `planner.handoff`）时提前结束。
         * `"select"`: 返回选歌界面
         * `None`: 不返回，直接在 LIVE CLEAR 或「已完成指定次数的演出」画面结束
     :param finish_pre_check:
@@ -72,9 +77,16 @@ def start_auto_live(
     # 开始并等待完成
     logger.debug('Clicking start live button.')
     device.click(image.expect_wait(R.Live.ButtonStartLive))
-    sleep(74.8 + 5) # 孑然妒火（最短曲） + 5s 缓冲
 
     is_mutiple_auto = (auto_setting == 'all' or isinstance(auto_setting, int))
+    # 等待结束提示出现，演出期间稀疏轮询。
+    # 结束提示出现时画面变化明显，画面没有变化时可以直接沿用上一次的检测结果
+    if is_mutiple_auto:
+        # 演出次数未知，无法预计结束时间，固定以较低频率轮询
+        wait_until([R.Live.TextAutoLiveCompleted], min_wait=SHORTEST_SONG_SEC, min_interval=2, reuse_similar=True)
+    else:
+        wait_until([R.Live.TextScoreRank], min_wait=SHORTEST_SONG_SEC, expected=SHORTEST_SONG_SEC + 5, reuse_similar=True)
+
     for _ in Loop():
         # 结束条件
         if is_mutiple_auto:
@@ -96,6 +108,7 @@ def start_auto_live(
     if back_to is None:
         return
     # 返回
+    stop_at = handoff()
     for _ in Loop(interval=0.5):
         if finish_pre_check:
             should_skip, should_break = finish_pre_check()
@@ -107,6 +120,10 @@ def start_auto_live(
         if back_to == 'home':
             if at_home():
                 break
+            # 下一个任务从这里开始，不必回到首页
+            if stop_at is not None and at_scene(stop_at):
+                logger.info(f'Stopped at {stop_at.name} for the next task.')
+                break
             device.click(1, 1)
             sleep(0.6)
         # 返回选歌界面要点“返回歌曲选择”按钮
@@ -155,17 +172,7 @@ def solo_live(
     if loop_count is not None and loop_count <= 0:
         raise ValueError('loop_count must be positive.')
     # 进入单人演出
-    for _ in Loop(interval=0.6):
-        if image.find(R.Hud.ButtonLive, threshold=0.55):
-            device.click()
-            logger.debug('Clicked home LIVE button.')
-            sleep(1)
-        elif image.find(R.Live.ButtonSoloLive):
-            device.click()
-            logger.debug('Clicked SoloLive button.')
-        elif at_song_select():
-            logger.debug('Now at song select.')
-            break
+    navigate_to(Scenes.song_select)
     
     count = 0
     max_count = loop_count or float('inf')
@@ -196,14 +203,12 @@ def challenge_live(
     character: GameCharacter
 ):
     # 进入挑战演出
+    navigate_to(Scenes.live_menu)
     for _ in Loop(interval=0.6):
-        if image.find(R.Hud.ButtonLive, threshold=0.55):
-            device.click()
-            logger.debug('Clicked home LIVE button.')
-            sleep(1)
-        elif image.find(R.Live.ButtonChallengeLive):
-            if not color.find('#ff5589', rect=R.Live.BoxChallengeLiveRedDot):
+        if image.find(R.Live.ButtonChallengeLive):
+            if not has_red_dot(R.Live.BoxChallengeLiveRedDot):
                 logger.info("Today's challenge live already cleared.")
+                record('challenge_live', 'already cleared')
                 return
             device.click()
             logger.debug('Clicked ChallengeLive button.')
@@ -328,4 +333,5 @@ def challenge_live(
                 sleep(0.3)
                 return True, False
         return False, False
-    start_auto_live('once', finish_pre_check=claim_reward)
\ No newline at end of file
+    start_auto_live('once', finish_pre_check=claim_reward)
+    record('challenge_live', 'cleared')
\ No newline at end of file
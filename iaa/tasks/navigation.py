@@ -0,0 +1,289 @@
+import heapq
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import Any, Callable, Sequence
+
+from cv2.typing import MatLike
+
+from kotonebot import device, image, action, sleep
+from kotonebot import logging
+from kotonebot.backend.core import Image
+from kotonebot.util import Throttler
+
+from . import R
+from ._fragments import handle_data_download
+from .story._common import skip_stories
+from iaa.errors import IaaError
+from iaa.vision.frame import Frame
+from iaa.vision.gate import similar
+
+logger = logging.getLogger(__name__)
+
+
+class NavigationError(IaaError):
+    def __init__(self, target: 'Scene', current: 'Scene | None') -> None:
+        name = current.name if current else '未知'
+        super().__init__(f'无法从「{name}」前往「{target.name}」。')
+
+
+@dataclass(eq=False)
+class Scene:
+    """场景。由一组特征模板识别，任意一个模板出现即视为位于该场景。"""
+    name: str
+    """场景名称"""
+    detectors: Sequence[Image]
+    """特征模板"""
+    threshold: float = 0.8
+    """匹配阈值"""
+
+    def detect(self, frame: Frame) -> bool:
+        """判断一帧截图是否位于本场景。"""
+        return any(frame.match(t, threshold=self.threshold) for t in self.detectors)
+
+
+@dataclass(eq=False)
+class Edge:
+    """场景之间的跳转。"""
+    source: Scene
+    """起点"""
+    target: Scene
+    """终点"""
+    action: Callable[[], Any]
+    """跳转时执行的操作。返回 False 表示当前画面无法执行（如被弹窗遮挡）。"""
+    cost: float = 1.5
+    """预计耗时（秒），用于选择最短路径"""
+    timeout: float = 3
+    """执行操作后等待到达终点的最长时间（秒）。超时则重新识别场景。"""
+
+
+@dataclass
+class SceneGraph:
+    """
+    场景图。
+
+    节点是场景，边是跳转操作。`navigate_to` 会识别当前场景，
+    按预计耗时选择最短路径，依次执行跳转。
+    每一步执行后只检测预期的下一个场景；若没有到达，则重新识别并重新规划。
+    """
+    scenes: list[Scene] = field(default_factory=list)
+    """所有场景。识别时按此顺序匹配，越具体的场景应越靠前。"""
+    edges: dict[Scene, list[Edge]] = field(default_factory=dict)
+    """以起点为键的跳转列表"""
+
+    def scene(self, name: str, *detectors: Image, threshold: float = 0.8) -> Scene:
+        """添加一个场景。"""
+        scene = Scene(name, detectors, threshold)
+        self.scenes.append(scene)
+        self.edges[scene] = []
+        return scene
+
+    def edge(
+        self,
+        source: Scene,
+        target: Scene,
+        action: Callable[[], Any],
+        *,
+        cost: float = 1.5,
+        timeout: float = 3,
+    ) -> Edge:
+        """添加一条跳转。"""
+        edge = Edge(source, target, action, cost, timeout)
+        self.edges[source].append(edge)
+        return edge
+
+    def classify(self, frame: MatLike | Frame | None = None) -> Scene | None:
+        """
+        识别当前场景。
+
+        :param frame: 截图。为 None 时重新截图。
+        :return: 当前场景。无法识别时返回 None。
+        """
+        if frame is None:
+            frame = device.screenshot()
+        frame = Frame.of(frame)
+        for scene in self.scenes:
+            if scene.detect(frame):
+                return scene
+        return None
+
+    def route(self, source: Scene, target: Scene) -> list[Edge] | None:
+        """
+        计算从 `source` 到 `target` 预计耗时最短的路径。
+
+        :return: 依次要执行的跳转。不可达时返回 None。
+        """
+        costs: dict[Scene, float] = {source: 0}
+        prev: dict[Scene, Edge] = {}
+        queue: list[tuple[float, int, Scene]] = [(0, id(source), source)]
+        while queue:
+            cost, _, scene = heapq.heappop(queue)
+            if scene is target:
+                break
+            if cost > costs[scene]:
+                continue
+            for edge in self.edges[scene]:
+                new_cost = cost + edge.cost
+                if new_cost < costs.get(edge.target, float('inf')):
+                    costs[edge.target] = new_cost
+                    prev[edge.target] = edge
+                    heapq.heappush(queue, (new_cost, id(edge.target), edge.target))
+        if target not in costs:
+            return None
+        path: list[Edge] = []
+        scene = target
+        while scene is not source:
+            edge = prev[scene]
+            path.append(edge)
+            scene = edge.source
+        path.reverse()
+        return path
+
+    def __wait_for(self, scene: Scene, timeout: float) -> bool:
+        start = time.time()
+        while True:
+            if scene.detect(Frame.of(device.screenshot())):
+                return True
+            if time.time() - start > timeout:
+                return False
+            sleep(0.3)
+
+    def navigate_to(self, target: Scene, *, timeout: float = 60) -> None:
+        """
+        前往指定场景。
+
+        :param target: 目标场景。
+        :param timeout: 超时时间（秒）。
+        :raises NavigationError: 超时仍未到达目标场景。
+        """
+        start = time.time()
+        th = Throttler(1)
+        current: Scene | None = None
+        unrecognized = False
+        while time.time() - start < timeout:
+            # 无法识别的画面在点击左上角之前通常保持不变，此时相似画面沿用上一次的识别结果
+            with similar() if unrecognized else nullcontext():
+                current = self.classify()
+            unrecognized = current is None
+            if current is target:
+                logger.info(f'Now at {target.name}.')
+                return
+            path = self.route(current, target) if current is not None else None
+            if path is None:
+                # 无法识别的画面（弹窗、公告、加载中等），与 go_home 一样点击左上角
+                if handle_data_download():
+                    continue
+                if th.request():
+                    device.click(1, 1)
+                sleep(0.3)
+                continue
+            logger.debug(f'Route: {" -> ".join([current.name] + [e.target.name for e in path])}')  # type: ignore
+            for edge in path:
+                if edge.action() is False:
+                    # 场景特征可见，但操作目标被遮挡，多半是有弹窗
+                    logger.debug(f'Action to {edge.target.name} blocked. Dismissing popup.')
+                    if th.request():
+                        device.click(1, 1)
+                    sleep(0.3)
+                    break
+                if not self.__wait_for(edge.target, edge.timeout):
+                    logger.debug(f'Expected {edge.target.name} not reached. Re-planning.')
+                    break
+                current = edge.target
+            if current is target:
+                logger.info(f'Now at {target.name}.')
+                return
+        raise NavigationError(target, current)
+
+
+def _click(template: Image, threshold: float = 0.8) -> Callable[[], bool]:
+    """返回一个点击当前画面中指定模板的操作。没有找到模板时返回 False。"""
+    def _action() -> bool:
+        if ret := image.find(template, threshold=threshold):
+            device.click(ret)
+            return True
+        return False
+    return _action
+
+def _back() -> None:
+    """返回上一级。游戏中点击左上角即可返回。"""
+    device.click(1, 1)
+
+MAX_SWIPE_COUNT = 5
+"""在现实世界地图上寻找交叉路口时的最大滑动次数"""
+
+def _enter_intersection() -> None:
+    """
+    在现实世界地图上点击交叉路口。看不到时向左滑动，将视图移向右下角。
+
+    :raises NavigationError: 滑动 `MAX_SWIPE_COUNT` 次后仍找不到交叉路口。
+    """
+    for swipe_count in range(MAX_SWIPE_COUNT + 1):
+        if swipe_count > 0:
+            device.swipe_scaled(x1=0.7, x2=0.4, y1=0.5, y2=0.5)
+            sleep(0.6)
+            device.screenshot()
+        if ret := image.find(R.Map.Intersection):
+            device.click(ret)
+            return
+    logger.debug('Reached max swipe count but still not found. Stop.')
+    raise NavigationError(Scenes.intersection, Scenes.map_real)
+
+
+graph = SceneGraph()
+"""游戏的场景图"""
+
+class Scenes:
+    """游戏中的场景。"""
+    story_reading = graph.scene('剧情阅读', R.Story.ButtonStoryMenu)
+    story_list = graph.scene('活动剧情列表', R.Story.TextEventStory)
+    event = graph.scene('活动页面', R.Activity.ButtonIconEventStory)
+    song_select = graph.scene('选歌', R.Live.ButtonDecide)
+    challenge_select = graph.scene('挑战演出角色选择', R.Live.ChallengeLive.TextSelectCharacter)
+    live_menu = graph.scene('LIVE 菜单', R.Live.ButtonSoloLive)
+    cm = graph.scene('CM 弹窗', R.Cm.ButtonPlayCm)
+    intersection = graph.scene('交叉路口', R.Scene.Intersection.BuildingLogo, R.Scene.Intersection.IconCm)
+    map_sekai = graph.scene('世界地图', R.Map.ButtonGoToReality)
+    map_real = graph.scene('现实世界地图', R.Map.ButtonGoToSekai)
+    home = graph.scene('首页', R.Hud.IconCrystal)
+
+graph.edge(Scenes.home, Scenes.live_menu, _click(R.Hud.ButtonLive, threshold=0.55))
+graph.edge(Scenes.live_menu, Scenes.song_select, _click(R.Live.ButtonSoloLive))
+graph.edge(Scenes.live_menu, Scenes.event, lambda: device.click(R.Live.PointEventButton), timeout=5)
+graph.edge(Scenes.event, Scenes.story_list, _click(R.Activity.ButtonIconEventStory))
+# 第一次进入活动时会自动阅读第一话
+graph.edge(Scenes.story_reading, Scenes.story_list, lambda: skip_stories(mode='skip'), cost=10, timeout=10)
+graph.edge(Scenes.home, Scenes.map_real, _click(R.Map.ButtonOpenMap))
+graph.edge(Scenes.map_sekai, Scenes.map_real, _click(R.Map.ButtonGoToReality))
+graph.edge(Scenes.map_real, Scenes.intersection, _enter_intersection, cost=3)
+for _source, _target in [
+    (Scenes.live_menu, Scenes.home),
+    (Scenes.song_select, Scenes.live_menu),
+    (Scenes.challenge_select, Scenes.live_menu),
+    (Scenes.event, Scenes.live_menu),
+    (Scenes.story_list, Scenes.event),
+    (Scenes.cm, Scenes.intersection),
+    (Scenes.intersection, Scenes.home),
+    (Scenes.map_real, Scenes.home),
+    (Scenes.map_sekai, Scenes.home),
+]:
+    graph.edge(_source, _target, _back)
+
+
+def at_scene(scene: Scene) -> bool:
+    """当前截图是否位于指定场景。与 `image.find` 一样使用当前上下文中的截图。"""
+    return image.find_multi(list(scene.detectors), threshold=scene.threshold) is not None
+
+
+@action('前往场景', screenshot_mode='manual')
+def navigate_to(target: Scene, *, timeout: float = 60) -> None:
+    """
+    从当前画面前往指定场景，走预计耗时最短的路径。
+
+    前置：-\n
+    结束：位于 `target`
+
+    :param target: 目标场景，见 `Scenes`。
+    :param timeout: 超时时间（秒）。
+    """
+    graph.navigate_to(target, timeout=timeout)
@@ -0,0 +1,163 @@
+import itertools
+import functools
+import contextvars
+from dataclasses import dataclass
+from typing import Callable
+
+from kotonebot import logging
+
+from .navigation import Scene, Scenes, graph
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class TaskScenes:
+    """任务开始与结束时所在的场景。"""
+    start: Scene | None
+    """任务第一步前往的场景。为 None 时任务不依赖当前场景。"""
+    ends: tuple[Scene, ...]
+    """
+    任务结束时返回途中依次经过的场景，最后一个是默认的结束场景。
+
+    下一个任务的起始场景在其中时，任务会提前停在该场景，见 `handoff`。
+    """
+
+
+TASK_SCENES: dict[str, TaskScenes] = {
+    'start_game': TaskScenes(None, (Scenes.home,)),
+    'cm': TaskScenes(Scenes.intersection, (Scenes.intersection,)),
+    'solo_live': TaskScenes(Scenes.song_select, (Scenes.song_select, Scenes.live_menu, Scenes.home)),
+    'challenge_live': TaskScenes(Scenes.live_menu, (Scenes.live_menu, Scenes.home)),
+    'activity_story': TaskScenes(Scenes.story_list, (Scenes.story_list,)),
+}
+"""常规任务的场景，键与 `REGULAR_TASKS` 一致"""
+PINNED_FIRST = ('start_game',)
+"""总是最先执行的任务"""
+ORDER_CONSTRAINTS: list[tuple[str, str]] = [
+    # 广告奖励包含 AP 恢复，看完再演出
+    ('cm', 'solo_live'),
+]
+"""`(a, b)` 表示 a 必须在 b 之前执行"""
+
+_handoff: contextvars.ContextVar[Scene | None] = contextvars.ContextVar('handoff', default=None)
+_UNKNOWN = TaskScenes(None, ())
+
+
+def handoff() -> Scene | None:
+    """
+    返回当前任务结束时可以停留的场景，即下一个任务的起始场景。
+
+    任务返回首页的途中经过该场景时可以直接结束，由下一个任务从这里继续导航。
+    没有下一个任务或不需要提前停留时返回 None。
+    """
+    return _handoff.get()
+
+
+def route_cost(source: Scene | None, target: Scene | None) -> float:
+    """
+    返回场景之间的预计导航耗时（秒）。
+
+    起点未知时视为从首页出发；终点为 None（任务不依赖场景）时耗时为 0。
+    """
+    if target is None:
+        return 0
+    source = source or Scenes.home
+    if source is target:
+        return 0
+    path = graph.route(source, target)
+    if path is None:
+        return float('inf')
+    return sum(edge.cost for edge in path)
+
+
+def _pair_cost(prev: TaskScenes, next: TaskScenes, *, stop_early: bool = True) -> float:
+    """前一个任务返回途中的路程，加上从停留场景到下一个任务起始场景的路程。"""
+    if not prev.ends:
+        return route_cost(None, next.start)
+    stop = prev.ends[-1]
+    if stop_early and next.start in prev.ends:
+        stop = next.start
+    return route_cost(prev.ends[0], stop) + route_cost(stop, next.start)
+
+
+def order_cost(task_ids: list[str], *, stop_early: bool = True) -> float:
+    """
+    按顺序执行任务时，任务之间的预计导航总耗时。
+
+    :param stop_early: 是否在下一个任务的起始场景提前停留。为 False 时每个任务都回到默认结束场景。
+    """
+    scenes = [TASK_SCENES.get(task_id, _UNKNOWN) for task_id in task_ids]
+    if not scenes:
+        return 0
+    cost = route_cost(None, scenes[0].start)
+    for prev, next in zip(scenes, scenes[1:]):
+        cost += _pair_cost(prev, next, stop_early=stop_early)
+    return cost
+
+
+def _allowed(task_ids: tuple[str, ...]) -> bool:
+    index = {task_id: i for i, task_id in enumerate(task_ids)}
+    return all(index[a] < index[b] for a, b in ORDER_CONSTRAINTS if a in index and b in index)
+
+
+def _with_handoff(func: Callable[[], None], scene: Scene | None) -> Callable[[], None]:
+    @functools.wraps(func)
+    def _run() -> None:
+        token = _handoff.set(scene)
+        try:
+            func()
+        finally:
+            _handoff.reset(token)
+    return _run
+
+
+def plan(
+    tasks: list[tuple[str, Callable[[], None]]],
+    *,
+    log: bool = True,
+) -> list[tuple[str, Callable[[], None]]]:
+    """
+    按场景重新排列任务，使任务之间的导航耗时最短。
+
+    每个任务都从当前画面经最短路径前往自己的起始场景（见 `navigate_to`），
+    而结束时会一路返回首页。若下一个任务的起始场景就在返回途中，
+    任务会停在那里（见 `handoff`），省去返回首页再进入的路程。
+    `PINNED_FIRST` 中的任务保持在最前，并遵守 `ORDER_CONSTRAINTS`；耗时相同时保持原有顺序。
+
+    :param tasks: `(任务 ID, 任务)` 列表。
+    :param log: 是否输出计划与预计节省的时间。
+    :return: 重新排列后的任务列表。任务被包装为执行期间设置 `handoff`。
+    """
+    pinned = [t for t in tasks if t[0] in PINNED_FIRST]
+    rest = [t for t in tasks if t[0] not in PINNED_FIRST]
+    head = [task_id for task_id, _ in pinned]
+    best = rest
+    best_cost = float('inf')
+    # 常规任务只有几个，直接枚举
+    for order in itertools.permutations(rest):
+        ids = tuple(head + [task_id for task_id, _ in order])
+        if not _allowed(ids):
+            continue
+        cost = order_cost(list(ids))
+        if cost < best_cost:
+            best, best_cost = list(order), cost
+    ordered = pinned + best
+
+    planned = []
+    for i, (task_id, func) in enumerate(ordered):
+        scene = None
+        if i + 1 < len(ordered):
+            next_scenes = TASK_SCENES.get(ordered[i + 1][0], _UNKNOWN)
+            if next_scenes.start in TASK_SCENES.get(task_id, _UNKNOWN).ends[:-1]:
+                scene = next_scenes.start
+        planned.append((task_id, _with_handoff(func, scene)))
+
+    if log and tasks:
+        baseline = order_cost([task_id for task_id, _ in tasks], stop_early=False)
+        logger.info(
+            f"Planned task order: {', '.join(task_id for task_id, _ in planned)}. "
+            f"Estimated navigation {best_cost:.1f}s "
+            f"(fixed order returning home: {baseline:.1f}s, saved {baseline - best_cost:.1f}s)"
+        )
+    return planned
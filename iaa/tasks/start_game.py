@@ -7,6 +7,7 @@ from iaa.consts import PACKAGE_NAME_JP
 from iaa.context import conf
 from ._fragments import handle_data_download
 from . import R
+from iaa.vision.dispatch import Dispatcher, Rule, click
 
 logger = logging.getLogger(__name__)
 
@@ -16,23 +17,22 @@ def login(link_account: LinkAccountOptions):
     
     :param link_account: 账号引继方式，目前支持 'google_play'
     """
+    finished = Rule(R.Login.TextLinkFinished)
+    rules = [
+        finished,
+        Rule(R.Login.ButtonLink, click('Clicked 連携')),
+        Rule(R.Login.ButtonIconLink, click('Clicked データ引き継ぎ')),
+    ]
+    if link_account == 'google_play':
+        rules.append(Rule(R.Login.ButtonLinkByGooglePlay, click('Clicked GooglePlayで連携')))
+    rules.append(Rule(R.Login.ButtonMenu, click('Clicked 右上角菜单按钮')))
+
+    dispatcher = Dispatcher(rules)
     for _ in Loop(interval=3):
-        if image.find(R.Login.TextLinkFinished):
+        if dispatcher.dispatch() is finished:
             logger.debug('Link finished')
             logger.info('Login finished')
             break
-        if image.find(R.Login.ButtonLink):
-            device.click()
-            logger.debug('Clicked 連携')
-        elif image.find(R.Login.ButtonIconLink):
-            device.click()
-            logger.debug('Clicked データ引き継ぎ')
-        elif link_account == 'google_play' and image.find(R.Login.ButtonLinkByGooglePlay):
-            device.click()
-            logger.debug('Clicked GooglePlayで連携')
-        elif image.find(R.Login.ButtonMenu):
-            device.click()
-            logger.debug('Clicked 右上角菜单按钮')
 
 @action('返回首页', screenshot_mode='manual')
 def go_home(threshold_timeout: float = 0):
@@ -73,4 +73,16 @@ def start_game():
     else:
         logger.info('Already at game.')
         go_home()
-    
\ No newline at end of file
+
+@action('重启游戏', screenshot_mode='manual')
+def restart_game():
+    """
+    结束游戏进程后重新启动。用于从卡死中恢复。
+
+    前置：-\n
+    结束：首页
+    """
+    logger.info('Restarting game.')
+    device.of_android().commands.adb_shell(f'am force-stop {PACKAGE_NAME_JP}')
+    sleep(1)
+    start_game()
@@ -5,6 +5,7 @@ from kotonebot import action, task, Loop, device, image, sleep
 from kotonebot import logging
 
 from .. import R
+from iaa.vision.dispatch import Dispatcher, Rule, click
 
 logger = logging.getLogger(__name__)
 
@@ -50,34 +51,35 @@ def skip_stories(mode: SkipMode = 'skip'):
 
     :param mode: 跳过模式，可选值为 'skip'（跳过）, 'fast_forward'（快进）, 'read'（连点跳过）。
     """
-    for _ in Loop(interval=0.5):
-        if image.find(R.Story.ButtonStoryMenu):
+    def _claim_award(_):
+        logger.debug('Found award claimed dialog.')
+        if image.find(R.CommonDialog.ButtonAwardClaimedOk):
             device.click()
-            logger.debug('Clicked story menu button.')
-        elif image.find(R.CommonDialog.TextAwardClaimedOk):
-            # 奖励领取
-            logger.debug('Found award claimed dialog.')
-            if image.find(R.CommonDialog.ButtonAwardClaimedOk):
-                device.click()
-                logger.debug('Clicked award claimed ok button.')
-        elif at_story_list():
-            # 位于剧情列表
+            logger.debug('Clicked award claimed ok button.')
+
+    at_list = Rule(R.Story.TextEventStory)
+    rules = [
+        Rule(R.Story.ButtonStoryMenu, click('Clicked story menu button.')),
+        # 奖励领取
+        Rule(R.CommonDialog.TextAwardClaimedOk, _claim_award),
+        # 位于剧情列表
+        at_list,
+    ]
+    # 跳过处理
+    match mode:
+        case 'skip':
+            rules += [
+                Rule(R.Story.ButtonReadNext, click('Clicked read next button.')),
+                Rule(R.Story.ButtonSkipStory, click('Clicked skip button (last episode).')),
+                Rule(R.Story.ButtonIconSkip, click('Clicked skip button.')),
+            ]
+        case 'read':
+            raise NotImplementedError('Read mode is not implemented.')
+        case _:
+            assert_never(mode)
+
+    dispatcher = Dispatcher(rules)
+    for _ in Loop(interval=0.5):
+        if dispatcher.dispatch() is at_list:
             logger.info('Now at story list.')
             break
-        else:
-            # 跳过处理
-            match mode:
-                case 'skip':
-                    if image.find(R.Story.ButtonReadNext):
-                        device.click()
-                        logger.debug('Clicked read next button.')
-                    elif image.find(R.Story.ButtonSkipStory):
-                        device.click()
-                        logger.debug('Clicked skip button (last episode).')
-                    elif image.find(R.Story.ButtonIconSkip):
-                        device.click()
-                        logger.debug('Clicked skip button.')
-                case 'read':
-                    raise NotImplementedError('Read mode is not implemented.')
-                case _:
-                    assert_never(mode)
@@ -1,44 +1,28 @@
-from kotonebot import action, task, Loop, device, image, sleep
+import time
+
+from kotonebot import action, task
 from kotonebot import logging
 
+from iaa.context import conf
+from iaa.ledger import next_reset, record
 from iaa.tasks.common import has_red_dot
 
 from .. import R
-from ..start_game import go_home
-from .._fragments import handle_data_download
+from ..navigation import Scenes, navigate_to
 from ._common import enter_story, skip_stories
 
 logger = logging.getLogger(__name__)
+EVENT_START_HOUR = 15
+"""活动开始时间（服务器时区的小时）。新活动的剧情在此时开放。"""
 
 @action('前往活动剧情')
 def go_activity_story():
     """
-    前置：位于首页\n
+    前置：-\n
     结束：活动剧情界面
     """
-    go_home()
-    for _ in Loop():
-        # 新开活动，第一次进入，会弹出数据下载
-        if handle_data_download():
-            # 第一次进入会自动阅读第一话
-            skip_stories(mode='skip')
-            continue
-        if image.find(R.Hud.ButtonLive):
-            device.click()
-            logger.debug('Clicked live button.')
-            sleep(0.4)
-        elif image.find(R.Live.ButtonSoloLive):
-            # 说明已经打开了手机页面，点击活动页
-            device.click(R.Live.PointEventButton)
-            logger.debug('Entered event.')
-            sleep(1)
-        elif image.find(R.Activity.ButtonIconEventStory):
-            device.click()
-            logger.debug('Clicked event story button.')
-            sleep(0.4)
-        elif image.find(R.Story.TextEventStory):
-            logger.info('Now at story list.')
-            break
+    # 新开活动第一次进入时会弹出数据下载，并自动阅读第一话，均由场景图处理
+    navigate_to(Scenes.story_list)
 
 @task('刷当期活动剧情')
 def activity_story():
@@ -48,4 +32,8 @@ def activity_story():
         enter_story()
         skip_stories(mode='skip')
     else:
-        logger.info('No unread activity story found.')
\ No newline at end of file
+        logger.info('No unread activity story found.')
+    # 新活动可能在当天晚些时候开始，记录在活动开始时间也会失效
+    server = conf().game.server
+    now = time.time()
+    record('activity_story', 'all read', expires=min(next_reset(server, now), next_reset(server, now, EVENT_START_HOUR)))
\ No newline at end of file
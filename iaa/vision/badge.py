@@ -0,0 +1,64 @@
+from typing import Sequence
+
+import cv2
+import numpy as np
+from cv2.typing import MatLike
+
+from kotonebot.primitives import Rect
+from kotonebot.backend.context.context import ContextStackVars
+
+BADGE_COLOR = '#ff5589'
+"""红点徽章的颜色"""
+
+
+def _hls(color: str) -> np.ndarray:
+    r, g, b = (int(color[i:i + 2], 16) for i in (1, 3, 5))
+    return cv2.cvtColor(np.array([[[r, g, b]]], dtype=np.uint8), cv2.COLOR_RGB2HLS)[0, 0].astype(np.float32)
+
+
+def scan(
+    boxes: Sequence[Rect],
+    image: MatLike | None = None,
+    *,
+    color: str = BADGE_COLOR,
+    threshold: float = 0.95,
+) -> dict[Rect, bool]:
+    """
+    批量检测多个范围内是否有指定颜色的徽章。
+
+    只对所有范围的外接矩形做一次颜色转换与距离计算，
+    相似度算法与 `kotonebot.backend.color.find` 相同。
+
+    :param boxes: 要检测的范围。
+    :param image: 截图。为 None 时使用当前上下文中的截图。
+    :param color: 徽章颜色，格式为 `#RRGGBB`。
+    :param threshold: 相似度阈值，默认为 0.95。
+    :return: 范围 → 是否有徽章。
+    """
+    if not boxes:
+        return {}
+    if image is None:
+        image = ContextStackVars.ensure_current().screenshot
+    img_h, img_w = image.shape[:2]
+    x1 = max(min(b.x1 for b in boxes), 0)
+    y1 = max(min(b.y1 for b in boxes), 0)
+    x2 = min(max(b.x1 + b.w for b in boxes), img_w)
+    y2 = min(max(b.y1 + b.h for b in boxes), img_h)
+    if x1 >= x2 or y1 >= y2:
+        return {b: False for b in boxes}
+
+    hls = cv2.cvtColor(image[y1:y2, x1:x2], cv2.COLOR_BGR2HLS).astype(np.float32)
+    target_h, target_l, target_s = _hls(color)
+    h_diff = np.abs(hls[:, :, 0] - target_h)
+    h_diff = np.minimum(h_diff, 180 - h_diff) / 90
+    l_diff = np.abs(hls[:, :, 1] - target_l) / 255
+    s_diff = np.abs(hls[:, :, 2] - target_s) / 255
+    dist = np.sqrt((h_diff * 2) ** 2 + l_diff ** 2 + s_diff ** 2) / np.sqrt(6)
+    mask = dist <= (1 - threshold)
+
+    ret: dict[Rect, bool] = {}
+    for b in boxes:
+        bx1, by1 = max(b.x1 - x1, 0), max(b.y1 - y1, 0)
+        bx2, by2 = max(b.x1 + b.w - x1, 0), max(b.y1 + b.h - y1, 0)
+        ret[b] = bool(mask[by1:by2, bx1:bx2].any())
+    return ret
@@ -0,0 +1,120 @@
+import os
+import json
+import mmap
+import struct
+import threading
+from typing import NamedTuple
+
+import numpy as np
+
+from kotonebot import logging
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_NAME = 'sprites.bundle'
+BUNDLE_MAGIC = b'IAASPR\x00\x01'
+BUNDLE_ALIGN = 64
+"""数据区中每个数组起始偏移的对齐字节数"""
+
+
+class BundleEntry(NamedTuple):
+    image: np.ndarray
+    """BGR 图像"""
+    gray: np.ndarray
+    """灰度图像"""
+
+
+class SpriteBundle:
+    """
+    由 `tools/make_resources.py` 生成的 sprite 打包文件。
+
+    文件结构：
+    * 8 字节魔数 `BUNDLE_MAGIC`
+    * 4 字节小端无符号整数，索引长度
+    * UTF-8 JSON 索引
+    * 按 `BUNDLE_ALIGN` 对齐的数据区，依次存放各 sprite 的 BGR 与灰度像素
+
+    文件以只读方式 mmap，所有数组均为指向映射内存的只读视图，
+    多个进程打开同一文件时可共享物理内存页。
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.__mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        mm = self.__mmap
+        if mm[:len(BUNDLE_MAGIC)] != BUNDLE_MAGIC:
+            raise ValueError(f'Invalid sprite bundle: {path}')
+        index_len, = struct.unpack_from('<I', mm, len(BUNDLE_MAGIC))
+        index_start = len(BUNDLE_MAGIC) + 4
+        self.__index: dict[str, dict] = json.loads(mm[index_start:index_start + index_len].decode('utf-8'))
+        self.__data_start = align(index_start + index_len)
+        self.__entries: dict[str, BundleEntry] = {}
+
+    def __array(self, desc: dict) -> np.ndarray:
+        shape = tuple(desc['shape'])
+        count = int(np.prod(shape))
+        arr = np.frombuffer(
+            self.__mmap,
+            dtype=np.dtype(desc['dtype']),
+            count=count,
+            offset=self.__data_start + desc['offset'],
+        )
+        return arr.reshape(shape)
+
+    def get(self, key: str) -> BundleEntry | None:
+        """返回指定 sprite 的数据。不存在时返回 None。"""
+        entry = self.__entries.get(key)
+        if entry is not None:
+            return entry
+        desc = self.__index.get(key)
+        if desc is None:
+            return None
+        entry = BundleEntry(
+            image=self.__array(desc['image']),
+            gray=self.__array(desc['gray']),
+        )
+        self.__entries[key] = entry
+        return entry
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__index
+
+    def __len__(self) -> int:
+        return len(self.__index)
+
+
+def align(offset: int) -> int:
+    """将偏移向上对齐到 `BUNDLE_ALIGN`。"""
+    return (offset + BUNDLE_ALIGN - 1) // BUNDLE_ALIGN * BUNDLE_ALIGN
+
+
+_bundle: SpriteBundle | None = None
+_loaded: bool = False
+_lock = threading.Lock()
+
+
+def load() -> SpriteBundle | None:
+    """
+    加载 sprite 打包文件。只会加载一次，之后直接返回已加载的结果。
+
+    打包文件不存在或损坏时返回 None，此时模板会回退到逐个读取 PNG。
+    """
+    global _bundle, _loaded
+    if _loaded:
+        return _bundle
+    with _lock:
+        if _loaded:
+            return _bundle
+        from iaa.utils import sprite_path
+        path = sprite_path(BUNDLE_NAME)
+        if not os.path.exists(path):
+            logger.warning('Sprite bundle not found. Fallback to PNG files.')
+        else:
+            try:
+                _bundle = SpriteBundle(path)
+                logger.debug(f'Loaded sprite bundle with {len(_bundle)} sprites from {path}')
+            except Exception:
+                logger.exception('Failed to load sprite bundle. Fallback to PNG files.')
+                _bundle = None
+        _loaded = True
+    return _bundle
@@ -0,0 +1,100 @@
+from dataclasses import dataclass
+from typing import Any, Callable, Sequence
+
+from cv2.typing import MatLike
+
+from kotonebot import device
+from kotonebot import logging
+from kotonebot.backend.core import Image
+from kotonebot.backend.image import TemplateMatchResult
+from kotonebot.backend.context.context import ContextStackVars, check_flow_control
+from kotonebot.primitives import Rect
+
+from .frame import Frame
+
+logger = logging.getLogger(__name__)
+Handler = Callable[[TemplateMatchResult], Any]
+
+
+def click(message: str | None = None) -> Handler:
+    """
+    返回一个点击命中位置的 handler。
+
+    :param message: 点击后输出的调试日志。
+    """
+    def _handler(result: TemplateMatchResult) -> None:
+        device.click(result)
+        if message:
+            logger.debug(message)
+    return _handler
+
+
+@dataclass
+class Rule:
+    """场景分发规则。"""
+    template: Image
+    """要寻找的模板"""
+    handler: Handler | None = None
+    """命中时调用的函数。为 None 时只返回命中的规则，不做任何操作。"""
+    threshold: float = 0.8
+    """匹配阈值"""
+    rect: Rect | None = None
+    """寻找范围。为 None 时在整张截图中寻找。"""
+    colored: bool = False
+    """是否匹配颜色"""
+
+
+class Dispatcher:
+    """
+    单次多模板场景分发器。
+
+    用于替代 Loop 中由多个 `image.find` 组成的 if/elif 链。
+    所有规则共享同一帧的预处理结果：全图匹配共用截图的频谱与积分图，模板的频谱也会被缓存，
+    因此模板频谱命中缓存时，每多一条规则只增加一次频谱乘法与逆变换，
+    而不是一次完整的 `matchTemplate`（见 `Frame.match`）。
+    规则按顺序匹配，第一个命中的规则会被触发，其后的规则不再匹配。
+    匹配与 `image.find` 一样在彩色图上进行，阈值含义相同。
+    画面与上一次分发时相同时，直接复用上一次的匹配结果。
+
+    【例】
+    ```python
+    at_list = Rule(R.Story.TextEventStory)
+    dispatcher = Dispatcher([
+        Rule(R.Story.ButtonStoryMenu, lambda _: device.click()),
+        at_list,
+    ])
+    for _ in Loop():
+        if dispatcher.dispatch() is at_list:
+            break
+    ```
+    """
+    def __init__(self, rules: Sequence[Rule]):
+        self.rules = list(rules)
+
+    def dispatch(self, frame: MatLike | Frame | None = None) -> Rule | None:
+        """
+        在一帧上依次匹配所有规则，并触发第一个命中的规则。
+
+        命中时会同时更新 `device.last_find`，因此 handler 中可以直接调用 `device.click()`。
+
+        :param frame: 要匹配的截图。为 None 时使用当前上下文中的截图。
+        :return: 命中的规则。未命中时返回 None。
+        """
+        check_flow_control()
+        if frame is None:
+            frame = ContextStackVars.ensure_current().screenshot
+        frame = Frame.of(frame)
+        for rule in self.rules:
+            ret = frame.match(
+                rule.template,
+                threshold=rule.threshold,
+                rect=rule.rect,
+                colored=rule.colored,
+            )
+            if ret is None:
+                continue
+            device.last_find = ret
+            if rule.handler is not None:
+                rule.handler(ret)
+            return rule
+        return None
@@ -0,0 +1,381 @@
+import weakref
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+from cv2.typing import MatLike
+
+from kotonebot.backend.core import Image
+from kotonebot.backend.image import TemplateMatchResult, hist_match
+from kotonebot.primitives import Point, Rect, Size
+
+from . import gate
+from . import watchdog
+from .sprite import Sprite, hint_rect_of
+
+PYRAMID_SCALE: int = 1
+"""
+全局金字塔匹配缩小倍数。1 表示不使用金字塔匹配。
+
+可通过 `Sprite.pyramid` 对单个模板覆盖，或在调用 `Frame.match` 时显式指定。
+"""
+PYRAMID_RELAX = 0.15
+"""粗匹配阈值相对于最终阈值的放宽量"""
+PYRAMID_CANDIDATES = 3
+"""粗匹配最多保留的候选位置数"""
+PYRAMID_MIN_SIZE = 10
+"""缩小后模板的最小边长。小于此值时退回全分辨率匹配。"""
+
+SPECTRA_CACHE_BYTES = 128 * 1024 * 1024
+"""
+模板频谱缓存的容量（字节）。超出时淘汰最久未使用的模板。
+
+1280x720 下每个模板的三个通道频谱约占 11 MB。
+"""
+
+_small_templates: 'weakref.WeakKeyDictionary[Image, dict[int, MatLike]]' = weakref.WeakKeyDictionary()
+_spectra: 'OrderedDict[tuple[str, tuple[int, int]], tuple[list[MatLike], float]]' = OrderedDict()
+_spectra_bytes = 0
+_spectra_lock = threading.Lock()
+_local = threading.local()
+_FLT_EPSILON = float(np.finfo(np.float32).eps)
+
+
+def pyramid_of(template: Image) -> int:
+    """返回模板使用的金字塔缩小倍数。"""
+    if isinstance(template, Sprite) and template.pyramid is not None:
+        return template.pyramid
+    return PYRAMID_SCALE
+
+
+def _small_template(template: Image, scale: int) -> MatLike:
+    """返回缩小后的模板。结果按模板与倍数缓存。"""
+    cache = _small_templates.setdefault(template, {})
+    ret = cache.get(scale)
+    if ret is None:
+        tpl = template.data
+        h, w = tpl.shape[:2]
+        ret = cv2.resize(tpl, (w // scale, h // scale), interpolation=cv2.INTER_AREA)
+        cache[scale] = ret
+    return ret
+
+
+def _compute_spectra(tpl: MatLike, size: tuple[int, int]) -> tuple[list[MatLike], float]:
+    """计算模板各通道去均值后的频谱，以及去均值后的平方和。"""
+    h, w = tpl.shape[:2]
+    spectra = []
+    norm = 0.0
+    for channel in cv2.split(tpl):
+        channel = channel.astype(np.float32)
+        channel -= channel.mean()
+        norm += float(np.square(channel, dtype=np.float64).sum())
+        padded = np.zeros(size, np.float32)
+        padded[:h, :w] = channel
+        spectra.append(cv2.dft(padded, nonzeroRows=h))
+    return spectra, norm
+
+
+def _template_spectra(template: Image, tpl: MatLike, size: tuple[int, int]) -> tuple[list[MatLike], float]:
+    """
+    返回模板在指定频谱尺寸下的频谱与平方和，见 `_compute_spectra`。
+
+    只缓存带 key 的 `Sprite`（即 R.py 中的资源），按 (key, 频谱尺寸) 缓存，
+    总大小不超过 `SPECTRA_CACHE_BYTES`。其他模板每次都会重新计算。
+    """
+    global _spectra_bytes
+    if not isinstance(template, Sprite) or template.key is None:
+        return _compute_spectra(tpl, size)
+    key = (template.key, size)
+    with _spectra_lock:
+        ret = _spectra.get(key)
+        if ret is not None:
+            _spectra.move_to_end(key)
+            return ret
+    ret = _compute_spectra(tpl, size)
+    nbytes = sum(s.nbytes for s in ret[0])
+    with _spectra_lock:
+        if key not in _spectra:
+            _spectra[key] = ret
+            _spectra_bytes += nbytes
+            while _spectra_bytes > SPECTRA_CACHE_BYTES and len(_spectra) > 1:
+                _, (evicted, _) = _spectra.popitem(last=False)
+                _spectra_bytes -= sum(s.nbytes for s in evicted)
+    return ret
+
+
+def _normalize(num: np.ndarray, den: np.ndarray) -> np.ndarray:
+    """
+    计算 `num / den`，与 `cv2.matchTemplate` 的 TM_CCOEFF_NORMED 一致：
+    略超出 [-1, 1] 的值截断为 ±1，分母为 0 或偏差过大的位置记为 0。
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        score = num / den
+    score[~(np.abs(score) < 1.125)] = 0
+    np.clip(score, -1, 1, out=score)
+    return score
+
+
+class Frame:
+    """
+    一帧截图及其预处理结果。
+
+    同一帧上的多次模板匹配共享缩小图、频谱等中间数据，
+    避免每次 `image.find` 都重新处理整张截图。
+    """
+    def __init__(self, image: MatLike):
+        self.image = image
+        """原始 BGR 截图"""
+        self.__small: dict[int, MatLike] = {}
+        self.__spectra: list[MatLike] | None = None
+        self.__sums: tuple[list[np.ndarray], np.ndarray] | None = None
+
+    @classmethod
+    def of(cls, image: 'MatLike | Frame') -> 'Frame':
+        """
+        返回截图对应的 `Frame`。
+
+        同一张截图（按对象身份区分）在同一线程中返回同一个实例，
+        因此分散在各处的 `image.find`、`Dispatcher` 等可以共享本帧的预处理结果。
+        每个线程只保留最近一张截图的实例。
+        """
+        if isinstance(image, Frame):
+            return image
+        frame = getattr(_local, 'frame', None)
+        if frame is None or frame.image is not image:
+            frame = _local.frame = cls(image)
+        return frame
+
+    def small(self, scale: int) -> MatLike:
+        """缩小 `scale` 倍的截图。首次访问时缩小，之后复用。"""
+        ret = self.__small.get(scale)
+        if ret is None:
+            h, w = self.image.shape[:2]
+            ret = cv2.resize(self.image, (w // scale, h // scale), interpolation=cv2.INTER_AREA)
+            self.__small[scale] = ret
+        return ret
+
+    @property
+    def dft_size(self) -> tuple[int, int]:
+        """频谱尺寸 (高, 宽)"""
+        h, w = self.image.shape[:2]
+        return cv2.getOptimalDFTSize(h), cv2.getOptimalDFTSize(w)
+
+    @property
+    def spectra(self) -> list[MatLike]:
+        """各通道的频谱。首次访问时计算，之后本帧上所有全图匹配共用。"""
+        if self.__spectra is None:
+            h, w = self.image.shape[:2]
+            dh, dw = self.dft_size
+            self.__spectra = []
+            for channel in cv2.split(self.image):
+                # 去掉均值以减小频谱的数值范围，降低单精度 DFT 的舍入误差。
+                # 模板已去均值，因此截图减去常数不影响互相关的结果。
+                padded = np.zeros((dh, dw), np.float32)
+                padded[:h, :w] = channel
+                padded[:h, :w] -= float(channel.mean())
+                self.__spectra.append(cv2.dft(padded, nonzeroRows=h))
+        return self.__spectra
+
+    @property
+    def sums(self) -> tuple[list[np.ndarray], np.ndarray]:
+        """各通道的积分图与所有通道平方和的积分图，用于计算任意窗口的方差。"""
+        if self.__sums is None:
+            sums, squares = [], None
+            for channel in cv2.split(self.image):
+                s, sq = cv2.integral2(channel, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+                sums.append(s)
+                squares = sq if squares is None else cv2.add(squares, sq)
+            self.__sums = (sums, squares)  # type: ignore
+        return self.__sums  # type: ignore
+
+    def match(
+        self,
+        template: Image,
+        *,
+        threshold: float = 0.8,
+        rect: Rect | None = None,
+        colored: bool = False,
+        pyramid: int | None = None,
+    ) -> TemplateMatchResult | None:
+        """
+        在本帧中寻找模板，返回得分最高的结果。
+
+        与 kotonebot 的 `image.find` 一样在 BGR 彩色图上以 TM_CCOEFF_NORMED 匹配，
+        因此已有的阈值可以直接沿用。
+        同一帧上参数相同的匹配只会执行一次，见 `gate.current()`。
+        每次匹配都会报告给卡死检测，见 `watchdog.current()`。
+        若未指定 `rect` 且模板带有提示范围，则先在提示范围内寻找。
+
+        全图匹配不逐个调用 `cv2.matchTemplate`，而是共用本帧的频谱与积分图（见 `spectra`、`sums`），
+        模板的频谱也会被缓存（见 `SPECTRA_CACHE_BYTES`），
+        因此模板频谱命中缓存时，每个模板只需一次频谱乘法与逆变换。
+        得分与 `cv2.matchTemplate` 的差异在单精度舍入误差范围内。
+
+        启用金字塔匹配时，先在缩小的截图上用放宽的阈值粗匹配，
+        再只在候选位置附近的小窗口内做全分辨率匹配。
+
+        :param template: 模板图像。
+        :param threshold: 阈值，默认为 0.8。
+        :param rect: 如果指定，则只在指定矩形区域内进行匹配。
+        :param colored: 是否额外进行颜色直方图匹配，默认为 False。
+        :param pyramid: 金字塔缩小倍数。为 None 时使用 `pyramid_of(template)`，为 1 时不使用金字塔匹配。
+        :return: 匹配结果。未找到时返回 None。
+        :raises TaskStuckError: 卡死检测认为任务已卡住，见 `Watchdog.observe`。
+        """
+        if pyramid is None:
+            pyramid = pyramid_of(template)
+        key = ('match', template, threshold, rect, colored, pyramid)
+        frame_gate = gate.current()
+        ret = frame_gate.cached(
+            self.image, key,
+            lambda: self.__match_hinted(template, threshold, rect, colored, pyramid),
+        )
+        watchdog.current().observe(self.image, frame_gate.frame_id, key, ret is not None)
+        return ret
+
+    def __match_hinted(
+        self,
+        template: Image,
+        threshold: float,
+        rect: Rect | None,
+        colored: bool,
+        pyramid: int,
+    ) -> TemplateMatchResult | None:
+        hint = hint_rect_of(template)
+        if rect is None and hint is not None:
+            ret = self.__match(template, threshold, hint, colored, pyramid)
+            if ret is not None:
+                return ret
+        return self.__match(template, threshold, rect, colored, pyramid)
+
+    def __match(
+        self,
+        template: Image,
+        threshold: float,
+        rect: Rect | None,
+        colored: bool,
+        pyramid: int,
+    ) -> TemplateMatchResult | None:
+        image = self.image
+        x0, y0 = 0, 0
+        x1, y1 = image.shape[1], image.shape[0]
+        if rect is not None:
+            x0, y0 = max(rect.x1, 0), max(rect.y1, 0)
+            x1, y1 = min(rect.x1 + rect.w, x1), min(rect.y1 + rect.h, y1)
+            image = image[y0:y1, x0:x1]
+        tpl = template.data
+        h, w = tpl.shape[:2]
+        if image.shape[0] < h or image.shape[1] < w:
+            return None
+
+        if pyramid > 1 and min(h, w) // pyramid >= PYRAMID_MIN_SIZE:
+            found = self.__match_pyramid(template, threshold, (x0, y0, x1, y1), pyramid)
+        else:
+            if rect is None:
+                result = self.__correlate(template)
+            else:
+                result = cv2.matchTemplate(image, tpl, cv2.TM_CCOEFF_NORMED)
+            _, score, _, (x, y) = cv2.minMaxLoc(result)
+            found = (score, x + x0, y + y0)
+        if found is None:
+            return None
+        score, x, y = found
+        if score < threshold:
+            return None
+        if colored and not hist_match(self.image, tpl, (x, y, w, h)):
+            return None
+        return TemplateMatchResult(
+            score=float(score),
+            position=Point(int(x), int(y)),
+            size=Size(int(w), int(h)),
+        )
+
+    def __correlate(self, template: Image) -> np.ndarray:
+        """
+        用本帧的频谱计算整张截图上的 TM_CCOEFF_NORMED 得分图。
+
+        分子为各通道去均值模板与截图的互相关之和，在频域中相乘后只做一次逆变换；
+        分母中窗口的方差由积分图得到。
+        与 `cv2.matchTemplate` 一样，方差接近 0 的窗口（纯色区域）得分为 0；
+        纯色模板在任意位置的得分都为 0（OpenCV 在此情况下只输出舍入噪声）。
+        """
+        tpl = template.data
+        h, w = tpl.shape[:2]
+        fh, fw = self.image.shape[:2]
+        rh, rw = fh - h + 1, fw - w + 1
+        spectra, norm = _template_spectra(template, tpl, self.dft_size)
+        if norm / (h * w) < np.finfo(np.float64).eps:
+            return np.zeros((rh, rw), np.float32)
+        product = None
+        for frame_spectrum, tpl_spectrum in zip(self.spectra, spectra):
+            p = cv2.mulSpectrums(frame_spectrum, tpl_spectrum, 0, conjB=True)
+            product = p if product is None else cv2.add(product, p)
+        num = cv2.idft(product, flags=cv2.DFT_REAL_OUTPUT | cv2.DFT_SCALE, nonzeroRows=rh)[:rh, :rw]
+
+        def window(s: np.ndarray) -> np.ndarray:
+            ret = s[h:, w:] - s[:-h, w:]
+            ret -= s[h:, :-w]
+            ret += s[:-h, :-w]
+            return ret
+
+        sums, squares = self.sums
+        squares = window(squares)
+        variance = squares.copy()
+        for s in sums:
+            mean = window(s)
+            mean *= mean
+            mean /= h * w
+            variance -= mean
+        np.maximum(variance, 0, out=variance)
+        # 与 OpenCV 相同，方差过小时视为纯色窗口，避免舍入误差被放大成 ±1
+        flat = variance <= np.minimum(0.5, 10 * _FLT_EPSILON * squares)
+        variance *= norm
+        den = np.sqrt(variance).astype(np.float32)
+        den[flat] = 0
+        return _normalize(num, den)
+
+    def __match_pyramid(
+        self,
+        template: Image,
+        threshold: float,
+        roi: tuple[int, int, int, int],
+        scale: int,
+    ) -> tuple[float, int, int] | None:
+        """
+        金字塔匹配。
+
+        :param roi: 搜索范围 (x1, y1, x2, y2)，全分辨率坐标。
+        :return: (得分, x, y)，全分辨率坐标。没有候选时返回 None。
+        """
+        x0, y0, x1, y1 = roi
+        small = self.small(scale)[y0 // scale:y1 // scale, x0 // scale:x1 // scale]
+        small_tpl = _small_template(template, scale)
+        sh, sw = small_tpl.shape[:2]
+        if small.shape[0] < sh or small.shape[1] < sw:
+            return None
+        coarse = cv2.matchTemplate(small, small_tpl, cv2.TM_CCOEFF_NORMED)
+
+        image = self.image
+        tpl = template.data
+        h, w = tpl.shape[:2]
+        best: tuple[float, int, int] | None = None
+        for _ in range(PYRAMID_CANDIDATES):
+            _, coarse_score, _, (cx, cy) = cv2.minMaxLoc(coarse)
+            if coarse_score < threshold - PYRAMID_RELAX:
+                break
+            # 在候选位置附近的窗口内做全分辨率匹配
+            bx, by = (x0 // scale + cx) * scale, (y0 // scale + cy) * scale
+            wx0, wy0 = max(bx - scale, x0), max(by - scale, y0)
+            wx1, wy1 = min(bx + w + 2 * scale, x1), min(by + h + 2 * scale, y1)
+            window = image[wy0:wy1, wx0:wx1]
+            if window.shape[0] >= h and window.shape[1] >= w:
+                result = cv2.matchTemplate(window, tpl, cv2.TM_CCOEFF_NORMED)
+                _, score, _, (x, y) = cv2.minMaxLoc(result)
+                if best is None or score > best[0]:
+                    best = (float(score), x + wx0, y + wy0)
+                if score >= threshold:
+                    break
+            # 抑制该候选附近的区域，继续寻找下一个候选
+            coarse[max(cy - sh // 2, 0):cy + sh // 2 + 1, max(cx - sw // 2, 0):cx + sw // 2 + 1] = -1
+        return best
@@ -0,0 +1,167 @@
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, ContextManager, Hashable, Iterator, TypeVar
+
+import cv2
+import numpy as np
+from cv2.typing import MatLike
+
+T = TypeVar('T')
+
+
+class FrameGate:
+    """
+    逐帧结果缓存与帧变化闸门。
+
+    每张新截图（按对象身份区分）分配一个新的帧 ID，并清空上一张截图的结果，
+    因此同一张截图上参数相同的匹配只会真正执行一次，且结果永远来自这张截图。
+
+    此外，每张截图都会计算一个缩小后的指纹，与基准画面（上一次变化时的画面）的指纹比较，
+    超过容差即视为画面发生了变化并更换基准（见 `update`）。
+    每帧只变化一点的缓慢变化（如渐变、淡入）会不断累积，超过容差后同样会视为变化。
+
+    相似画面复用是单独的可选层：启用 `reuse_similar`（或在 `similar()` 块中）时，
+    新截图与基准画面没有变化则沿用已缓存的结果。
+    适合画面静止、等待的目标出现时画面会明显变化的长时间等待（如自动 LIVE 结算）。
+    细微变化（如小字、进度）可能低于容差，因此默认不启用。
+
+    【例】
+    ```python
+    gate = FrameGate()
+    ret = gate.cached(screenshot, (template, threshold), lambda: find(screenshot, template))
+    ```
+    """
+    def __init__(
+        self,
+        *,
+        size: tuple[int, int] = (160, 90),
+        tolerance: int = 3,
+        reuse_similar: bool = False,
+    ):
+        """
+        :param size: 指纹尺寸 (宽, 高)。截图会被区域平均缩小到该尺寸。
+        :param tolerance: 允许的最大像素差。指纹中任意像素的差值超过该值即认为画面发生了变化。
+        :param reuse_similar: 是否在画面没有变化时沿用上一张截图的结果。
+        """
+        self.size = size
+        self.tolerance = tolerance
+        self.reuse_similar = reuse_similar
+        """是否在画面没有变化时沿用上一张截图的结果"""
+        self.__last_image: MatLike | None = None
+        self.__fingerprint: np.ndarray | None = None
+        self.__results: dict[Hashable, Any] = {}
+        self.frame_id: int = 0
+        """当前帧 ID。每张新截图加一。"""
+        self.changes: int = 0
+        """画面变化的次数"""
+        self.hits: int = 0
+        """命中缓存的次数"""
+        self.misses: int = 0
+        """未命中缓存、实际计算的次数"""
+
+    def fingerprint(self, image: MatLike) -> np.ndarray:
+        """计算截图的指纹。"""
+        return cv2.resize(image, self.size, interpolation=cv2.INTER_AREA)
+
+    def update(self, image: MatLike) -> bool:
+        """
+        用新截图更新闸门。
+
+        新截图会分配新的帧 ID。除非启用了 `reuse_similar` 且画面没有变化，否则清空已缓存的结果。
+
+        :param image: 新截图。
+        :return: 画面是否发生了变化（与基准画面比较）。
+        """
+        # 同一个数组（例如手动截图模式下同一 tick 内的多次查找）无需再比较
+        if image is self.__last_image:
+            return False
+        self.__last_image = image
+        self.frame_id += 1
+        fp = self.fingerprint(image)
+        base = self.__fingerprint
+        # 与基准画面的指纹比较，只在画面变化时更换基准
+        changed = (
+            base is None
+            or base.shape != fp.shape
+            or int(cv2.absdiff(base, fp).max()) > self.tolerance
+        )
+        if changed:
+            self.__fingerprint = fp
+            self.changes += 1
+        if changed or not self.reuse_similar:
+            self.__results.clear()
+        return changed
+
+    @contextmanager
+    def similar(self) -> Iterator[None]:
+        """在 with 块中启用 `reuse_similar`。"""
+        old = self.reuse_similar
+        self.reuse_similar = True
+        try:
+            yield
+        finally:
+            self.reuse_similar = old
+
+    def cached(self, image: MatLike, key: Hashable, compute: Callable[[], T]) -> T:
+        """
+        若当前截图上已有 `key` 对应的结果，则直接返回该结果，否则调用 `compute` 计算。
+
+        :param image: 当前截图。
+        :param key: 结果的键。应包含影响结果的所有参数。无法哈希时不缓存。
+        :param compute: 计算结果的函数。
+        """
+        self.update(image)
+        try:
+            if key in self.__results:
+                self.hits += 1
+                return self.__results[key]
+        except TypeError:
+            self.misses += 1
+            return compute()
+        self.misses += 1
+        ret = compute()
+        self.__results[key] = ret
+        return ret
+
+    def stats(self) -> dict[str, int]:
+        """返回截图数、画面变化次数与缓存命中统计。"""
+        return {
+            'frames': self.frame_id,
+            'changes': self.changes,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    def reset(self) -> None:
+        """清空指纹、缓存的结果与统计。"""
+        self.__last_image = None
+        self.__fingerprint = None
+        self.__results.clear()
+        self.frame_id = 0
+        self.changes = 0
+        self.hits = 0
+        self.misses = 0
+
+
+class _LocalGate(threading.local):
+    def __init__(self):
+        self.gate = FrameGate()
+
+
+_local = _LocalGate()
+
+
+def current() -> FrameGate:
+    """
+    返回当前线程的闸门。
+
+    `IaaContextImage.find`、`Frame.match` 等都通过它缓存结果，
+    因此同一张截图上重复的检测（无论来自哪个函数）都只会执行一次。
+    每个线程各有一个闸门，同时驱动多台设备时互不干扰。
+    """
+    return _local.gate
+
+
+def similar() -> ContextManager[None]:
+    """在 with 块中为当前线程的闸门启用相似画面复用，见 `FrameGate.similar`。"""
+    return current().similar()
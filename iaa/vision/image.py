@@ -0,0 +1,141 @@
+from typing import Sequence
+
+from cv2.typing import MatLike
+
+from kotonebot.backend.core import Image
+from kotonebot.backend.image import (
+    TemplateMatchResult,
+    MultipleTemplateMatchResult,
+    find as raw_find,
+)
+from kotonebot.backend.context.context import (
+    ContextImage,
+    ContextStackVars,
+    interruptible_class,
+)
+from kotonebot.primitives import Rect
+
+from . import bundle
+from . import gate
+from . import watchdog
+from .frame import Frame, pyramid_of
+from .sprite import hint_rect_of
+
+_PYRAMID_KWARGS = {'threshold', 'colored', 'debug_output'}
+"""可以交给 `Frame.match` 处理的 `find` 参数"""
+
+
+def find(
+    image: MatLike,
+    template: MatLike | str | Image,
+    mask: MatLike | str | Image | None = None,
+    *,
+    rect: Rect | None = None,
+    **kwargs,
+) -> TemplateMatchResult | None:
+    """
+    同 `kotonebot.backend.image.find`，但会优先在模板的提示范围内寻找。
+
+    若未显式指定 `rect` 且模板带有提示范围，则先在提示范围内寻找，
+    没找到时再在整张截图中寻找。
+
+    模板启用了金字塔匹配（见 `pyramid_of`）且没有使用掩码、预处理等参数时，
+    改用 `Frame.match` 进行匹配。同一张截图上的这些匹配共用一个 `Frame`（见 `Frame.of`），
+    匹配同样在彩色图上进行，阈值含义不变。
+    """
+    if (
+        isinstance(template, Image)
+        and pyramid_of(template) > 1
+        and mask is None
+        and set(kwargs) <= _PYRAMID_KWARGS
+    ):
+        return Frame.of(image).match(
+            template,
+            threshold=kwargs.get('threshold', 0.8),
+            rect=rect,
+            colored=kwargs.get('colored', False),
+        )
+    hint = hint_rect_of(template)
+    if rect is None and hint is not None:
+        ret = raw_find(image, template, mask, rect=hint, **kwargs)
+        if ret is not None:
+            return ret
+    return raw_find(image, template, mask, rect=rect, **kwargs)
+
+
+def find_multi(
+    image: MatLike,
+    templates: Sequence[MatLike | str | Image],
+    masks: Sequence[MatLike | str | Image | None] | None = None,
+    *,
+    rect: Rect | None = None,
+    **kwargs,
+) -> MultipleTemplateMatchResult | None:
+    """
+    同 `kotonebot.backend.image.find_multi`，但每个模板都会优先在其提示范围内寻找。
+    """
+    if masks is None:
+        masks = [None] * len(templates)
+    kwargs.setdefault('debug_output', False)
+    for index, (template, mask) in enumerate(zip(templates, masks)):
+        ret = find(image, template, mask, rect=rect, **kwargs)
+        if ret is not None:
+            return MultipleTemplateMatchResult.from_template_match_result(ret, index)
+    return None
+
+
+def _call_key(name: str, args: tuple, kwargs: dict) -> tuple:
+    """生成查找调用的缓存键。列表参数（如 `find_multi` 的模板列表）会被转换为元组。"""
+    def freeze(value):
+        return tuple(value) if isinstance(value, list) else value
+    return (
+        name,
+        tuple(freeze(a) for a in args),
+        tuple(sorted((k, freeze(v)) for k, v in kwargs.items())),
+    )
+
+
+@interruptible_class
+class IaaContextImage(ContextImage):
+    """
+    iaa 使用的 `image` 上下文。
+
+    `find` 与 `find_multi` 会优先在模板的提示范围内寻找。
+    `wait_for`、`expect_wait` 等方法内部调用 `find`，因此同样生效。
+
+    同一张截图上参数相同的查找只会执行一次，见 `FrameGate`。
+    每次查找都会报告给卡死检测，见 `Watchdog`。
+    """
+    def __init__(self, context, crop_rect: Rect | None = None):
+        super().__init__(context, crop_rect)
+        self.gate = gate.current()
+        """帧变化闸门与逐帧结果缓存"""
+
+    def find(self, *args, **kwargs):
+        screenshot = ContextStackVars.ensure_current().screenshot
+        key = _call_key('find', args, kwargs)
+        ret = self.gate.cached(screenshot, key, lambda: find(screenshot, *args, **kwargs))
+        self.context.device.last_find = ret
+        watchdog.current().observe(screenshot, self.gate.frame_id, key, ret is not None)
+        return ret
+
+    def find_multi(self, *args, **kwargs):
+        screenshot = ContextStackVars.ensure_current().screenshot
+        key = _call_key('find_multi', args, kwargs)
+        ret = self.gate.cached(screenshot, key, lambda: find_multi(screenshot, *args, **kwargs))
+        self.context.device.last_find = ret
+        watchdog.current().observe(screenshot, self.gate.frame_id, key, ret is not None)
+        return ret
+
+
+def install() -> None:
+    """
+    将 `IaaContextImage` 注入到当前 kotonebot 上下文中。
+
+    需要在 `init_context` 之后调用。同时会预先加载 sprite 打包文件。
+    """
+    from kotonebot.backend.context.context import image
+    from iaa.device import context as device_context
+    bundle.load()
+    # 线程绑定了独立上下文时只注入该线程的上下文，见 `iaa.device.context`
+    device_context.inject(image=IaaContextImage(image.context))
@@ -0,0 +1,79 @@
+from functools import cache
+
+from cv2.typing import MatLike
+
+from kotonebot.backend.core import Image, HintBox
+
+from . import bundle
+
+
+class Sprite(Image):
+    """
+    R.py 中的模板图像资源。
+
+    在 kotonebot 的 `Image` 基础上：
+    * 附带了资源标注中的提示范围。
+    * 可单独指定金字塔匹配倍数。
+    * 优先从 sprite 打包文件中读取像素数据，打包文件不可用时才读取 PNG。
+    """
+    def __init__(
+        self,
+        *,
+        key: str | None = None,
+        path: str | None = None,
+        name: str | None = 'untitled',
+        hint_rect: HintBox | None = None,
+        pyramid: int | None = None,
+    ):
+        self.key = key
+        """sprite 的 UUID。用于在打包文件中查找，也是 PNG 的文件名。"""
+        super().__init__(path=path, name=name)
+        self.hint_rect = hint_rect
+        """
+        提示范围（已包含边距）。
+
+        若不为 None，运行时会先在这个范围内寻找模板，如果没找到，再在整张截图中寻找。
+        """
+        self.pyramid = pyramid
+        """
+        金字塔匹配缩小倍数。为 None 时使用全局设置 `iaa.vision.frame.PYRAMID_SCALE`。
+        """
+
+    @property
+    def path(self) -> str | None:
+        """PNG 文件路径。仅指定了 key 时，首次访问才会解析路径。"""
+        if self.__path is None and self.key is not None:
+            from iaa.utils import sprite_path
+            self.__path = sprite_path(f'{self.key}.png')
+        return self.__path
+
+    @path.setter
+    def path(self, value: str | None) -> None:
+        self.__path = value
+
+    def __entry(self) -> bundle.BundleEntry | None:
+        if self.key is None:
+            return None
+        b = bundle.load()
+        return b.get(self.key) if b is not None else None
+
+    @property
+    def data(self) -> MatLike:
+        entry = self.__entry()
+        if entry is not None:
+            return entry.image
+        return super().data
+
+    @cache
+    def binary(self) -> Image:
+        entry = self.__entry()
+        if entry is not None:
+            return Image(data=entry.gray)
+        return super().binary()
+
+
+def hint_rect_of(template: object) -> HintBox | None:
+    """返回模板的提示范围。非 `Sprite` 或没有提示范围时返回 None。"""
+    if isinstance(template, Sprite):
+        return template.hint_rect
+    return None
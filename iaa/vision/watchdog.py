@@ -0,0 +1,133 @@
+import time
+import threading
+from typing import Callable, Hashable
+
+import cv2
+import numpy as np
+from cv2.typing import MatLike
+
+from iaa.errors import IaaError
+
+
+class TaskStuckError(IaaError):
+    """任务长时间没有任何进展"""
+    def __init__(self, budget: float):
+        self.budget = budget
+        """允许无进展的最长时间（秒）"""
+        super().__init__(f'No progress for {budget:.0f}s.')
+
+
+class Watchdog:
+    """
+    卡死检测。
+
+    `IaaContextImage` 的每次查找与 `Frame.match`（包括 `Dispatcher`、场景识别）都会调用 `observe`。
+    以下情况视为有进展：
+
+    * 出现了一帧与近期所有画面都不同的画面
+    * 某个查找第一次成功匹配
+
+    超过 `budget` 秒没有进展时抛出 `TaskStuckError`，结束当前任务。
+    本类不操作设备，查找始终是只读的；关闭弹窗、重启游戏等处理由调用方（调度器）负责。
+    反复点击同一处、在几个画面之间来回切换的循环都不算进展。
+    """
+    def __init__(
+        self,
+        *,
+        history: int = 256,
+        size: tuple[int, int] = (32, 18),
+        tolerance: int = 12,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        :param history: 记住的近期画面数。
+        :param size: 画面指纹尺寸 (宽, 高)。
+        :param tolerance: 指纹任意像素差值不超过该值时视为同一画面。
+        :param clock: 时钟，返回秒。
+        """
+        self.history = history
+        self.size = size
+        self.tolerance = tolerance
+        self.clock = clock
+        self.budget: float = 0
+        """允许无进展的最长时间（秒）。为 0 时不检测。"""
+        self.__fingerprints = np.empty((0, size[1], size[0], 3), dtype=np.int16)
+        self.__matched: set[Hashable] = set()
+        self.__frame_id: int | None = None
+        self.__last_progress: float = 0
+
+    @property
+    def armed(self) -> bool:
+        return self.budget > 0
+
+    def arm(self, budget: float) -> None:
+        """
+        开始检测。通常在每个任务开始时调用。
+
+        :param budget: 允许无进展的最长时间（秒）。为 0 时不检测。
+        """
+        self.budget = budget
+        self.__fingerprints = self.__fingerprints[:0]
+        self.__matched.clear()
+        self.__frame_id = None
+        self.__last_progress = self.clock()
+
+    def disarm(self) -> None:
+        """停止检测。"""
+        self.budget = 0
+
+    def __is_new_frame(self, image: MatLike) -> bool:
+        fp = cv2.resize(image, self.size, interpolation=cv2.INTER_AREA).astype(np.int16)
+        if fp.ndim == 2:
+            fp = np.repeat(fp[:, :, None], 3, axis=2)
+        seen = self.__fingerprints
+        if len(seen) and int(np.abs(seen - fp).max(axis=(1, 2, 3)).min()) <= self.tolerance:
+            return False
+        self.__fingerprints = np.concatenate([seen[-(self.history - 1):], fp[None]])
+        return True
+
+    def observe(self, image: MatLike, frame_id: int, key: Hashable, matched: bool) -> None:
+        """
+        记录一次查找。
+
+        :param image: 查找使用的截图。
+        :param frame_id: 截图的帧 ID，见 `FrameGate.frame_id`。只在帧 ID 变化时计算指纹。
+        :param key: 查找的参数。
+        :param matched: 是否找到。
+        :raises TaskStuckError: 超过 `budget` 秒没有进展。
+        """
+        if not self.armed:
+            return
+        progressed = False
+        if frame_id != self.__frame_id:
+            self.__frame_id = frame_id
+            progressed = self.__is_new_frame(image)
+        if matched:
+            try:
+                if key not in self.__matched:
+                    self.__matched.add(key)
+                    progressed = True
+            except TypeError:
+                # 参数无法哈希时无法区分是否第一次匹配，不计为进展
+                pass
+        now = self.clock()
+        if progressed:
+            self.__last_progress = now
+            return
+        if now - self.__last_progress < self.budget:
+            return
+        self.__last_progress = now
+        raise TaskStuckError(self.budget)
+
+
+class _LocalWatchdog(threading.local):
+    def __init__(self):
+        self.watchdog = Watchdog()
+
+
+_local = _LocalWatchdog()
+
+
+def current() -> Watchdog:
+    """返回当前线程的卡死检测。每个线程驱动各自的设备，互不干扰。"""
+    return _local.watchdog
@@ -1,5 +1,6 @@
 import os
 import sys
+import multiprocessing
 
 def myexcepthook(type, value, traceback, oldhook=sys.excepthook):
     print("============= 发生错误 =============")
@@ -14,4 +15,6 @@ sys.excepthook = myexcepthook
 from iaa.application.desktop.index import main
 
 if __name__ == "__main__":
+  # 打包后多进程模式需要
+  multiprocessing.freeze_support()
   main() 
\ No newline at end of file
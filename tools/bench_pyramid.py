@@ -0,0 +1,120 @@
+# /// script
+# requires-python = ">=3.10"
+# dependencies = [
+#     "opencv-python",
+#     "numpy",
+# ]
+# ///
+
+# 金字塔匹配基准测试
+# 使用 resources 中带标注的截图，对比全分辨率匹配与金字塔匹配的耗时与准确率。
+# 需要在项目根目录下运行，并且已安装 iaa 的依赖。
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+from dataclasses import dataclass, field
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from kotonebot.backend.core import Image
+from iaa.vision import gate
+from iaa.vision.frame import Frame
+
+
+@dataclass
+class Case:
+    name: str
+    screenshot: str
+    template: Image
+    position: tuple[int, int]
+
+
+@dataclass
+class Stat:
+    times: list[float] = field(default_factory=list)
+    hits: int = 0
+    misses: int = 0
+    wrong: int = 0
+
+    def summary(self) -> str:
+        t = np.array(self.times) * 1000
+        return (
+            f'p50={np.percentile(t, 50):7.2f}ms p95={np.percentile(t, 95):7.2f}ms '
+            f'hit={self.hits} miss={self.misses} wrong={self.wrong}'
+        )
+
+
+def load_cases(root: str, min_size: int) -> tuple[list[Case], dict[str, np.ndarray]]:
+    cases: list[Case] = []
+    screenshots: dict[str, np.ndarray] = {}
+    for json_path in glob.glob(os.path.join(root, '**', '*.png.json'), recursive=True):
+        png_path = json_path[:-len('.json')]
+        img = cv2.imread(png_path)
+        if img is None:
+            continue
+        screenshots[png_path] = img
+        with open(json_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        rects = {a['id']: a['data'] for a in meta['annotations'] if a['type'] == 'rect'}
+        for key, definition in meta['definitions'].items():
+            if definition['type'] != 'template' or key not in rects:
+                continue
+            r = rects[key]
+            x1, y1, x2, y2 = int(r['x1']), int(r['y1']), int(r['x2']), int(r['y2'])
+            if min(x2 - x1, y2 - y1) < min_size:
+                continue
+            tpl = Image(data=img[y1:y2, x1:x2].copy(), name=definition['name'])
+            cases.append(Case(definition['name'], png_path, tpl, (x1, y1)))
+    return cases, screenshots
+
+
+def run(cases: list[Case], screenshots: dict[str, np.ndarray], pyramid: int, repeat: int) -> Stat:
+    stat = Stat()
+    for case in cases:
+        for shot_path, shot in screenshots.items():
+            expected = case.position if shot_path == case.screenshot else None
+            ret = None
+            for _ in range(repeat):
+                # 每次都重置缓存，只测量匹配本身
+                gate.current().reset()
+                frame = Frame(shot)
+                start = time.perf_counter()
+                ret = frame.match(case.template, pyramid=pyramid)
+                stat.times.append(time.perf_counter() - start)
+            if expected is None:
+                continue
+            if ret is None:
+                stat.misses += 1
+            elif abs(ret.position.x - expected[0]) > 2 or abs(ret.position.y - expected[1]) > 2:
+                stat.wrong += 1
+            else:
+                stat.hits += 1
+    return stat
+
+
+def main():
+    parser = argparse.ArgumentParser(description='金字塔匹配基准测试')
+    parser.add_argument('--resources', default=os.path.join('resources', 'jp'), help='资源目录')
+    parser.add_argument('--scales', default='1,2,4', help='要测试的缩小倍数，逗号分隔')
+    parser.add_argument('--min-size', type=int, default=40, help='只测试最短边不小于此值的模板')
+    parser.add_argument('--repeat', type=int, default=3, help='每个模板在每张截图上的重复次数')
+    args = parser.parse_args()
+
+    cases, screenshots = load_cases(args.resources, args.min_size)
+    print(f'{len(cases)} templates x {len(screenshots)} screenshots')
+    # 计时包含首次缩小模板的开销，先预热一次
+    run(cases[:1], screenshots, 2, 1)
+    for scale in (int(s) for s in args.scales.split(',')):
+        stat = run(cases, screenshots, scale, args.repeat)
+        print(f'scale={scale}: {stat.summary()}')
+
+
+if __name__ == '__main__':
+    main()
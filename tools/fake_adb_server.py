@@ -0,0 +1,141 @@
+# /// script
+# requires-python = ">=3.10"
+# dependencies = [
+#     "opencv-python",
+#     "numpy",
+# ]
+# ///
+
+# 本地 adb server 替身
+# 实现 adb server 协议中持续截图（iaa.device.adb_stream）用到的部分，
+# 用于在没有模拟器的环境下测试持续截图、断线重连与吞吐量。
+#
+# 用法：
+#   python tools/fake_adb_server.py --port 5038 --image screenshot.png --drop-after 100
+# 然后将 AdbStreamCapture 指向 127.0.0.1:5038 上的任意 serial：
+#   AdbStreamCapture(adbutils.AdbClient(port=5038).device('fake'))
+
+import time
+import struct
+import argparse
+import socketserver
+
+import cv2
+import numpy as np
+
+OKAY = b'OKAY'
+FAIL = b'FAIL'
+
+
+def block(data: bytes) -> bytes:
+    return f'{len(data):04x}'.encode() + data
+
+
+class Handler(socketserver.BaseRequestHandler):
+    server: 'FakeAdbServer'
+
+    def read_exact(self, n: int) -> bytes:
+        data = b''
+        while len(data) < n:
+            chunk = self.request.recv(n - len(data))
+            if not chunk:
+                raise EOFError
+            data += chunk
+        return data
+
+    def read_command(self) -> str:
+        size = int(self.read_exact(4), 16)
+        return self.read_exact(size).decode()
+
+    def handle(self) -> None:
+        try:
+            while True:
+                command = self.read_command()
+                if command == 'host:version':
+                    self.request.sendall(OKAY + block(b'%04x' % 40))
+                    return
+                elif command.startswith('host:transport:'):
+                    # 之后的命令发往设备，继续在同一连接上读取
+                    self.request.sendall(OKAY)
+                elif command.startswith('host:tport:serial:'):
+                    self.request.sendall(OKAY + struct.pack('<Q', 1))
+                elif command == 'exec:getprop ro.build.version.sdk':
+                    self.request.sendall(OKAY + f'{self.server.api_level}\n'.encode())
+                    return
+                elif command.startswith('exec:') and 'screencap' in command:
+                    self.request.sendall(OKAY)
+                    self.stream()
+                    return
+                else:
+                    self.request.sendall(FAIL + block(f'unsupported command: {command}'.encode()))
+                    return
+        except (EOFError, OSError):
+            pass
+
+    def stream(self) -> None:
+        server = self.server
+        sent = 0
+        while True:
+            # 每收到一个换行输出一帧
+            if self.request.recv(1) != b'\n':
+                return
+            if server.drop_after and sent >= server.drop_after:
+                print(f'Dropping connection after {sent} frames.')
+                return
+            if server.delay > 0:
+                time.sleep(server.delay)
+            self.request.sendall(server.header + server.frame())
+            sent += 1
+
+
+class FakeAdbServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address: tuple[str, int], image: np.ndarray, api_level: int, drop_after: int, delay: float):
+        super().__init__(address, Handler)
+        h, w = image.shape[:2]
+        self.rgba = cv2.cvtColor(image, cv2.COLOR_BGR2RGBA)
+        self.api_level = api_level
+        self.drop_after = drop_after
+        self.delay = delay
+        self.header = struct.pack('<III', w, h, 1)
+        if api_level >= 26:
+            self.header += struct.pack('<I', 0)
+        self.counter = 0
+
+    def frame(self) -> bytes:
+        # 左上角像素写入帧序号，便于确认每次拿到的都是新帧
+        self.counter += 1
+        self.rgba[0, 0, 0] = self.counter % 256
+        return self.rgba.tobytes()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地 adb server 替身')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5038)
+    parser.add_argument('--image', help='作为画面的图片。不指定时生成渐变图')
+    parser.add_argument('--size', default='1280x720', help='不指定图片时生成的画面尺寸')
+    parser.add_argument('--api', type=int, default=34, help='模拟的 Android API 等级')
+    parser.add_argument('--drop-after', type=int, default=0, help='每个连接输出多少帧后主动断开，用于测试重连。0 表示不断开')
+    parser.add_argument('--delay', type=float, default=0, help='模拟每帧 screencap 的耗时（秒）')
+    args = parser.parse_args()
+
+    if args.image:
+        image = cv2.imread(args.image)
+        if image is None:
+            raise SystemExit(f'Failed to read {args.image}')
+    else:
+        w, h = map(int, args.size.split('x'))
+        image = np.zeros((h, w, 3), np.uint8)
+        image[:, :, 1] = np.linspace(0, 255, w, dtype=np.uint8)[None, :]
+        image[:, :, 2] = np.linspace(0, 255, h, dtype=np.uint8)[:, None]
+
+    server = FakeAdbServer((args.host, args.port), image, args.api, args.drop_after, args.delay)
+    print(f'Fake adb server listening on {args.host}:{args.port}')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
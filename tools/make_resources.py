@@ -12,6 +12,8 @@
 
 from genericpath import isfile
 import os
+import json
+import struct
 import shutil
 import uuid
 import jinja2
@@ -21,9 +23,22 @@ from dataclasses import dataclass
 from dataclasses_json import dataclass_json, DataClassJsonMixin
 
 import cv2
+import numpy as np
 from cv2.typing import MatLike
 
 PATH = '.\\resources'
+HINT_RECT_MARGIN = 20
+"""提示范围在标注矩形基础上向四周扩展的像素数"""
+PYRAMID_PREFIXES = ('Map.', 'Scene.Intersection.')
+"""使用金字塔匹配的资源名前缀。这些模板较大，且通常需要在整张截图中寻找。"""
+PYRAMID_SCALE = 2
+"""金字塔匹配的缩小倍数"""
+PYRAMID_MIN_SIZE = 40
+"""使用金字塔匹配的模板最短边。过小的模板缩小后容易误匹配，见 tools/bench_pyramid.py。"""
+# 需要与 iaa/vision/bundle.py 保持一致
+BUNDLE_NAME = 'sprites.bundle'
+BUNDLE_MAGIC = b'IAASPR\x00\x01'
+BUNDLE_ALIGN = 64
 
 SpriteType = Literal['basic', 'metadata']
 
@@ -59,6 +74,13 @@ class Sprite:
     """sprite 图片的绝对路径"""
     origin_file: str
     """原始图片的绝对路径"""
+    hint_rect: tuple[int, int, int, int] | None = None
+    """
+    运行时的提示范围 (x1, y1, x2, y2)，已包含边距。
+    仅当定义中 useHintRect 为 true 时存在。
+    """
+    pyramid: int | None = None
+    """金字塔匹配缩小倍数。None 表示使用运行时的全局设置。"""
 
 @dataclass
 class HintBox:
@@ -117,9 +139,10 @@ class Definition(DataClassJsonMixin):
     description: Optional[str] = None
     """描述信息"""
 
+@dataclass
 class TemplateDefinition(Definition):
     """模板匹配类型的资源定义"""
-    useHintRect: bool
+    useHintRect: bool = False
     """
     是否将这个模板的矩形范围作为运行时执行模板寻找函数时的提示范围。
     
@@ -197,11 +220,22 @@ def query_annotation(annotations: list[Annotation], id: str) -> Annotation:
             return annotation
     raise ValueError(f'Annotation not found: {id}')
 
+def make_hint_rect(rect: RectPoints, image: MatLike, margin: int = HINT_RECT_MARGIN) -> tuple[int, int, int, int]:
+    """将标注矩形向四周扩展 margin 像素，并限制在图像范围内"""
+    h, w = image.shape[:2]
+    return (
+        max(int(rect.x1) - margin, 0),
+        max(int(rect.y1) - margin, 0),
+        min(int(rect.x2) + margin, w),
+        min(int(rect.y2) + margin, h),
+    )
+
 def load_metadata(root_path: str, png_file: str) -> list[Resource]:
     """加载 metadata 类型的标注"""
     json_path = png_file + '.json'
     with open(json_path, 'r', encoding='utf-8') as f:
-        metadata = SpriteMetadata.from_json(f.read())
+        raw_metadata = json.load(f)
+    metadata = SpriteMetadata.from_dict(raw_metadata)
     # 遍历标注，裁剪、保存图片
     clips: dict[str, str] = {} # id -> 文件路径
     image = cv2.imread(png_file)
@@ -223,8 +257,20 @@ def load_metadata(root_path: str, png_file: str) -> list[Resource]:
             clips[annotation.id] = path
     # 关联 Definition，创建 Sprite
     resources: list[Resource] = []
-    for definition in metadata.definitions.values():
+    for key, definition in metadata.definitions.items():
         if definition.type == 'template':
+            # SpriteMetadata 只按 Definition 解析，这里重新按 TemplateDefinition 解析以取得 useHintRect
+            template_definition = TemplateDefinition.from_dict(raw_metadata['definitions'][key])
+            hint_rect = None
+            if template_definition.useHintRect:
+                annotation = query_annotation(metadata.annotations, definition.annotationId)
+                assert isinstance(annotation.data, RectPoints)
+                hint_rect = make_hint_rect(annotation.data, image)
+            pyramid = None
+            if definition.name.startswith(PYRAMID_PREFIXES):
+                clip_h, clip_w = cv2.imread(clips[definition.annotationId]).shape[:2]
+                if min(clip_h, clip_w) >= PYRAMID_MIN_SIZE:
+                    pyramid = PYRAMID_SCALE
             spr = Sprite(
                 type='metadata',
                 uuid=definition.annotationId,
@@ -234,6 +280,8 @@ def load_metadata(root_path: str, png_file: str) -> list[Resource]:
                 rel_path=png_file,
                 abs_path=os.path.abspath(clips[definition.annotationId]),
                 origin_file=os.path.abspath(png_file),
+                hint_rect=hint_rect,
+                pyramid=pyramid,
             )
             resources.append(Resource('template', spr, definition.description or ''))
         elif definition.type == 'hint-box':
@@ -374,11 +422,23 @@ def make_classes(resources: list[Resource], ide: Literal['vscode', 'pycharm']) -
                         f"原始文件：\\n\n"
                         + make_img(ide, sprite.origin_file, '原始文件', height)
                     )
+                value = f'Sprite(key="{sprite.uuid}", name="{sprite.display_name}"'
+                if sprite.hint_rect is not None:
+                    x1, y1, x2, y2 = sprite.hint_rect
+                    docstring += f"提示范围：x1={x1}, y1={y1}, x2={x2}, y2={y2}\\n\n"
+                    value += (
+                        f', hint_rect=HintBox(x1={x1}, y1={y1}, x2={x2}, y2={y2}, '
+                        f'source_resolution=({w}, {h}))'
+                    )
+                if sprite.pyramid is not None:
+                    docstring += f"金字塔匹配：{sprite.pyramid} 倍\\n\n"
+                    value += f', pyramid={sprite.pyramid}'
+                value += ')'
                 img_attr = ImageAttribute(
                     type='image',
                     name=sprite.name,
                     docstring=docstring,
-                    value=f'Image(path=sprite_path(r"{sprite.uuid}.png"), name="{sprite.display_name}")'
+                    value=value
                 )
                 current_class.attributes.append(img_attr)
             elif resource.type == 'hint-box':
@@ -412,7 +472,7 @@ def make_classes(resources: list[Resource], ide: Literal['vscode', 'pycharm']) -
                         f'HintBox(' + 
                         f'x1={int(hint_box.x1)}, y1={int(hint_box.y1)}, '
                         f'x2={int(hint_box.x2)}, y2={int(hint_box.y2)}, '
-                        f'source_resolution=(720, 1280))' # HACK: 硬编码分辨率
+                        f'source_resolution=({image.shape[1]}, {image.shape[0]}))'
                     )
                 )
                 current_class.attributes.append(img_attr)
@@ -455,6 +515,50 @@ def copy_sprites(resources: list[Resource], output_folder: str) -> list[Resource
     return resources
 
 
+def write_bundle(resources: list[Resource], output_path: str) -> None:
+    """
+    将所有模板预先解码，连同灰度图写入一个打包文件。
+
+    文件结构见 `iaa/vision/bundle.py`。
+    """
+    index: dict[str, dict] = {}
+    chunks: list[bytes] = []
+    offset = 0
+
+    def add(arr: np.ndarray) -> dict:
+        nonlocal offset
+        arr = np.ascontiguousarray(arr)
+        padding = (-offset) % BUNDLE_ALIGN
+        chunks.append(b'\x00' * padding)
+        offset += padding
+        desc = {'offset': offset, 'shape': list(arr.shape), 'dtype': arr.dtype.str}
+        chunks.append(arr.tobytes())
+        offset += arr.nbytes
+        return desc
+
+    for resource in resources:
+        if resource.type != 'template':
+            continue
+        spr = resource.data
+        assert isinstance(spr, Sprite)
+        image = cv2.imread(spr.abs_path, cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError(f'Failed to read sprite: {spr.abs_path}')
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        index[spr.uuid] = {
+            'image': add(image),
+            'gray': add(gray),
+        }
+
+    header = json.dumps(index, ensure_ascii=False).encode('utf-8')
+    head = BUNDLE_MAGIC + struct.pack('<I', len(header)) + header
+    head += b'\x00' * ((-len(head)) % BUNDLE_ALIGN)
+    with open(output_path, 'wb') as f:
+        f.write(head)
+        for chunk in chunks:
+            f.write(chunk)
+    print(f'Writing bundle: {output_path} ({len(index)} sprites, {len(head) + offset} bytes)')
+
 def indent(text: str, indent: int = 4) -> str:
     """调整文本的缩进"""
     lines = text.split('\n')
@@ -473,6 +577,7 @@ if __name__ == '__main__':
     files = scan_png_files(path)
     sprites = load_sprites(path, files)
     sprites = copy_sprites(sprites, r'iaa\res\sprites')
+    write_bundle(sprites, os.path.join(r'iaa\res\sprites', BUNDLE_NAME))
     classes = make_classes(sprites, args.ide)
     
     env = jinja2.Environment(loader=jinja2.FileSystemLoader('./tools'))